@@ -172,6 +172,18 @@ class Address(object):
     def poi(self, value):
         self._poi = value
 
+    def as_dict(self):
+        """Return the address as a dict of address parts
+        (the raw address is stored with 'raw_address' key).
+
+        :rtype:             dict
+        """
+        result = {part: getattr(self, part)
+                  for part in self.address_parts_list()}
+        result['raw_address'] = self.raw_address
+
+        return result
+
     def mask_address_parts(self, used_parts):
         """Delete from address unused address parts. Return the modifed copy.
 
@@ -0,0 +1,174 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Batch parsing of addresses.
+
+The addresses of a batch are deduplicated before parsing: every
+distinct address is parsed once and the result is scattered back
+to all rows of the batch that contain the same address.
+"""
+
+from itertools import islice
+from collections import OrderedDict
+
+from address import Address
+
+
+def normalize_address(address):
+    """Return the key of the address: the addresses with the same key
+    are parsed in the same way.
+
+    The splitter matches the lowercased address, so the case doesn't
+    change the positions of the parts. The trailing spaces are never
+    used by the parts and they add the same penalty to all strategies.
+    """
+    key = address.rstrip().lower()
+    if len(key) != len(address.rstrip()):
+        # The positions can't be transferred to the original string
+        return address
+    return key
+
+
+def apply_strategy(strategy, address):
+    """Return parsed address: the positions of the strategy are applied
+    to the address string (the address must be equivalent to
+    strategy.address, see normalize_address).
+
+    :rtype: Address
+    """
+    def part(pos):
+        return address[pos[0]:pos[1]] if pos else None
+
+    return Address(
+        raw_address=address,
+        index=part(strategy.index_pos),
+        country=part(strategy.country_pos),
+        region=part(strategy.region_pos),
+        subregion=part(strategy.subregion_pos),
+        settlement=part(strategy.city_pos),
+        street=part(strategy.street_pos),
+        house=part(strategy.house_pos),
+        poi=part(strategy.poi_pos)
+    )
+
+
+class BatchStats(object):
+    """Count of rows and distinct addresses of the batches
+    """
+    def __init__(self, rows=0, distinct=0):
+        self.rows = rows
+        self.distinct = distinct
+
+    def __iadd__(self, other):
+        self.rows += other.rows
+        self.distinct += other.distinct
+        return self
+
+    @property
+    def duplicates(self):
+        return self.rows - self.distinct
+
+    @property
+    def duplicate_ratio(self):
+        """Part of the rows that are not parsed (0 <= ratio < 1)
+        """
+        return float(self.duplicates) / self.rows if self.rows else 0.0
+
+    def __unicode__(self):
+        return u'%d rows, %d distinct, %.1f%% duplicates' % (
+            self.rows, self.distinct, 100 * self.duplicate_ratio)
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+
+def group_duplicates(addresses):
+    """Group rows by normalized address.
+
+    :returns:   OrderedDict: key => list of row numbers (the groups are
+                ordered by the first row)
+    """
+    groups = OrderedDict()
+    for i, address in enumerate(addresses):
+        groups.setdefault(normalize_address(address), []).append(i)
+    return groups
+
+
+def parse_batch(splitter, addresses):
+    """Parse list of addresses, every distinct address is parsed once.
+
+    :param splitter:    AddressSplitter object
+    :param addresses:   list of address strings
+
+    :returns:   (list of Address objects, BatchStats)
+    """
+    groups = group_duplicates(addresses)
+    results = [None] * len(addresses)
+    for rows in groups.itervalues():
+        first = addresses[rows[0]]
+        strategy = splitter.get_best_strategy(first)
+        for i in rows:
+            if addresses[i] == first:
+                results[i] = strategy.get_parsed_address()
+            else:
+                results[i] = apply_strategy(strategy, addresses[i])
+
+    return results, BatchStats(len(addresses), len(groups))
+
+
+def residual_batch(splitter, addresses, per_gap=False):
+    """Return the residual texts of the addresses (the text that is not
+    used by the parts, see AddressSplitter.get_residual), the best
+    strategy of every distinct address is searched once.
+
+    :param splitter:    AddressSplitter object
+    :param addresses:   list of address strings
+    :param per_gap:     return the lists of gaps instead of the texts
+
+    :returns:   (list of residuals, BatchStats)
+    """
+    groups = group_duplicates(addresses)
+    results = [None] * len(addresses)
+    for rows in groups.itervalues():
+        strategy = splitter.get_best_strategy(addresses[rows[0]])
+        for i in rows:
+            results[i] = strategy.get_residual(per_gap, addresses[i])
+
+    return results, BatchStats(len(addresses), len(groups))
+
+
+def iter_batches(iterable, batch_size):
+    """Split iterable into lists of batch_size items
+    (the last list can be shorter)
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_batches(splitter, addresses, batch_size=1000):
+    """Parse stream of addresses by batches. Only one batch
+    is kept in memory.
+
+    :param splitter:    AddressSplitter object
+    :param addresses:   iterable of address strings
+    :param batch_size:  count of addresses in a batch
+
+    Generate (addresses, parsed addresses, BatchStats) for every batch.
+    """
+    for batch in iter_batches(addresses, batch_size):
+        parsed, stats = parse_batch(splitter, batch)
+        yield batch, parsed, stats
+
+
+def format_result(line, address, delimiter=u','):
+    """Return output row of the address parser: the source line and
+    the address parts separated by the delimiter.
+    """
+    parts = [address.index, address.country, address.region,
+             address.subregion, address.settlement, address.street,
+             address.house]
+    return delimiter.join([line] + [p or u'' for p in parts])
@@ -0,0 +1,124 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Approximate search of the best strategy (beam search).
+
+The full search (AddressSplitter.get_best_strategy) scores every
+strategy of the product of the candidates. The beam search assigns the
+parts one by one, the parts with the higher absence penalty first
+(a city decides more than a poi), the parts with fewer candidates first
+among the parts with the same penalty. After every part only the best
+width partial assignments are kept; a partial assignment is scored with
+the penalties of SplitingStrategy as if the parts that are not assigned
+yet were absent (it is the same constant for all assignments of a step).
+The best complete assignment is returned, the ties are resolved in the
+order of the full search.
+
+The width is the quality/speed knob: the search is exact if the width
+is not less than the count of the strategies.
+
+The scores are counted by the part positions (see spans_score), it is
+the same as SplitingStrategy.get_score without the position matrix.
+"""
+
+# Default width of the beam
+BEAM_WIDTH = 8
+
+# Widths of the engines of address_diff and of the benchmark
+BEAM_WIDTHS = [1, 2, 4, 8, 16, 32]
+
+
+def spans_score(positions, penalties):
+    """Return (score without the blank penalty of the address length,
+    end of the last part).
+
+    The score of the strategy is the first item + blank penalty * length
+    of the address.
+
+    :param positions:   list of the positions of the parts ((begin, end)
+                        or None) in the order of the rows of
+                        SplitingStrategy (index, country, region,
+                        subregion, city, street, house, poi)
+    :param penalties:   (overlap penalty, blank penalty, space ratio,
+                        list of the absence penalties of the parts),
+                        see AddressSplitter.strategy_penalties
+    """
+    overlap_penalty, blank_penalty, space_ratio, absences = penalties
+    events = []
+    absence = 0
+    for row, part in enumerate(positions):
+        if part and part[0] < part[1]:
+            events.append((part[0], 1))
+            events.append((part[1], -1))
+        else:
+            absence += absences[row]
+    if not events:
+        return absence, 0
+
+    events.sort()
+    depth = 0
+    previous = events[0][0]
+    covered = overlapping = 0
+    for x, step in events:
+        if depth >= 1:
+            covered += x - previous
+        if depth >= 2:
+            overlapping += x - previous
+        depth += step
+        previous = x
+    space = events[-1][0] - 1 - events[0][0]
+
+    score = overlapping * overlap_penalty - covered * blank_penalty + \
+        absence + space_ratio * space
+    return score, events[-1][0]
+
+
+def _options(found):
+    """Return list of (position, group number, number in the group) of the
+    candidates of a part in the order of the full search, the absence
+    of the part is the last option
+    """
+    groups = [spans for text, spans in found.iteritems() if text]
+    options = [(span, g, s)
+               for g, spans in enumerate(groups)
+               for s, span in enumerate(spans)]
+    options.append((None, len(groups), 0))
+    return options
+
+
+def beam_search(candidates, penalties, width=BEAM_WIDTH):
+    """Return the positions of the parts of the best found strategy.
+
+    :param candidates:  found positions of the parts (see
+                        AddressSplitter._get_candidates)
+    :param penalties:   penalties of the strategies (see spans_score)
+    :param width:       count of the kept partial assignments
+    """
+    if width < 1:
+        raise ValueError(u'Beam width must be positive, got %s' % width)
+    options = [_options(found) for found in candidates]
+    absences = penalties[3]
+    parts = sorted(range(len(options)),
+                   key=lambda row: (-absences[row], len(options[row])))
+
+    count = len(options)
+    # Beam: list of (score, order key, positions, groups, numbers)
+    beam = [(0, (), [None] * count, [0] * count, [0] * count)]
+    for row in parts:
+        expanded = []
+        for _, _, positions, groups, numbers in beam:
+            for span, g, s in options[row]:
+                new_positions = list(positions)
+                new_positions[row] = span
+                new_groups = list(groups)
+                new_groups[row] = g
+                new_numbers = list(numbers)
+                new_numbers[row] = s
+                score = spans_score(new_positions, penalties)[0]
+                key = tuple(new_groups) + tuple(new_numbers)
+                expanded.append((score, key, new_positions, new_groups,
+                                 new_numbers))
+        expanded.sort(key=lambda item: item[:2])
+        beam = expanded[:width]
+
+    return tuple(beam[0][2])
@@ -0,0 +1,188 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Cache of the parsing results and its snapshots.
+
+The splitter with a ResultCache (AddressSplitter(...,
+result_cache=ResultCache(...))) keeps the positions of the parts of the
+best strategies of the last max_size distinct addresses (the addresses
+with the same normalized form share the result, see
+address_batch.normalize_address) and counts the requests of every
+cached address.
+
+The snapshot is the pickled list of the most frequently requested
+addresses with their positions and the hash of the gazetteers of the
+splitter (see AddressSplitter.gazetteer_hash). A new process loads the
+snapshot before (or while) it serves the requests, so the frequent
+addresses are not parsed again after a restart; the snapshot of other
+gazetteers is skipped.
+
+Usage (the snapshot of the addresses of a request log, one address
+per line):
+    python address_cache.py snapshot path addresses.txt
+        [--city-list-file FILE] [--top N]
+"""
+
+import os
+
+import cPickle
+import argparse
+import threading
+from collections import OrderedDict
+
+from address_batch import normalize_address
+
+# Default count of the cached addresses
+CACHE_SIZE = 10000
+
+# Version of the snapshot format
+SNAPSHOT_VERSION = 1
+
+
+class ResultCache(object):
+    """LRU cache: normalized address => positions of the parts
+    (the positions of SplitingStrategy in the order of its rows)
+    """
+    def __init__(self, max_size=CACHE_SIZE):
+        """
+        :param max_size:    max count of the cached addresses, the least
+                            recently used address is dropped (not
+                            limited if None)
+        """
+        self.max_size = max_size
+        # key => [count of the requests, positions]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, address):
+        """Return the positions of the address, None if the address
+        is not cached (the request is counted)
+        """
+        key = normalize_address(address)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            entry[0] += 1
+            self._entries[key] = entry
+            return entry[1]
+
+    def put(self, address, positions, count=1):
+        """Store the positions of the address
+
+        :param count:   count of the requests of the new address
+        """
+        key = normalize_address(address)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                entry = [count, None]
+            entry[1] = tuple(positions)
+            self._entries[key] = entry
+            while self.max_size is not None and \
+                    len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, patterns):
+        """Drop the addresses that are matched by one of the compiled
+        patterns
+
+        :returns:   count of the dropped addresses
+        """
+        with self._lock:
+            # The keys are lowercased (except the keys which case can't
+            # be changed)
+            dropped = [key for key in self._entries
+                       if any(p.search(key.lower()) for p in patterns)]
+            for key in dropped:
+                del self._entries[key]
+        return len(dropped)
+
+    def hot(self, n=None):
+        """Return list of (normalized address, count of the requests,
+        positions) of the n most frequently requested addresses (all
+        if n is None)
+        """
+        with self._lock:
+            items = [(key, count, positions) for key, (count, positions)
+                     in self._entries.iteritems()]
+        items.sort(key=lambda item: -item[1])
+        return items if n is None else items[:n]
+
+    def dump(self, filename, gazetteer_hash, n=None):
+        """Write the snapshot of the n most frequently requested
+        addresses (atomically: the file is renamed)
+
+        :param gazetteer_hash:  hash of the gazetteers of the results
+        :returns:   count of the addresses of the snapshot
+        """
+        entries = self.hot(n)
+        snapshot = dict(version=SNAPSHOT_VERSION,
+                        gazetteer_hash=gazetteer_hash,
+                        entries=entries)
+        tmp = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp, 'wb') as f:
+            cPickle.dump(snapshot, f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, filename)
+        return len(entries)
+
+    def load(self, filename, gazetteer_hash):
+        """Add the addresses of the snapshot to the cache, the snapshot
+        of other gazetteers or of another format and the absent file
+        are skipped
+
+        :returns:   count of the loaded addresses
+        """
+        if not os.path.exists(filename):
+            return 0
+        with open(filename, 'rb') as f:
+            snapshot = cPickle.load(f)
+        if snapshot.get('version') != SNAPSHOT_VERSION or \
+                snapshot.get('gazetteer_hash') != gazetteer_hash:
+            return 0
+        entries = snapshot['entries'][:self.max_size]
+        # The least frequent addresses are added first: they are dropped
+        # first
+        for key, count, positions in reversed(entries):
+            self.put(key, positions, count)
+        return len(entries)
+
+
+def build_snapshot(splitter, addresses, filename, n=None):
+    """Parse the addresses (e.g. of a request log) by the splitter with
+    a ResultCache and write the snapshot of the n most frequent ones
+
+    :returns:   count of the addresses of the snapshot
+    """
+    for address in addresses:
+        splitter.get_best_strategy(address)
+    return splitter.dump_cache(filename, n)
+
+
+if __name__ == '__main__':
+    from address_splitter import AddressSplitter
+
+    parser = argparse.ArgumentParser(
+        description=u'Snapshot of the parsing results of a request log')
+    parser.add_argument('snapshot', help=u'output file')
+    parser.add_argument('path', help=u'directory of the list files')
+    parser.add_argument('addresses', help=u'file of addresses, one per line')
+    parser.add_argument('--city-list-file', default='cities.csv')
+    parser.add_argument('--top', type=int, default=CACHE_SIZE,
+                        help=u'count of the addresses of the snapshot')
+    args = parser.parse_args()
+
+    splitter = AddressSplitter.from_directory(
+        args.path, city_list_file=args.city_list_file,
+        result_cache=ResultCache(max_size=None))
+    with open(args.addresses) as f:
+        addresses = (line.decode('utf-8').rstrip('\r\n') for line in f)
+        count = build_snapshot(splitter, addresses, args.snapshot, args.top)
+    print '%d addresses' % count
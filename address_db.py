@@ -0,0 +1,301 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Parsing of the addresses of a database table.
+
+The addresses are read from the source table by batches of the primary
+key (keyset pagination: WHERE key > last key ORDER BY key LIMIT n), so
+a batch is one short query on any DB-API database and no cursor is kept
+open between the batches. The batches are parsed (in worker processes
+if workers > 0, see address_batch.parse_batch) and the parts are written
+to the result table by executemany of an upsert (INSERT ... ON CONFLICT
+(key) DO UPDATE, the syntax of PostgreSQL and SQLite >= 3.24), the
+transaction is committed every commit_rows rows.
+
+The batches are written in the order of the keys, so the max key of the
+result table is the last parsed row: the interrupted run is resumed
+after it (resume=True).
+
+A DB-API 2.0 connection of a database with the upsert syntax above and
+the standard quoted identifiers ("name") can be used, the placeholders
+of the queries are chosen by the paramstyle of the driver ('qmark' for
+sqlite3, 'pyformat' for psycopg2). MySQL is not supported: it has
+neither ON CONFLICT nor "name" quoting (by default). The source of
+csv_files/russia.conf (PostgreSQL table building_polygon, the key
+ogc_fid) is the example of the real tables.
+
+Usage (SQLite database file):
+    python address_db.py database.sqlite path --table addresses
+        [--key id] [--column address] [--result-table parsed]
+        [--batch-size N] [--commit-rows N] [--workers N] [--restart]
+        [--city-list-file FILE]
+"""
+
+import re
+import sys
+import argparse
+import multiprocessing
+from collections import deque
+
+from address import Address
+from address_splitter import AddressSplitter
+from address_batch import BatchStats, parse_batch
+
+# Columns of the parts in the result table
+RESULT_COLUMNS = Address.address_parts_list()
+
+# Placeholders of the DB-API paramstyles ('format' of MySQLdb is not
+# supported, see the module description)
+PLACEHOLDERS = {'qmark': '?', 'pyformat': '%s'}
+
+# Count of the batches sent to a worker process at once
+BATCHES_PER_WORKER = 2
+
+# Names of the tables and columns that are not quoted
+IDENTIFIER = re.compile(r'^[A-Za-z_]\w*(\.[A-Za-z_]\w*)?$')
+
+
+def quote(name):
+    """Return the quoted name of a table or a column (the names
+    are checked: they are put in the queries)
+
+    :raises ValueError: if the name is not an identifier
+    """
+    if not IDENTIFIER.match(name):
+        raise ValueError(u'Wrong table or column name "%s"' % name)
+    return '.'.join('"%s"' % part for part in name.split('.'))
+
+
+def _placeholder(paramstyle):
+    try:
+        return PLACEHOLDERS[paramstyle]
+    except KeyError:
+        raise ValueError(u'Unsupported paramstyle "%s"' % paramstyle)
+
+
+def iter_rows(conn, table, key='id', column='address', batch_size=1000,
+              start=None, paramstyle='qmark'):
+    """Read the rows of the table by batches in the order of the key.
+
+    :param conn:        DB-API connection
+    :param key:         primary key column (unique, ordered)
+    :param column:      address column
+    :param start:       read the rows after this key (from the first
+                        row if None)
+    :param paramstyle:  paramstyle of the driver (see PLACEHOLDERS)
+
+    Generate lists of (key, address) pairs.
+    """
+    mark = _placeholder(paramstyle)
+    select = 'SELECT %s, %s FROM %s' % (quote(key), quote(column),
+                                        quote(table))
+    order = ' ORDER BY %s LIMIT %d' % (quote(key), batch_size)
+    after = '%s WHERE %s > %s%s' % (select, quote(key), mark, order)
+    cursor = conn.cursor()
+    try:
+        while True:
+            if start is None:
+                cursor.execute(select + order)
+            else:
+                cursor.execute(after, (start,))
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            yield [(k, address or u'') for k, address in rows]
+            start = rows[-1][0]
+    finally:
+        cursor.close()
+
+
+class ResultSink(object):
+    """Result table: the key of the source row and the parts
+    (RESULT_COLUMNS), the rows are upserted by the key
+    """
+    def __init__(self, conn, table, key='id', paramstyle='qmark',
+                 commit_rows=10000, create=True, key_type='INTEGER'):
+        """
+        :param conn:        DB-API connection
+        :param key:         key column (the key of the source table)
+        :param commit_rows: count of the written rows of a transaction
+        :param create:      create the table if it is absent
+        :param key_type:    SQL type of the key column of the new table
+        """
+        self.conn = conn
+        self.table = table
+        self.key = key
+        self.commit_rows = commit_rows
+        self._uncommitted = 0
+
+        mark = _placeholder(paramstyle)
+        columns = [quote(key)] + [quote(c) for c in RESULT_COLUMNS]
+        self._upsert = 'INSERT INTO %s (%s) VALUES (%s) ' \
+            'ON CONFLICT (%s) DO UPDATE SET %s' % (
+                quote(table), ', '.join(columns),
+                ', '.join([mark] * len(columns)), quote(key),
+                ', '.join('%s = excluded.%s' % (c, c) for c in columns[1:]))
+        if create:
+            self._create(key_type)
+
+    def _create(self, key_type):
+        columns = ['%s %s PRIMARY KEY' % (quote(self.key), key_type)] + \
+            ['%s TEXT' % quote(c) for c in RESULT_COLUMNS]
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('CREATE TABLE IF NOT EXISTS %s (%s)' % (
+                quote(self.table), ', '.join(columns)))
+        finally:
+            cursor.close()
+        self.conn.commit()
+
+    def last_key(self):
+        """Return the max key of the table (None if the table is empty)
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('SELECT MAX(%s) FROM %s' % (quote(self.key),
+                                                        quote(self.table)))
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    def write(self, keys, parsed):
+        """Upsert the parsed addresses of the keys, commit if commit_rows
+        rows are written since the last commit
+
+        :param parsed:  list of Address objects
+        """
+        rows = [[k] + [getattr(address, c) for c in RESULT_COLUMNS]
+                for k, address in zip(keys, parsed)]
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany(self._upsert, rows)
+        finally:
+            cursor.close()
+        self._uncommitted += len(rows)
+        if self._uncommitted >= self.commit_rows:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+
+# Worker process state: the splitter is created once per process
+_splitter = None
+
+
+def _init_worker(path, options):
+    global _splitter
+    _splitter = AddressSplitter.from_directory(path, **options)
+
+
+def _parse_rows(rows, splitter=None):
+    """Return (keys, parsed addresses, BatchStats) of the batch
+    """
+    parsed, stats = parse_batch(splitter or _splitter,
+                                [address for _, address in rows])
+    return [k for k, _ in rows], parsed, stats
+
+
+def _parse_parallel(batches, path, options, workers):
+    """Generate the results of _parse_rows of the batches parsed by the
+    worker processes in the order of the batches. The batches are read
+    in this thread (a connection can't be shared by the threads), at
+    most BATCHES_PER_WORKER batches per worker are read ahead.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers, _init_worker, (path, options))
+    try:
+        pending = deque()
+        for rows in batches:
+            if len(pending) == BATCHES_PER_WORKER * workers:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(_parse_rows, (rows,)))
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def parse_table(conn, table, path, options=None, key='id', column='address',
+                result_table='parsed_addresses', batch_size=1000,
+                commit_rows=10000, workers=0, resume=True,
+                paramstyle='qmark', key_type='INTEGER', result_conn=None):
+    """Parse the addresses of the table and write the parts to the result
+    table.
+
+    :param conn:            DB-API connection of the source table
+    :param path:            directory of the list files
+    :param options:         arguments of AddressSplitter.from_directory
+    :param key:             primary key column of the source table
+                            (the key column of the result table)
+    :param column:          address column of the source table
+    :param batch_size:      count of the rows of a batch
+    :param commit_rows:     count of the rows of a write transaction
+    :param workers:         count of worker processes, the batches are
+                            parsed in this process if 0 (CPU count
+                            if None)
+    :param resume:          start after the max key of the result table
+    :param paramstyle:      paramstyle of the driver (see PLACEHOLDERS)
+    :param key_type:        SQL type of the key of the result table
+    :param result_conn:     connection of the result table (conn
+                            if None)
+
+    :returns:   BatchStats of the parsed rows
+    """
+    options = options or {}
+    sink = ResultSink(result_conn or conn, result_table, key, paramstyle,
+                      commit_rows, key_type=key_type)
+    start = sink.last_key() if resume else None
+    batches = iter_rows(conn, table, key, column, batch_size, start,
+                        paramstyle)
+
+    if workers == 0:
+        splitter = AddressSplitter.from_directory(path, **options)
+        results = (_parse_rows(rows, splitter) for rows in batches)
+    else:
+        results = _parse_parallel(batches, path, options, workers)
+
+    total = BatchStats()
+    for keys, parsed, stats in results:
+        sink.write(keys, parsed)
+        total += stats
+    sink.commit()
+    return total
+
+
+if __name__ == '__main__':
+    import sqlite3
+
+    parser = argparse.ArgumentParser(
+        description=u'Parse the addresses of a table of SQLite database')
+    parser.add_argument('database', help=u'SQLite database file')
+    parser.add_argument('path', help=u'directory of the list files')
+    parser.add_argument('--table', required=True)
+    parser.add_argument('--key', default='id')
+    parser.add_argument('--column', default='address')
+    parser.add_argument('--result-table', default='parsed_addresses')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--commit-rows', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--restart', action='store_true',
+                        help=u'parse all rows (the result table is not '
+                             u'checked for the parsed rows)')
+    parser.add_argument('--city-list-file', default='cities.csv')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    try:
+        stats = parse_table(conn, args.table, args.path,
+                            dict(city_list_file=args.city_list_file),
+                            key=args.key, column=args.column,
+                            result_table=args.result_table,
+                            batch_size=args.batch_size,
+                            commit_rows=args.commit_rows,
+                            workers=args.workers,
+                            resume=not args.restart)
+    finally:
+        conn.close()
+    sys.stderr.write('%s\n' % stats)
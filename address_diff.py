@@ -0,0 +1,348 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Differential testing of the parsing engines.
+
+An engine parses an address in two stages: 'match' finds the candidate
+positions of the address parts, 'search' finds the best strategy among
+the candidates. The harness runs the reference engine and an
+alternative engine over a corpus (in parallel worker processes),
+reports every address where the parsed Address objects differ (with
+the candidates, the spans and the scores of both engines) and prints
+the time of every stage and the speedup of the alternative engine.
+
+The engines are registered by register_engine(name, factory), the
+factory is called in every worker as factory(path, options), path is
+the directory of the list files and options are the arguments of
+AddressSplitter.from_directory. The workers are forked, so the
+engines registered before run_diff are available in the workers.
+
+Usage:
+    python address_diff.py corpus.txt [options]
+"""
+
+import sys
+
+import json
+import multiprocessing
+from timeit import default_timer
+from itertools import islice
+
+from address_splitter import PARTS, AddressSplitter
+from address_batch import iter_batches
+from address_beam import BEAM_WIDTH, BEAM_WIDTHS
+
+STAGES = ['match', 'search']
+
+
+class SplitterEngine(object):
+    """Engine of AddressSplitter: the candidates are found by
+    _get_candidates, the strategy with the minimum score is searched
+    among all strategies (the same as get_best_strategy without
+    the cache).
+    """
+    def __init__(self, splitter):
+        self.splitter = splitter
+
+    def match(self, address):
+        return self.splitter._get_candidates(address)
+
+    def search(self, address, candidates):
+        """Return (best strategy, score)
+        """
+        best = None
+        best_score = None
+        for s in self.splitter._iter_strategies(address, candidates):
+            score = s.get_score()
+            if best is None or score < best_score:
+                best, best_score = s, score
+        return best, best_score
+
+    def parse(self, address):
+        """Return dict: address (Address), strategy, score, candidates,
+        times (dict: stage => seconds)
+        """
+        start = default_timer()
+        candidates = self.match(address)
+        matched = default_timer()
+        strategy, score = self.search(address, candidates)
+        finished = default_timer()
+
+        return dict(address=strategy.get_parsed_address(),
+                    strategy=strategy,
+                    score=score,
+                    candidates=candidates,
+                    times=dict(match=matched - start,
+                               search=finished - matched))
+
+
+class BeamEngine(SplitterEngine):
+    """Engine of the approximate beam search (see address_beam)
+    """
+    def __init__(self, splitter, width=None):
+        SplitterEngine.__init__(self, splitter)
+        self.width = width
+
+    def search(self, address, candidates):
+        return self.splitter._beam_search(address, candidates, self.width)
+
+
+ENGINES = {}
+
+
+def register_engine(name, factory):
+    """Register an engine.
+
+    :param name:    name of the engine
+    :param factory: function(path, options) that returns an object
+                    with parse(address) method (see SplitterEngine)
+    """
+    ENGINES[name] = factory
+
+
+def _splitter_engine(**defaults):
+    def factory(path, options):
+        params = dict(options)
+        params.update(defaults)
+        return SplitterEngine(AddressSplitter.from_directory(path, **params))
+    return factory
+
+
+# The original parser: every pattern is matched over the whole address
+register_engine('reference', _splitter_engine(use_scanners=False))
+# Digit run scanners for houses and indexes (see address_scanner)
+register_engine('scanners', _splitter_engine(use_scanners=True))
+# Literal trie and Aho-Corasick matchers (see address_matchers)
+register_engine('trie', _splitter_engine(matchers='trie'))
+register_engine('aho', _splitter_engine(matchers='aho'))
+
+
+def _beam_engine(width):
+    def factory(path, options):
+        return BeamEngine(AddressSplitter.from_directory(path, **options),
+                          width)
+    return factory
+
+
+# Approximate beam search: 'beam' of the default width, 'beam<width>'
+register_engine('beam', _beam_engine(BEAM_WIDTH))
+for _width in BEAM_WIDTHS:
+    register_engine('beam%d' % _width, _beam_engine(_width))
+
+
+def create_engine(name, path, options=None):
+    try:
+        factory = ENGINES[name]
+    except KeyError:
+        raise ValueError(u'Unknown engine "%s" (known engines: %s)' %
+                         (name, u', '.join(sorted(ENGINES))))
+    return factory(path, options or {})
+
+
+def strategy_spans(strategy):
+    """Return dict: part => (begin, end) or None
+    """
+    return {part: getattr(strategy, part + '_pos') for part in PARTS}
+
+
+def _describe(result):
+    return dict(parsed=result['address'].as_dict(),
+                spans=strategy_spans(result['strategy']),
+                score=float(result['score']),
+                candidates=dict(zip(PARTS, result['candidates'])))
+
+
+def compare(line, address, reference, alternative):
+    """Return the mismatch report or None if the engines parse the
+    address in the same way.
+
+    :param line:    line number of the address
+    :param reference, alternative:  results of engine.parse(address)
+    """
+    if reference['address'] == alternative['address']:
+        return None
+    return dict(line=line,
+                address=address,
+                reference=_describe(reference),
+                alternative=_describe(alternative))
+
+
+class DiffSummary(object):
+    """Counters of the differential run
+    """
+    def __init__(self):
+        self.rows = 0
+        self.mismatches = 0
+        self.times = dict(reference=dict.fromkeys(STAGES, 0.0),
+                          alternative=dict.fromkeys(STAGES, 0.0))
+
+    def add(self, rows, mismatches, times):
+        self.rows += rows
+        self.mismatches += mismatches
+        for side in self.times:
+            for stage in STAGES:
+                self.times[side][stage] += times[side].get(stage, 0.0)
+
+    def total(self, side, stage=None):
+        """Return time of the stage of the side ('reference' or
+        'alternative'), time of all stages if stage is None
+        """
+        stages = [stage] if stage else STAGES
+        return sum(self.times[side][s] for s in stages)
+
+    def speedup(self, stage=None):
+        """Return reference time / alternative time of the stage
+        (of all stages if stage is None)
+        """
+        alt = self.total('alternative', stage)
+        return self.total('reference', stage) / alt if alt else None
+
+    def format(self):
+        lines = [u'rows: %d, mismatches: %d' % (self.rows, self.mismatches),
+                 u'%-8s %12s %12s %8s' % (u'stage', u'reference',
+                                           u'alternative', u'speedup')]
+        for stage in STAGES + [None]:
+            speedup = self.speedup(stage)
+            lines.append(u'%-8s %11.3fs %11.3fs %8s' % (
+                stage or u'total',
+                self.total('reference', stage),
+                self.total('alternative', stage),
+                u'%.2fx' % speedup if speedup else u'-'))
+        return u'\n'.join(lines)
+
+
+# Worker process state: the engines are created once per process
+_engines = None
+
+
+def _init_worker(reference, alternative, path, options):
+    global _engines
+    _engines = (create_engine(reference, path, options),
+                create_engine(alternative, path, options))
+
+
+def _diff_chunk(chunk):
+    """Parse a chunk by both engines.
+
+    :param chunk:   (number of the first line, list of addresses)
+    :returns:       (rows, list of mismatches, times)
+    """
+    first_line, addresses = chunk
+    reference, alternative = _engines
+    times = dict(reference=dict.fromkeys(STAGES, 0.0),
+                 alternative=dict.fromkeys(STAGES, 0.0))
+    mismatches = []
+    for line, address in enumerate(addresses, first_line):
+        ref = reference.parse(address)
+        alt = alternative.parse(address)
+        for side, result in (('reference', ref), ('alternative', alt)):
+            for stage, seconds in result['times'].iteritems():
+                times[side][stage] = times[side].get(stage, 0.0) + seconds
+        mismatch = compare(line, address, ref, alt)
+        if mismatch:
+            mismatches.append(mismatch)
+
+    return len(addresses), mismatches, times
+
+
+def run_diff(addresses, alternative, path, options=None,
+             reference='reference', workers=None, chunk_size=100):
+    """Compare the engines over the addresses.
+
+    :param addresses:   iterable of address strings
+    :param alternative: name of the compared engine
+    :param path:        directory of the list files
+    :param options:     arguments of AddressSplitter.from_directory
+    :param reference:   name of the reference engine
+    :param workers:     count of worker processes (CPU count if None,
+                        0 to run in the current process)
+    :param chunk_size:  count of addresses sent to a worker at once
+
+    Generate (summary, mismatches) after every chunk: summary is the
+    DiffSummary of the processed chunks, mismatches is the list of the
+    mismatches of the chunk (the chunks are processed in order).
+    """
+    for name in (reference, alternative):
+        if name not in ENGINES:
+            raise ValueError(u'Unknown engine "%s"' % name)
+
+    chunks = _numbered_chunks(addresses, chunk_size)
+    initargs = (reference, alternative, path, options or {})
+    summary = DiffSummary()
+
+    if workers == 0:
+        _init_worker(*initargs)
+        results = (_diff_chunk(chunk) for chunk in chunks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, _init_worker, initargs)
+        results = pool.imap(_diff_chunk, chunks)
+
+    try:
+        for rows, mismatches, times in results:
+            summary.add(rows, len(mismatches), times)
+            yield summary, mismatches
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def _numbered_chunks(addresses, chunk_size):
+    line = 1
+    for batch in iter_batches(addresses, chunk_size):
+        yield line, batch
+        line += len(batch)
+
+
+def _read_corpus(filename, limit=None):
+    with open(filename) as f:
+        for line in islice(f, limit):
+            yield line.decode('utf-8').rstrip(u'\r\n')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Compare a parsing engine with the reference engine')
+    parser.add_argument('corpus', help='file of addresses (one per line)')
+    parser.add_argument('--engine', default='scanners',
+                        help='compared engine (%s)' % ', '.join(
+                            sorted(ENGINES)))
+    parser.add_argument('--reference', default='reference')
+    parser.add_argument('--path', default='csv_files/',
+                        help='directory of the list files')
+    parser.add_argument('--city-list', default='cities.csv',
+                        help='name of the city list file')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=None,
+                        help='count of the compared addresses')
+    parser.add_argument('--report', default=None,
+                        help='file for the mismatches (JSON lines), '
+                             'stdout by default')
+    args = parser.parse_args()
+
+    report = open(args.report, 'w') if args.report else sys.stdout
+    summary = None
+    try:
+        for summary, mismatches in run_diff(
+                _read_corpus(args.corpus, args.limit),
+                args.engine,
+                args.path,
+                options={'city_list_file': args.city_list},
+                reference=args.reference,
+                workers=args.workers,
+                chunk_size=args.chunk_size):
+            for mismatch in mismatches:
+                report.write(json.dumps(mismatch, ensure_ascii=False)
+                             .encode('utf-8') + '\n')
+    finally:
+        if args.report:
+            report.close()
+
+    if summary is not None:
+        sys.stderr.write(summary.format().encode('utf-8') + '\n')
+        if summary.mismatches:
+            sys.exit(1)
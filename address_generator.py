@@ -0,0 +1,384 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Generator of synthetic addresses for benchmarks and load tests.
+
+The address parts are sampled from the patterns of the list files
+(see csv_files/): every pattern is a regular expression, a random
+string matched by the pattern is built from its parse tree. The parts
+are joined in one of the usual orders, the noise options drop,
+reorder and damage the parts and add extra tokens.
+
+Every generated row has the ground truth labels: the text of every
+address part as it is written in the address (None for the absent
+parts) and the list of the applied noise kinds. The same seed and
+options give the same rows.
+
+Usage:
+    python address_generator.py count [options] > corpus.tsv
+"""
+
+import os
+import sys
+
+import json
+import random
+import sre_parse
+import sre_constants as sre
+
+# Address parts (the names of Address) and their list files
+PART_FILES = [
+    ('country', 'country_list_file'),
+    ('region', 'region_list_file'),
+    ('subregion', 'subregion_list_file'),
+    ('settlement', 'city_list_file'),
+    ('street', 'street_list_file'),
+    ('house', 'house_list_file'),
+]
+
+PARTS = ['index', 'country', 'region', 'subregion', 'settlement', 'street',
+         'house']
+
+# Usual orders of the address parts
+ORDERS = [
+    ['index', 'country', 'region', 'subregion', 'settlement', 'street',
+     'house'],
+    ['country', 'region', 'subregion', 'settlement', 'street', 'house',
+     'index'],
+    ['street', 'house', 'settlement', 'subregion', 'region', 'index',
+     'country'],
+    ['index', 'settlement', 'street', 'house'],
+]
+
+LETTERS = u'абвгдежзийклмнопрстуфхцчшщъыьэюя'
+DIGITS = u'0123456789'
+
+EXTRA_TOKENS = [u'кв. %d', u'кв %d', u'офис %d', u'подъезд %d', u'этаж %d',
+                u'корп. %d', u'стр. %d', u'а/я %d', u'тел. 8-%d']
+
+SEPARATORS = [u', ', u', ', u', ', u' ', u'; ', u',']
+
+# Count of the additional repetitions of unbounded repeats (' +', '*')
+MAX_REPEAT = 3
+
+BOM = u'﻿'
+
+
+def read_patterns(filename):
+    """Read patterns of a list file (empty lines are skipped)
+    """
+    with open(filename) as f:
+        names = [line.decode('utf-8').rstrip().lstrip(BOM) for line in f]
+    return [name for name in names if name]
+
+
+class RegexSampler(object):
+    """Build random strings matched by regular expressions
+    """
+    def __init__(self, rng):
+        """
+        :param rng:     random.Random object
+        """
+        self.rng = rng
+        self._parsed = {}
+
+    def sample(self, pattern):
+        parsed = self._parsed.get(pattern)
+        if parsed is None:
+            parsed = sre_parse.parse(pattern, sre.SRE_FLAG_UNICODE)
+            self._parsed[pattern] = parsed
+        groups = {}
+        return u''.join(self._items(parsed, groups))
+
+    def _items(self, items, groups):
+        out = []
+        for op, av in items:
+            out.extend(self._item(op, av, groups))
+        return out
+
+    def _item(self, op, av, groups):
+        rng = self.rng
+        if op == sre.LITERAL:
+            return [unichr(av)]
+        if op == sre.NOT_LITERAL:
+            return [self._choice_except(set([unichr(av)]))]
+        if op == sre.ANY:
+            return [rng.choice(LETTERS)]
+        if op == sre.IN:
+            return [self._in(av)]
+        if op in (sre.MAX_REPEAT, sre.MIN_REPEAT):
+            low, high, items = av
+            count = self._repeat_count(low, high)
+            out = []
+            for _ in range(count):
+                out.extend(self._items(items, groups))
+            return out
+        if op == sre.SUBPATTERN:
+            group, items = av[0], av[-1]
+            out = self._items(items, groups)
+            if group is not None:
+                groups[group] = out
+            return out
+        if op == sre.BRANCH:
+            return self._items(rng.choice(av[1]), groups)
+        if op == sre.GROUPREF:
+            return list(groups.get(av, []))
+        if op in (sre.AT, sre.ASSERT, sre.ASSERT_NOT):
+            return []
+
+        raise ValueError(u'Unsupported pattern item: %s' % op)
+
+    def _repeat_count(self, low, high):
+        rng = self.rng
+        if high - low <= MAX_REPEAT:
+            return rng.randint(low, high)
+        # Unbounded repeats: usually the minimal count
+        if rng.random() < 0.8:
+            return low
+        return low + rng.randint(1, MAX_REPEAT)
+
+    def _in(self, items):
+        chars = []
+        negate = False
+        for op, av in items:
+            if op == sre.NEGATE:
+                negate = True
+            elif op == sre.LITERAL:
+                chars.append(unichr(av))
+            elif op == sre.RANGE:
+                low, high = av
+                if negate:
+                    chars.extend(unichr(c) for c in range(low, high + 1))
+                else:
+                    chars.append(unichr(self.rng.randint(low, high)))
+            elif op == sre.CATEGORY:
+                chars.extend(self._category(av))
+        if negate:
+            return self._choice_except(set(chars))
+        return self.rng.choice(chars)
+
+    @staticmethod
+    def _category(category):
+        if category in (sre.CATEGORY_DIGIT, sre.CATEGORY_UNI_DIGIT):
+            return DIGITS
+        if category in (sre.CATEGORY_SPACE, sre.CATEGORY_UNI_SPACE):
+            return u' '
+        if category in (sre.CATEGORY_WORD, sre.CATEGORY_UNI_WORD):
+            return LETTERS
+        if category in (sre.CATEGORY_NOT_DIGIT, sre.CATEGORY_UNI_NOT_DIGIT):
+            return LETTERS
+        if category in (sre.CATEGORY_NOT_WORD, sre.CATEGORY_UNI_NOT_WORD):
+            return u' -'
+        return LETTERS + DIGITS
+
+    def _choice_except(self, excluded):
+        chars = [c for c in LETTERS + DIGITS + u' -' if c not in excluded]
+        return self.rng.choice(chars)
+
+
+class NoiseOptions(object):
+    """Probabilities of the noise kinds
+    """
+    def __init__(self,
+                 missing=0.2,
+                 reorder=0.05,
+                 typo=0.05,
+                 extra=0.1,
+                 long_address=0.01,
+                 capitalize=0.7):
+        """
+        :param missing:     probability to drop an address part
+        :param reorder:     probability to shuffle the parts of an address
+        :param typo:        probability of a typo in an address part
+        :param extra:       probability of extra tokens (flat, office...)
+        :param long_address: probability of a very long address
+                            (many extra tokens)
+        :param capitalize:  probability to capitalize the words of a part
+        """
+        self.missing = missing
+        self.reorder = reorder
+        self.typo = typo
+        self.extra = extra
+        self.long_address = long_address
+        self.capitalize = capitalize
+
+    @classmethod
+    def clean(cls):
+        """Options without noise
+        """
+        return cls(missing=0, reorder=0, typo=0, extra=0, long_address=0,
+                   capitalize=0)
+
+
+class AddressGenerator(object):
+    """Random addresses with the ground truth labels
+    """
+    def __init__(self, lists, seed=0, noise=None):
+        """
+        :param lists:   dict: address part => list of patterns
+                        (see PART_FILES)
+        :param seed:    seed of the random generator
+        :param noise:   NoiseOptions object
+        """
+        self.lists = {part: patterns for part, patterns in lists.items()
+                      if patterns}
+        self.noise = noise or NoiseOptions()
+        self.rng = random.Random(seed)
+        self.sampler = RegexSampler(self.rng)
+
+    @classmethod
+    def from_directory(cls, path, seed=0, noise=None, **files):
+        """Create generator from a directory of list files.
+
+        :param files:   file names that override the defaults
+                        (see address_splitter.LIST_FILES), e.g.
+                        city_list_file='cities_big.csv'
+        """
+        from address_splitter import LIST_FILES
+
+        lists = {}
+        for part, param in PART_FILES:
+            filename = os.path.join(path, files.get(param, LIST_FILES[param]))
+            lists[part] = read_patterns(filename)
+
+        return cls(lists, seed=seed, noise=noise)
+
+    def _part(self, part):
+        if part == 'index':
+            return u'%06d' % self.rng.randint(100000, 699999)
+        patterns = self.lists.get(part)
+        if not patterns:
+            return None
+        text = self.sampler.sample(self.rng.choice(patterns)).strip()
+        return text or None
+
+    def _typo(self, text):
+        rng = self.rng
+        letters = [i for i, c in enumerate(text) if c.isalpha()]
+        if not letters:
+            return text
+        i = rng.choice(letters)
+        kind = rng.randint(0, 3)
+        if kind == 0 and i + 1 < len(text):
+            return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+        if kind == 1 and len(text) > 1:
+            return text[:i] + text[i + 1:]
+        if kind == 2:
+            return text[:i] + text[i] + text[i:]
+        return text[:i] + rng.choice(LETTERS) + text[i + 1:]
+
+    def _extra(self):
+        return self.rng.choice(EXTRA_TOKENS) % self.rng.randint(1, 999)
+
+    def generate(self):
+        """Return (address, labels, noise): labels is the dict of the
+        address parts (the text as it is written in the address or None),
+        noise is the list of the applied noise kinds.
+        """
+        rng = self.rng
+        options = self.noise
+        noise = []
+
+        order = list(rng.choice(ORDERS))
+        if rng.random() < options.reorder:
+            rng.shuffle(order)
+            noise.append('reorder')
+
+        labels = dict.fromkeys(PARTS)
+        tokens = []
+        for part in order:
+            if rng.random() < options.missing:
+                if 'missing' not in noise:
+                    noise.append('missing')
+                continue
+            text = self._part(part)
+            if text is None:
+                continue
+            if rng.random() < options.capitalize:
+                text = u' '.join(w.capitalize() for w in text.split(u' '))
+            if rng.random() < options.typo:
+                text = self._typo(text)
+                if 'typo' not in noise:
+                    noise.append('typo')
+            labels[part] = text
+            tokens.append(text)
+
+        extra = 0
+        if rng.random() < options.extra:
+            extra = rng.randint(1, 2)
+            noise.append('extra')
+        if rng.random() < options.long_address:
+            extra += rng.randint(20, 50)
+            noise.append('long')
+        for _ in range(extra):
+            tokens.insert(rng.randint(0, len(tokens)), self._extra())
+
+        separator = rng.choice(SEPARATORS)
+        return separator.join(tokens), labels, noise
+
+    def __iter__(self):
+        while True:
+            yield self.generate()
+
+
+def format_row(address, labels, noise, fmt='tsv'):
+    """Return a line of the corpus (unicode without the line end)
+
+    :param fmt:     'tsv' -- address, parts (see PARTS) and noise kinds
+                    separated by tabs; 'jsonl' -- JSON object
+    """
+    if fmt == 'jsonl':
+        return json.dumps(dict(address=address, labels=labels, noise=noise),
+                          ensure_ascii=False, sort_keys=True)
+    if fmt == 'tsv':
+        fields = [address] + [labels[part] or u'' for part in PARTS] + \
+            [u','.join(noise)]
+        return u'\t'.join(f.replace(u'\t', u' ') for f in fields)
+    raise ValueError(u'Unknown format "%s"' % fmt)
+
+
+def write_corpus(generator, count, out, fmt='tsv'):
+    """Write count rows of the generator to the file object out
+    (utf-8, one row per line)
+    """
+    if fmt == 'tsv':
+        out.write(u'\t'.join(['address'] + PARTS + ['noise'])
+                  .encode('utf-8') + '\n')
+    for _ in xrange(count):
+        out.write(format_row(*generator.generate(), fmt=fmt)
+                  .encode('utf-8') + '\n')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic addresses with labels')
+    parser.add_argument('count', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--path', default='csv_files/',
+                        help='directory of the list files')
+    parser.add_argument('--city-list', default='cities.csv',
+                        help='name of the city list file')
+    parser.add_argument('--format', default='tsv', choices=['tsv', 'jsonl'])
+    parser.add_argument('--clean', action='store_true',
+                        help='generate addresses without noise')
+    for name, default in [('missing', 0.2), ('reorder', 0.05),
+                          ('typo', 0.05), ('extra', 0.1),
+                          ('long-address', 0.01)]:
+        parser.add_argument('--' + name, type=float, default=default,
+                            help='probability (default %s)' % default)
+    args = parser.parse_args()
+
+    if args.clean:
+        noise = NoiseOptions.clean()
+    else:
+        noise = NoiseOptions(missing=args.missing,
+                             reorder=args.reorder,
+                             typo=args.typo,
+                             extra=args.extra,
+                             long_address=args.long_address)
+    generator = AddressGenerator.from_directory(
+        args.path, seed=args.seed, noise=noise,
+        city_list_file=args.city_list)
+    write_corpus(generator, args.count, sys.stdout, args.format)
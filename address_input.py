@@ -0,0 +1,249 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Random access to the lines of large address files.
+
+The file is memory-mapped and the offsets of its lines are found in one
+scan (numpy search of the line ends by blocks). The offsets are cached
+in the file <name>.idx.npz near the address file with the size and the
+mtime of the address file, the cache is used while they are the same
+(the offsets are kept in memory only if the cache can't be written,
+e.g. in a read-only directory). A range of lines is a range of
+bytes of the file, so the workers get (first line, begin, end) and
+decode their own lines only; parsing from line N or of a subset of
+lines doesn't read the preceding lines.
+"""
+
+import os
+
+import mmap
+import multiprocessing
+from timeit import default_timer
+
+import numpy as np
+
+from address_splitter import AddressSplitter
+from address_batch import parse_batch
+
+# Size of the block of the file scanned at once
+SCAN_BLOCK = 64 * 1024 * 1024
+
+INDEX_SUFFIX = '.idx.npz'
+
+# Interval of the checks of the workers while a result is waited (seconds)
+CHECK_INTERVAL = 1.0
+
+
+def _map(f):
+    """Return read-only mmap of the file, None for an empty file
+    """
+    if os.fstat(f.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def scan_offsets(filename):
+    """Return numpy array of the offsets of the line beginnings and the
+    file size (the array has lines + 1 items)
+    """
+    with open(filename, 'rb') as f:
+        data = _map(f)
+        if data is None:
+            return np.zeros(1, dtype=np.int64)
+        try:
+            size = len(data)
+            parts = [np.zeros(1, dtype=np.int64)]
+            for start in xrange(0, size, SCAN_BLOCK):
+                block = np.frombuffer(data[start:start + SCAN_BLOCK],
+                                      dtype=np.uint8)
+                ends = np.flatnonzero(block == ord('\n'))
+                parts.append(ends.astype(np.int64) + (start + 1))
+        finally:
+            data.close()
+
+    offsets = np.concatenate(parts)
+    if offsets[-1] != size:
+        # The last line has no line end
+        offsets = np.append(offsets, size)
+    return offsets
+
+
+class LineIndex(object):
+    """Offsets of the lines of an address file
+    """
+    def __init__(self, filename, cache=True):
+        """
+        :param filename:    file of addresses (utf-8, one per line)
+        :param cache:       load and save the offsets in the cache file
+                            (filename + INDEX_SUFFIX)
+        """
+        self.filename = filename
+        self.index_file = filename + INDEX_SUFFIX
+        self.offsets = self._load() if cache else None
+        if self.offsets is None:
+            self.offsets = scan_offsets(filename)
+            if cache:
+                self._save()
+
+    def _load(self):
+        """Return the cached offsets or None if the cache is absent
+        or outdated
+        """
+        try:
+            stat = os.stat(self.filename)
+            with open(self.index_file, 'rb') as f:
+                cached = np.load(f)
+                size, mtime = cached['size'], cached['mtime']
+                offsets = cached['offsets']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        if size != stat.st_size or mtime != stat.st_mtime or \
+                len(offsets) == 0 or offsets[-1] != stat.st_size:
+            return None
+        return offsets
+
+    def _save(self):
+        """Write the cache file, the errors are ignored (the offsets
+        are kept in memory)
+        """
+        stat = os.stat(self.filename)
+        tmp = '%s.%d.tmp' % (self.index_file, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                np.savez(f, offsets=self.offsets, size=stat.st_size,
+                         mtime=stat.st_mtime)
+            os.rename(tmp, self.index_file)
+        except (IOError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def byte_range(self, first, last=None):
+        """Return (begin, end) bytes of the lines first <= line < last
+        (the lines are numbered from 0)
+        """
+        if last is None or last > len(self):
+            last = len(self)
+        first = min(max(first, 0), last)
+        return int(self.offsets[first]), int(self.offsets[last])
+
+    def lines(self, first=0, last=None):
+        """Return list of the lines first <= line < last (decoded,
+        without line ends)
+        """
+        begin, end = self.byte_range(first, last)
+        return read_lines(self.filename, begin, end)
+
+    def iter_lines(self, first=0, last=None, chunk_lines=10000):
+        """Generate the lines first <= line < last reading them
+        by chunks
+        """
+        for _, begin, end in self.chunks(chunk_lines, first, last):
+            for line in read_lines(self.filename, begin, end):
+                yield line
+
+    def chunks(self, chunk_lines, first=0, last=None):
+        """Return list of (first line, begin, end) of the chunks
+        of chunk_lines lines
+        """
+        if chunk_lines < 1:
+            raise ValueError(u'Chunk size must be positive, got %s' %
+                             chunk_lines)
+        if last is None or last > len(self):
+            last = len(self)
+        return [(line,) + self.byte_range(line, line + chunk_lines)
+                for line in xrange(max(first, 0), last, chunk_lines)]
+
+
+def read_lines(filename, begin, end):
+    """Return the lines of the byte range (decoded, without line ends)
+    """
+    if begin >= end:
+        return []
+    with open(filename, 'rb') as f:
+        data = _map(f)
+        try:
+            text = data[begin:end]
+        finally:
+            data.close()
+    if text.endswith('\n'):
+        text = text[:-1]
+    return [line.decode('utf-8').rstrip(u'\r') for line in text.split('\n')]
+
+
+# Worker process state: the splitter is created once per process
+_splitter = None
+
+
+def _init_worker(path, options):
+    global _splitter
+    _splitter = AddressSplitter.from_directory(path, **options)
+
+
+def _parse_chunk(args):
+    filename, (first, begin, end) = args
+    lines = read_lines(filename, begin, end)
+    parsed, _ = parse_batch(_splitter, lines)
+    return first, lines, parsed
+
+
+def worker_pids(pool):
+    """Return set of the pids of the worker processes of the pool (the
+    pool replaces a dead worker by a new process, the task of the dead
+    worker is lost)
+    """
+    return set(process.pid for process in pool._pool)
+
+
+def check_workers(pool, pids, started, timeout=None):
+    """Raise RuntimeError if a worker process of the pool is replaced
+    (its pids differ from the pids) or timeout seconds passed since
+    started (default_timer value)
+    """
+    if worker_pids(pool) != pids:
+        raise RuntimeError(u'A worker process died, its task is lost')
+    if timeout is not None and default_timer() - started >= timeout:
+        raise RuntimeError(u'No result in %s s' % timeout)
+
+
+def wait_task(task, pool, pids, timeout=None):
+    """Return the result of the task (AsyncResult) of the pool
+
+    :param pids:    pids of the worker processes (see worker_pids)
+    :param timeout: max time of waiting (seconds, not limited if None)
+    :raises:        the error of the task, RuntimeError (see
+                    check_workers)
+    """
+    started = default_timer()
+    while True:
+        # AsyncResult.get without a timeout can't be interrupted by Ctrl+C
+        task.wait(CHECK_INTERVAL)
+        if task.ready():
+            return task.get()
+        check_workers(pool, pids, started, timeout)
+
+
+def parse_file(filename, path, options=None, workers=None, chunk_lines=1000,
+               first=0, last=None):
+    """Parse the lines first <= line < last of the file in worker
+    processes.
+
+    :param path:        directory of the list files
+    :param options:     arguments of AddressSplitter.from_directory
+    :param workers:     count of worker processes (CPU count if None)
+
+    Generate (number of the first line, lines, parsed addresses) of the
+    chunks in the order of the lines.
+    """
+    index = LineIndex(filename)
+    chunks = [(filename, chunk)
+              for chunk in index.chunks(chunk_lines, first, last)]
+    pool = multiprocessing.Pool(workers, _init_worker, (path, options or {}))
+    try:
+        for result in pool.imap(_parse_chunk, chunks):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,270 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Search of duplicates among parsed addresses (record linkage).
+
+The records are not compared pairwise. Every record gets blocking keys:
+the normalized values of a set of address parts, e.g.
+('settlement', 'street', 'house'). The records with the same key are
+the candidate duplicates.
+
+BlockingIndex keeps the record ids in the buckets of the keys in memory
+(the Address objects are not kept), so its size grows with the count of
+the records. find_duplicates doesn't keep an index: the (key, record id)
+pairs are sorted externally (KeySorter: the sorted runs of run_size
+pairs are written to temporary files and merged) and the groups are
+taken from the stream sorted by key (sorted_groups), only the records
+of the current group are kept in memory.
+
+Sorted neighbourhood mode joins the buckets of close keys: the
+distinct keys are sorted and every window of `window` neighbouring
+keys forms a candidate group (it finds the keys that differ in the
+last symbols, e.g. '18' and '18а').
+"""
+
+import re
+import heapq
+import cPickle
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+from collections import OrderedDict, deque
+
+from address import Address
+
+# Count of the (key, record id) pairs of a sorted run kept in memory
+RUN_SIZE = 100000
+
+
+def normalize_part(value):
+    """Return the normalized value of an address part: lowercased
+    words separated by single spaces (punctuation is dropped).
+    """
+    return u' '.join(re.findall(r'\w+', value.lower(), re.U))
+
+
+class BlockingIndex(object):
+    """Hash index of record ids by blocking keys
+    """
+    def __init__(self, part_sets, window=None):
+        """
+        :param part_sets:   list of the part sets used for blocking keys,
+                            the parts are the names from
+                            Address.address_parts_list()
+                            (e.g. [['settlement', 'street', 'house']])
+        :param window:      size of sorted neighbourhood window (count
+                            of neighbouring keys in a group), None or 1
+                            for the exact keys only
+        """
+        parts = set(Address.address_parts_list())
+        for part_set in part_sets:
+            for part in part_set:
+                if part not in parts:
+                    raise ValueError(u'Unknown address part "%s"' % part)
+        if window is not None and window < 1:
+            raise ValueError(u'Window must be positive, got %s' % window)
+
+        self.part_sets = [tuple(p) for p in part_sets]
+        self.window = window
+        # One hash index for every part set: key => list of record ids
+        self._buckets = [dict() for _ in self.part_sets]
+        self.records = 0
+
+    def blocking_keys(self, address):
+        """Return list of the blocking keys of the address
+        (one key or None for every part set; None if a part
+        of the set is absent in the address).
+
+        :param address: Address object
+        """
+        keys = []
+        for part_set in self.part_sets:
+            key = tuple(normalize_part(getattr(address, part) or u'')
+                        for part in part_set)
+            keys.append(key if all(key) else None)
+
+        return keys
+
+    def add(self, record_id, address):
+        """Add the record to the index
+
+        :param record_id:   id of the record (any hashable object)
+        :param address:     parsed address of the record (Address)
+        """
+        for buckets, key in zip(self._buckets, self.blocking_keys(address)):
+            if key is not None:
+                buckets.setdefault(key, []).append(record_id)
+        self.records += 1
+
+    def add_all(self, records):
+        """Add iterable of (record_id, address) pairs to the index
+        """
+        for record_id, address in records:
+            self.add(record_id, address)
+
+    def key_count(self):
+        """Return count of distinct keys for every part set
+        """
+        return [len(buckets) for buckets in self._buckets]
+
+    def candidate_groups(self, min_size=2):
+        """Generate groups of candidate duplicates.
+
+        :param min_size:    min count of records in a group
+
+        Generate (part_set, keys, record_ids) tuples: part_set is the
+        tuple of the parts used for the keys, keys is the list of the
+        keys of the group (one key in the exact mode).
+        """
+        for part_set, buckets in zip(self.part_sets, self._buckets):
+            if not self.window or self.window == 1:
+                for key, ids in buckets.iteritems():
+                    if len(ids) >= min_size:
+                        yield part_set, [key], list(ids)
+            else:
+                pairs = ((key, record_id) for key in sorted(buckets)
+                         for record_id in buckets[key])
+                for keys, ids in sorted_groups(pairs, self.window):
+                    if len(ids) >= min_size:
+                        yield part_set, keys, ids
+
+
+class KeySorter(object):
+    """External sort of (key, record id) pairs: the pairs are sorted
+    by runs of run_size pairs, the runs are written to temporary files
+    and merged. The pairs of the same key keep the order of addition.
+    """
+    def __init__(self, run_size=RUN_SIZE):
+        self.run_size = run_size
+        self._run = []
+        self._files = []
+        self._count = 0
+
+    def add(self, key, record_id):
+        # The number of the pair orders the pairs of a key, the record
+        # ids are not compared
+        self._run.append((key, self._count, record_id))
+        self._count += 1
+        if len(self._run) >= self.run_size:
+            self._spill()
+
+    def _spill(self):
+        self._run.sort()
+        f = tempfile.TemporaryFile()
+        for item in self._run:
+            cPickle.dump(item, f, cPickle.HIGHEST_PROTOCOL)
+        self._files.append(f)
+        self._run = []
+
+    def pairs(self):
+        """Generate the (key, record id) pairs in the order of the keys
+        """
+        self._run.sort()
+        runs = [_read_run(f) for f in self._files] + [iter(self._run)]
+        for key, _, record_id in heapq.merge(*runs):
+            yield key, record_id
+
+    def close(self):
+        """Remove the temporary files of the runs
+        """
+        for f in self._files:
+            f.close()
+        self._files = []
+        self._run = []
+
+
+def _read_run(f):
+    f.seek(0)
+    while True:
+        try:
+            yield cPickle.load(f)
+        except EOFError:
+            return
+
+
+def sorted_groups(pairs, window=None):
+    """Generate (keys, record ids) of the groups of a stream of
+    (key, record id) pairs sorted by key: the records of every key
+    (window None or 1) or the windows of sorted neighbourhood (one
+    window if there are less keys than the window size). Only the
+    records of the current window are kept in memory.
+    """
+    buckets = ((key, [record_id for _, record_id in group])
+               for key, group in groupby(pairs, key=itemgetter(0)))
+    if not window or window == 1:
+        for key, ids in buckets:
+            yield [key], ids
+        return
+
+    last = deque(maxlen=window)
+    full = False
+    for bucket in buckets:
+        last.append(bucket)
+        if len(last) == window:
+            full = True
+            yield _window_group(last)
+    if last and not full:
+        yield _window_group(last)
+
+
+def _window_group(buckets):
+    return [key for key, _ in buckets], \
+        [record_id for _, ids in buckets for record_id in ids]
+
+
+def find_duplicates(records, part_sets, window=None, min_size=2,
+                    run_size=RUN_SIZE):
+    """Generate the groups of candidate duplicates of the records (see
+    BlockingIndex.candidate_groups) in the order of the keys. The keys
+    are sorted externally (see KeySorter), so the memory doesn't grow
+    with the count of the records.
+
+    :param records:     iterable of (record_id, Address) pairs
+    :param run_size:    count of the keys sorted in memory
+    """
+    index = BlockingIndex(part_sets, window=window)
+    sorters = [KeySorter(run_size) for _ in index.part_sets]
+    try:
+        for record_id, address in records:
+            for sorter, key in zip(sorters, index.blocking_keys(address)):
+                if key is not None:
+                    sorter.add(key, record_id)
+        for part_set, sorter in zip(index.part_sets, sorters):
+            for keys, ids in sorted_groups(sorter.pairs(), window):
+                if len(ids) >= min_size:
+                    yield part_set, keys, ids
+    finally:
+        for sorter in sorters:
+            sorter.close()
+
+
+def merge_groups(groups):
+    """Join the candidate groups that share records (connected
+    components, union-find). Return list of sets of record ids.
+
+    :param groups:  iterable of (part_set, keys, record_ids) tuples
+    """
+    parent = OrderedDict()
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for _, _, ids in groups:
+        for record_id in ids:
+            parent.setdefault(record_id, record_id)
+        root = find(ids[0])
+        for record_id in ids[1:]:
+            other = find(record_id)
+            if other != root:
+                parent[other] = root
+
+    components = OrderedDict()
+    for record_id in parent:
+        components.setdefault(find(record_id), set()).add(record_id)
+
+    return components.values()
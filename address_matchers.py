@@ -0,0 +1,613 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Matcher backends of the gazetteer categories.
+
+A matcher finds the positions of the patterns of a category in an
+address. The result of find_all(address) is the same as the result of
+AddressSplitter._get_positions(address, patterns): dict found text =>
+list of positions.
+
+Backends:
+    regex   -- every pattern is matched by re.finditer (the reference)
+    trie    -- the patterns with a finite short language (e.g.
+               'алтайск((ий)|(ой))') are expanded into literals that are
+               searched in a trie from every word boundary; the other
+               patterns are matched by re.finditer if the address
+               contains their anchor (the longest literal that every
+               match contains, e.g. 'абазинск')
+    aho     -- the same literals and anchors searched in one pass by the
+               Aho-Corasick automaton of the pyahocorasick library
+               (available if the library is installed)
+    scanner -- digit run scanner for the house list (see address_scanner)
+
+The literals of a pattern are listed in the order the regular
+expression engine tries them, so the first literal found at a position
+is the text the pattern matches there (the non-overlapping matches
+of re.finditer are kept).
+
+Backend 'auto' is 'aho' if the library is installed, else 'trie'.
+
+Usage (build a matcher and save it):
+    python address_matchers.py backend list_file output_file
+"""
+
+import sys
+
+import re
+import cPickle
+import weakref
+import sre_parse
+import sre_constants as sre
+
+from address_scanner import HouseScanner
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Max count of the literals of a pattern (the patterns with more literals
+# are matched by re.finditer)
+MAX_LITERALS = 64
+
+# Max size of a character set expanded into literals
+MAX_SET = 64
+
+
+# Compiled patterns shared by the lists of the process: name => compiled
+# pattern (kept while a list uses it)
+_shared = weakref.WeakValueDictionary()
+
+
+def compile_pattern(name):
+    """Compile a pattern of the list file (the same as
+    AddressSplitter._compile). The compiled pattern is shared by all
+    lists of the process that contain the pattern.
+    """
+    compiled = _shared.get(name)
+    if compiled is None:
+        compiled = re.compile(r'\b' + name + r'\b', re.I | re.U)
+        _shared[name] = compiled
+    return compiled
+
+
+def _product(prefixes, suffixes):
+    if prefixes is None or suffixes is None:
+        return None
+    result = [p + s for p in prefixes for s in suffixes]
+    return result if len(result) <= MAX_LITERALS else None
+
+
+def _expand_items(items):
+    """Return list of the strings matched by the items in the order
+    of the backtracking, None if the items can't be expanded
+    """
+    result = [u'']
+    for op, av in items:
+        result = _product(result, _expand_item(op, av))
+        if result is None:
+            return None
+    return result
+
+
+def _expand_item(op, av):
+    if op == sre.LITERAL:
+        return [unichr(av).lower()]
+    if op == sre.IN:
+        chars = []
+        for o, a in av:
+            if o == sre.LITERAL:
+                chars.append(unichr(a).lower())
+            elif o == sre.RANGE and a[1] - a[0] < MAX_SET:
+                # The bounds of case insensitive ranges are lowercased
+                # and compared with the lowercased symbols (the address
+                # is lowercased)
+                low, high = [ord(unichr(c).lower()) for c in a]
+                chars.extend(c for c in map(unichr, range(low, high + 1))
+                             if c.lower() == c)
+            else:
+                return None
+        return chars if len(chars) <= MAX_SET else None
+    if op == sre.SUBPATTERN:
+        return _expand_items(av[-1])
+    if op == sre.BRANCH:
+        result = []
+        for branch in av[1]:
+            expanded = _expand_items(branch)
+            if expanded is None:
+                return None
+            result.extend(expanded)
+        return result if len(result) <= MAX_LITERALS else None
+    if op in (sre.MAX_REPEAT, sre.MIN_REPEAT):
+        low, high, items = av
+        if high > MAX_LITERALS:
+            return None
+        inner = _expand_items(items)
+        if inner is None:
+            return None
+        return _expand_repeat(inner, low, high, op == sre.MAX_REPEAT)
+
+    return None
+
+
+def _expand_repeat(inner, low, high, greedy, count=0):
+    """Strings of the repeat in the backtracking order: the greedy
+    repeat tries one more item first, the lazy one tries to stop first
+    """
+    more = []
+    if count < high:
+        more = _product(inner,
+                        _expand_repeat(inner, low, high, greedy, count + 1))
+        if more is None:
+            return None
+    stop = [u''] if count >= low else []
+    result = more + stop if greedy else stop + more
+    return result if len(result) <= MAX_LITERALS else None
+
+
+def expand_pattern(name):
+    """Return list of the literals of the pattern in the order of the
+    backtracking (duplicates are removed), None if the pattern can't
+    be expanded or can match an empty string
+    """
+    try:
+        parsed = sre_parse.parse(name, re.I | re.U)
+    except (sre.error, OverflowError):
+        return None
+    literals = _expand_items(list(parsed))
+    if not literals or u'' in literals:
+        return None
+
+    seen = set()
+    result = []
+    for literal in literals:
+        if literal not in seen:
+            seen.add(literal)
+            result.append(literal)
+    return result
+
+
+# Min length of the anchor of a pattern
+MIN_ANCHOR = 3
+
+
+def _fragments(items, fragments):
+    """Add the literal fragments of the mandatory items to fragments
+    (the last fragment is continued)
+    """
+    for op, av in items:
+        if op == sre.LITERAL:
+            fragments[-1] += unichr(av).lower()
+        elif op == sre.SUBPATTERN and \
+                all(o != sre.BRANCH for o, _ in av[-1]):
+            _fragments(av[-1], fragments)
+        else:
+            fragments.append(u'')
+
+
+def required_literal(name):
+    """Return the longest literal that is contained in every match of
+    the pattern (lowercased), None if there is no such literal at least
+    MIN_ANCHOR symbols long
+    """
+    try:
+        parsed = sre_parse.parse(name, re.I | re.U)
+    except (sre.error, OverflowError):
+        return None
+    fragments = [u'']
+    _fragments(list(parsed), fragments)
+    anchor = max(fragments, key=len)
+    return anchor if len(anchor) >= MIN_ANCHOR else None
+
+
+def _word_bounds(text):
+    """Return list of len(text) + 1 flags: \\b is true at the position
+    (the rule of the unicode patterns)
+    """
+    word = [c.isalnum() or c == u'_' for c in text] + [False]
+    bounds = [word[0]]
+    for i in range(1, len(word)):
+        bounds.append(word[i - 1] != word[i])
+    return bounds
+
+
+class Matcher(object):
+    """Base class of the matchers.
+
+    :param patterns:    dict of the category: name => compiled pattern
+    """
+    name = None
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self._names = list(patterns)
+
+    @classmethod
+    def build(cls, patterns):
+        return cls(patterns)
+
+    def find_all(self, address, per_pattern=None):
+        """Return dict: found text => list of positions
+
+        :param per_pattern: dict, the positions of the patterns tried
+                            on the address (matched by the regular
+                            expression or found among the literals)
+                            are added to it: name => list of positions
+        """
+        raise NotImplementedError
+
+    def _collect(self, address, found):
+        """Join positions of the patterns in the order of the patterns
+        (as _get_positions does)
+
+        :param found:   dict: name => list of positions
+        """
+        res = dict()
+        for name in self._names:
+            for begin, end in found.get(name, ()):
+                try:
+                    res[address[begin:end]].append((begin, end))
+                except KeyError:
+                    res[address[begin:end]] = [(begin, end)]
+        return res
+
+    def _state(self):
+        return dict(names=self._names)
+
+    def dumps(self):
+        """Return the matcher serialized into a string
+        """
+        return cPickle.dumps((self.name, self._state()), 2)
+
+    @classmethod
+    def loads(cls, data, patterns=None):
+        """Restore the matcher from the string of dumps().
+
+        :param patterns:    dict of compiled patterns, the patterns are
+                            compiled if None (only the patterns that
+                            are matched by regular expressions)
+        """
+        name, state = cPickle.loads(data)
+        matcher_class = get_matcher_class(name)
+        if patterns is None:
+            patterns = PatternTable(state['names'])
+        matcher = matcher_class.__new__(matcher_class)
+        matcher.patterns = patterns
+        matcher._names = state['names']
+        matcher._restore(state)
+        return matcher
+
+    def _restore(self, state):
+        pass
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(self.dumps())
+
+    @classmethod
+    def load(cls, filename, patterns=None):
+        with open(filename, 'rb') as f:
+            return cls.loads(f.read(), patterns)
+
+
+class PatternTable(dict):
+    """Dict of the patterns of a list: name => compiled pattern, a pattern
+    is compiled on the first use (the matchers and the scanners use the
+    compiled patterns of a part of the list only)
+    """
+    def __init__(self, names=()):
+        dict.__init__(self, dict.fromkeys(names))
+
+    def __getitem__(self, name):
+        compiled = dict.__getitem__(self, name)
+        if compiled is None:
+            compiled = compile_pattern(name)
+            self[name] = compiled
+        return compiled
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def compiled_count(self):
+        """Return count of the compiled patterns
+        """
+        return sum(1 for compiled in self.itervalues_raw()
+                   if compiled is not None)
+
+    def itervalues_raw(self):
+        """Generate the stored values (None for the patterns that are
+        not compiled)
+        """
+        return dict.itervalues(self)
+
+    def iteritems(self):
+        for name in self:
+            yield name, self[name]
+
+    def itervalues(self):
+        for name in self:
+            yield self[name]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def copy(self):
+        table = PatternTable()
+        dict.update(table, dict.iteritems(self))
+        return table
+
+
+class RegexMatcher(Matcher):
+    """Reference matcher: re.finditer of every pattern
+    """
+    name = 'regex'
+
+    def find_all(self, address, per_pattern=None):
+        address = address.lower()
+        found = {}
+        for name in self._names:
+            found[name] = [m.span()
+                           for m in self.patterns[name].finditer(address)]
+        if per_pattern is not None:
+            per_pattern.update(found)
+        return self._collect(address, found)
+
+
+class TrieMatcher(Matcher):
+    """The literals of the patterns are searched in a trie
+    (see the module description)
+    """
+    name = 'trie'
+
+    def __init__(self, patterns):
+        Matcher.__init__(self, patterns)
+        literals = {}
+        anchors = {}
+        for name in self._names:
+            expanded = expand_pattern(name)
+            if expanded is not None:
+                literals[name] = expanded
+                continue
+            anchor = required_literal(name)
+            if anchor is not None:
+                anchors[name] = anchor
+        self._init_index(literals, anchors)
+
+    def _init_index(self, literals, anchors):
+        """
+        :param literals:    dict: name => list of literals
+        :param anchors:     dict: name => required literal (for the
+                            patterns that are not expanded)
+        """
+        self._literals = literals
+        self._anchor_names = anchors
+        self._free = [name for name in self._names if name not in literals]
+        self._unanchored = [name for name in self._free
+                            if name not in anchors]
+        # anchor => list of names
+        self._anchors = {}
+        for name, anchor in anchors.iteritems():
+            self._anchors.setdefault(anchor, []).append(name)
+        # Number of the pattern in self._names
+        numbers = {name: i for i, name in enumerate(self._names)}
+        # literal => list of (pattern number, priority)
+        self._table = {}
+        for name, expanded in literals.iteritems():
+            for priority, literal in enumerate(expanded):
+                self._table.setdefault(literal, []).append(
+                    (numbers[name], priority))
+        self._build_index()
+
+    def _build_index(self):
+        # Trie: dict symbol => node, key None => list of (number, priority)
+        root = {}
+        for literal, entries in self._table.iteritems():
+            node = root
+            for char in literal:
+                node = node.setdefault(char, {})
+            node[None] = entries
+        self._root = root
+
+    @property
+    def free_patterns(self):
+        """Patterns that are matched by re.finditer
+        """
+        return sorted(self._free)
+
+    def _state(self):
+        return dict(names=self._names, literals=self._literals,
+                    anchors=self._anchor_names)
+
+    def _restore(self, state):
+        self._init_index(state['literals'], state['anchors'])
+
+    def _scan(self, text, bounds):
+        """Return (list of (begin, end, entries) of the literals found
+        at the word bounds ordered by begin, list of the not expanded
+        patterns which anchors are found in the text)
+        """
+        literals = list(self._iter_literals(text, bounds)) \
+            if self._table else []
+        anchored = []
+        for anchor, names in self._anchors.iteritems():
+            if anchor in text:
+                anchored.extend(names)
+        return literals, anchored
+
+    def _iter_literals(self, text, bounds):
+        size = len(text)
+        root = self._root
+        for begin in range(size):
+            if not bounds[begin]:
+                continue
+            node = root
+            end = begin
+            while end < size:
+                node = node.get(text[end])
+                if node is None:
+                    break
+                end += 1
+                entries = node.get(None)
+                if entries and bounds[end]:
+                    yield begin, end, entries
+
+    def find_all(self, address, per_pattern=None):
+        address = address.lower()
+        found = {}
+        literals, anchored = self._scan(address, _word_bounds(address))
+        self._add_literals(literals, found)
+        for name in anchored + self._unanchored:
+            found[name] = [m.span()
+                           for m in self.patterns[name].finditer(address)]
+        if per_pattern is not None:
+            per_pattern.update(found)
+        return self._collect(address, found)
+
+    def _add_literals(self, literals, found):
+        """Choose the matches of the patterns among the found literals
+        (the literal with the best priority at a position, the matches
+        don't overlap)
+        """
+        # The best match of every pattern at the current begin:
+        # number => (priority, end)
+        best = {}
+        current = None
+        # Position of the next search of every pattern (as in finditer)
+        next_pos = {}
+        names = self._names
+
+        def flush(begin):
+            for number, (_, end) in best.iteritems():
+                if next_pos.get(number, 0) <= begin:
+                    found.setdefault(names[number], []).append((begin, end))
+                    next_pos[number] = end
+
+        for begin, end, entries in literals:
+            if begin != current:
+                flush(current)
+                best = {}
+                current = begin
+            for number, priority in entries:
+                kept = best.get(number)
+                if kept is None or priority < kept[0]:
+                    best[number] = (priority, end)
+        flush(current)
+
+
+class AhoCorasickMatcher(TrieMatcher):
+    """The literals and the anchors are searched in one pass by the
+    automaton of pyahocorasick
+    """
+    name = 'aho'
+
+    def _build_index(self):
+        if ahocorasick is None:
+            raise ImportError(u'pyahocorasick is not installed')
+        # The library can be built for byte strings: the literals and
+        # the addresses are encoded to utf-8 then
+        self._encode = not getattr(ahocorasick, 'unicode', False)
+        keys = {}
+        for literal, entries in self._table.iteritems():
+            keys[literal] = (entries, [])
+        for anchor, names in self._anchors.iteritems():
+            keys[anchor] = (keys.get(anchor, ([], None))[0], names)
+
+        automaton = ahocorasick.Automaton()
+        for key, (entries, names) in keys.iteritems():
+            if self._encode:
+                key = key.encode('utf-8')
+            automaton.add_word(key, (len(key), entries, names))
+        if keys:
+            automaton.make_automaton()
+        self._automaton = automaton
+
+    def _scan(self, text, bounds):
+        if not len(self._automaton):
+            return [], []
+
+        data = text.encode('utf-8') if self._encode else text
+        if len(data) == len(text):
+            offsets = None
+        else:
+            # Symbol number of every utf-8 byte offset of a symbol start
+            offsets = {}
+            offset = 0
+            for i, char in enumerate(text):
+                offsets[offset] = i
+                offset += len(char.encode('utf-8'))
+            offsets[offset] = len(text)
+
+        literals = []
+        anchored = set()
+        for last, (length, entries, names) in self._automaton.iter(data):
+            if names:
+                anchored.update(names)
+            if not entries:
+                continue
+            begin, end = last + 1 - length, last + 1
+            if offsets is not None:
+                begin, end = offsets[begin], offsets[end]
+            if bounds[begin] and bounds[end]:
+                literals.append((begin, end, entries))
+        literals.sort(key=lambda item: item[0])
+        return literals, list(anchored)
+
+
+class ScannerMatcher(Matcher, HouseScanner):
+    """Digit run scanner of the house patterns
+    """
+    name = 'scanner'
+
+    def __init__(self, patterns):
+        HouseScanner.__init__(self, patterns)
+
+    def find_all(self, address, per_pattern=None):
+        return self.scan(address, per_pattern)
+
+    def _restore(self, state):
+        HouseScanner.__init__(self, self.patterns)
+
+
+MATCHERS = {
+    'regex': RegexMatcher,
+    'trie': TrieMatcher,
+    'aho': AhoCorasickMatcher,
+    'scanner': ScannerMatcher,
+}
+
+
+def available_matchers():
+    """Return names of the backends that can be used
+    """
+    return sorted(name for name in MATCHERS
+                  if name != 'aho' or ahocorasick is not None)
+
+
+def get_matcher_class(name):
+    """Return the matcher class of the backend ('auto' is 'aho'
+    if pyahocorasick is installed, else 'trie')
+    """
+    if name == 'auto':
+        name = 'aho' if ahocorasick is not None else 'trie'
+    if name not in available_matchers():
+        raise ValueError(u'Unknown or unavailable matcher "%s" '
+                         u'(available: %s)' %
+                         (name, u', '.join(available_matchers())))
+    return MATCHERS[name]
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 4:
+        print __doc__
+        sys.exit(1)
+
+    backend, list_file, output_file = sys.argv[1:4]
+    with open(list_file) as f:
+        names = [line.decode('utf-8').rstrip() for line in f]
+    matcher = get_matcher_class(backend)(PatternTable(names))
+    matcher.save(output_file)
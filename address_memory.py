@@ -0,0 +1,161 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Memory footprint of the loaded gazetteers.
+
+The sizes are estimated by sys.getsizeof of the objects (and of the
+objects they contain), the allocator overhead is not counted. An object
+referenced from several places is counted once per report, e.g. the
+compiled patterns shared by the lists (see address_matchers.compile_pattern).
+
+Usage (the report of the splitter with all lists loaded):
+    python address_memory.py path [city_list_file]
+"""
+
+import sys
+
+import re
+from collections import OrderedDict
+
+# Type of the compiled patterns
+PATTERN_TYPE = type(re.compile(''))
+
+# Columns of the report of a category
+COLUMNS = ['patterns', 'compiled', 'text', 'compiled_bytes', 'index']
+
+
+def _pattern_size(compiled, seen):
+    """Return size of the compiled pattern with its source and its
+    group tables
+    """
+    size = _size(compiled, seen)
+    if size:
+        size += _size(compiled.pattern, seen) + \
+            deep_size(compiled.groupindex, seen)
+    return size
+
+
+def _size(obj, seen):
+    """Return size of the object, 0 if it is counted already
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    return sys.getsizeof(obj)
+
+
+def deep_size(obj, seen=None):
+    """Return size of the object and the objects it contains (the items
+    of the containers, the attributes of the objects, the buffers
+    of numpy arrays)
+
+    :param seen:    set of ids of the counted objects, they are skipped
+    """
+    if seen is None:
+        seen = set()
+    if isinstance(obj, PATTERN_TYPE):
+        return _pattern_size(obj, seen)
+    size = _size(obj, seen)
+    if not size:
+        return 0
+    if isinstance(obj, dict):
+        for key, value in dict.iteritems(obj):
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_size(item, seen)
+    elif hasattr(obj, 'nbytes') and hasattr(obj, 'base'):
+        # numpy array: the buffer of the array (not of a view)
+        if obj.base is None:
+            size += obj.nbytes
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(obj.__dict__, seen)
+    return size
+
+
+def pattern_sizes(patterns, seen=None):
+    """Return (count of the compiled patterns, size of the names, size
+    of the compiled patterns and the table)
+
+    :param patterns:    dict name => compiled pattern (None for the
+                        patterns that are not compiled, see
+                        address_matchers.PatternTable)
+    """
+    if seen is None:
+        seen = set()
+    compiled_count = 0
+    text = 0
+    compiled_size = _size(patterns, seen)
+    for name, compiled in dict.iteritems(patterns):
+        text += _size(name, seen)
+        if compiled is not None:
+            compiled_count += 1
+            compiled_size += _pattern_size(compiled, seen)
+    return compiled_count, text, compiled_size
+
+
+def format_report(report):
+    """Return the text table of the report of AddressSplitter.memory_report
+    """
+    lines = ['%-12s %9s %9s %12s %12s %12s' % (
+        'category', 'patterns', 'compiled', 'text, KB', 'compiled, KB',
+        'index, KB')]
+    total = 0
+    for category, row in report['categories'].iteritems():
+        lines.append('%-12s %9d %9d %12.1f %12.1f %12.1f' % (
+            category, row['patterns'], row['compiled'], row['text'] / 1024.,
+            row['compiled_bytes'] / 1024., row['index'] / 1024.))
+        total += row['text'] + row['compiled_bytes'] + row['index']
+    for name in ['index_table', 'cache', 'result_cache']:
+        lines.append('%-12s %9s %9s %12s %12s %12.1f' % (
+            name, '', '', '', '', report[name] / 1024.))
+        total += report[name]
+    lines.append('total: %.1f KB' % (total / 1024.))
+    return '\n'.join(lines)
+
+
+def memory_report(splitter):
+    """Return the memory report of the splitter: dict
+        categories  -- OrderedDict: category => dict of COLUMNS (the loaded
+                       categories only): count of the patterns and of the
+                       compiled patterns, bytes of the names, of the
+                       compiled patterns, of the matcher or the scanner
+        index_table -- bytes of the table of postal indexes
+        cache       -- bytes of the cached result
+        result_cache -- bytes of the entries of the result cache
+                       (see address_cache), 0 without the cache
+    """
+    seen = set()
+    categories = OrderedDict()
+    for category in splitter.loaded_categories():
+        patterns = splitter._get_list(category)
+        compiled, text, compiled_bytes = pattern_sizes(patterns, seen)
+        index = 0
+        matcher = splitter._matchers.get(category)
+        if matcher is not None:
+            index += deep_size(matcher, seen)
+        if category == 'house' and splitter._house_scanner is not None:
+            index += deep_size(splitter._house_scanner, seen)
+        categories[category] = OrderedDict(zip(COLUMNS, [
+            len(patterns), compiled, text, compiled_bytes, index]))
+
+    cache = deep_size([splitter._address, splitter._parsed_address,
+                       splitter._best_strat], seen)
+    result_cache = 0
+    if splitter.result_cache is not None:
+        result_cache = deep_size(splitter.result_cache._entries, seen)
+    return dict(categories=categories,
+                index_table=deep_size(splitter._index_table, seen),
+                cache=cache,
+                result_cache=result_cache)
+
+
+if __name__ == '__main__':
+    from address_splitter import AddressSplitter
+
+    options = {}
+    if len(sys.argv) > 2:
+        options['city_list_file'] = sys.argv[2]
+    splitter = AddressSplitter.from_directory(sys.argv[1], **options)
+    splitter.warm_up()
+    print format_report(splitter.memory_report())
@@ -0,0 +1,236 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Routing of addresses to the gazetteers of their countries.
+
+Every country has its own gazetteer pack: a directory of list files
+(see AddressSplitter.from_directory). The router detects the country
+of the address by cheap hints and parses the address by the splitter
+of the pack only. The hints are matched by the patterns of the pack
+(the country names are joined in one pattern), the splitter of a pack
+is created on the first address of the country.
+
+Hints (in order of their weight):
+    * explicit country name (the country list of the pack)
+    * letters that are used by the country only (e.g. Kazakh letters)
+    * keywords (e.g. words of the local language)
+    * shape of the postal code
+
+The postal codes of Kazakhstan 100000-169999 (e.g. Karaganda, Pavlodar)
+are the codes of Russia too (Moscow is 101000-129999), so the index
+hint of 'kz' covers the codes starting with 0 only.
+"""
+
+import os
+import re
+import json
+import threading
+
+from address_splitter import AddressSplitter, LIST_FILES
+from address_scanner import find_index_positions
+from address_batch import parse_batch
+
+# Weights of the hints
+COUNTRY_WEIGHT = 100
+LETTERS_WEIGHT = 10
+KEYWORD_WEIGHT = 5
+INDEX_WEIGHT = 3
+
+# Default hints of the countries
+DEFAULT_HINTS = {
+    'ru': dict(
+        index=u'[13-6][0-9]{5}',
+        letters=u'',
+        keywords=[]
+    ),
+    'kz': dict(
+        index=u'0[0-9]{5}',
+        letters=u'әғқңөұүһі',
+        keywords=[u'облысы', u'ауданы?', u'ауылы?', u'көшесі', u'даңғылы']
+    ),
+    'by': dict(
+        index=u'2[0-4][0-9]{4}',
+        letters=u'ўі',
+        keywords=[u'вобласць', u'раён', u'вуліца', u'сельсавет',
+                  u'аг\\.', u'г\\. ?п\\.']
+    ),
+}
+
+
+class GazetteerPack(object):
+    """Gazetteers and routing hints of a country
+    """
+    def __init__(self,
+                 code,
+                 path,
+                 index=None,
+                 letters=None,
+                 keywords=None,
+                 splitter_options=None):
+        """
+        :param code:        country code (e.g. 'ru')
+        :param path:        directory of the list files
+        :param index:       regular expression of the postal codes
+        :param letters:     letters that are specific for the country
+        :param keywords:    regular expressions of the specific words
+        :param splitter_options: keyword arguments of
+                            AddressSplitter.from_directory
+
+        The hints that are None are taken from DEFAULT_HINTS.
+        """
+        defaults = DEFAULT_HINTS.get(code, {})
+        if index is None:
+            index = defaults.get('index')
+        if letters is None:
+            letters = defaults.get('letters', u'')
+        if keywords is None:
+            keywords = defaults.get('keywords', [])
+
+        self.code = code
+        self.path = path
+        self.index = re.compile(u'(?:%s)$' % index, re.I | re.U) \
+            if index else None
+        self.letters = frozenset(letters.lower())
+        self.keywords = re.compile(
+            u'\\b(?:%s)' % u'|'.join(keywords), re.I | re.U) \
+            if keywords else None
+        self.splitter_options = splitter_options or {}
+
+        self._countries = None
+        self._splitter = None
+        self._lock = threading.Lock()
+
+    @property
+    def splitter(self):
+        """AddressSplitter of the pack (created on the first use)
+        """
+        if self._splitter is None:
+            with self._lock:
+                if self._splitter is None:
+                    self._splitter = AddressSplitter.from_directory(
+                        self.path, **self.splitter_options)
+        return self._splitter
+
+    @property
+    def loaded(self):
+        return self._splitter is not None
+
+    @property
+    def countries(self):
+        """Pattern of the names of the country list of the pack (None if
+        the list is empty), the list is read on the first use
+        """
+        if self._countries is None:
+            with self._lock:
+                if self._countries is None:
+                    name = self.splitter_options.get(
+                        'country_list_file', LIST_FILES['country_list_file'])
+                    with open(os.path.join(self.path, name)) as f:
+                        names = [line.decode('utf-8').rstrip() for line in f]
+                    names = [name for name in names if name]
+                    self._countries = re.compile(
+                        u'\\b(?:%s)\\b' % u'|'.join(names), re.I | re.U) \
+                        if names else False
+        return self._countries or None
+
+    def score(self, lowered, indexes):
+        """Return weight of the hints of the pack found in the address
+
+        :param lowered:     lowercased address
+        :param indexes:     six-digit numbers found in the address
+        """
+        score = 0
+        if self.countries and self.countries.search(lowered):
+            score += COUNTRY_WEIGHT
+        if self.letters and not self.letters.isdisjoint(lowered):
+            score += LETTERS_WEIGHT
+        if self.keywords and self.keywords.search(lowered):
+            score += KEYWORD_WEIGHT
+        if self.index and any(self.index.match(i) for i in indexes):
+            score += INDEX_WEIGHT
+        return score
+
+
+class CountryRouter(object):
+    """Detect the country of addresses and parse them by the splitter
+    of the country
+    """
+    def __init__(self, packs, default=None):
+        """
+        :param packs:   list of GazetteerPack objects
+        :param default: code of the pack used if there are no hints
+                        (the first pack by default)
+        """
+        if not packs:
+            raise ValueError(u'No gazetteer packs')
+        self.packs = list(packs)
+        self._by_code = {p.code: p for p in self.packs}
+        if default is None:
+            default = self.packs[0].code
+        if default not in self._by_code:
+            raise ValueError(u'Unknown default pack "%s"' % default)
+        self.default = default
+
+    @classmethod
+    def from_config(cls, filename):
+        """Create router from a JSON file:
+            {"default": "ru",
+             "packs": [{"code": "ru", "path": "csv_files/"},
+                       {"code": "kz", "path": "/data/kz/",
+                        "keywords": ["облысы"]}]}
+        The keys of a pack are the arguments of GazetteerPack.
+        """
+        with open(filename) as f:
+            config = json.load(f)
+        packs = [GazetteerPack(**{str(k): v for k, v in pack.items()})
+                 for pack in config['packs']]
+        return cls(packs, default=config.get('default'))
+
+    def __getitem__(self, code):
+        return self._by_code[code]
+
+    def detect(self, address):
+        """Return code of the country of the address
+        """
+        lowered = address.lower()
+        indexes = find_index_positions(address).keys()
+        best = self.default
+        best_score = 0
+        for pack in self.packs:
+            score = pack.score(lowered, indexes)
+            if score > best_score:
+                best, best_score = pack.code, score
+        return best
+
+    def route(self, address):
+        """Return the pack of the address
+        """
+        return self._by_code[self.detect(address)]
+
+    def get_parsed_address(self, address):
+        """Parse the address by the splitter of its country
+
+        :rtype: Address
+        """
+        return self.route(address).splitter.get_parsed_address(address)
+
+    def parse_batch(self, addresses):
+        """Parse list of addresses: the addresses are grouped by countries
+        and every group is parsed by address_batch.parse_batch.
+
+        :returns:   (list of Address objects, dict: country code =>
+                    BatchStats)
+        """
+        groups = {}
+        for i, address in enumerate(addresses):
+            groups.setdefault(self.detect(address), []).append(i)
+
+        results = [None] * len(addresses)
+        stats = {}
+        for code, rows in groups.iteritems():
+            parsed, stats[code] = parse_batch(
+                self._by_code[code].splitter, [addresses[i] for i in rows])
+            for i, address in zip(rows, parsed):
+                results[i] = address
+
+        return results, stats
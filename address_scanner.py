@@ -0,0 +1,297 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Scanners of house numbers and postal indexes.
+
+Every pattern of the house list contains digits, so the address is
+scanned once for the runs of digits and the patterns are tried only
+near the runs.
+
+Before the scanning every pattern is analysed: the part of the pattern
+before its first mandatory digit (the prefix) gives the set of symbols
+the prefix can contain, the min and max width of the prefix and the
+set of symbols the match can start with. A match starts at the
+symbols of the prefix set that precede a digit run, so only these
+positions are tried. The found positions are the same as the positions
+found by re.finditer over the whole address; the patterns that can't
+be analysed are matched by re.finditer.
+
+The postal index (six digits, see AddressSplitter.index) is found
+directly from the digit runs.
+"""
+
+import re
+import sys
+import sre_parse
+import sre_constants as sre
+
+DIGITS = frozenset(u'0123456789')
+
+# Symbols of \w and \s in the patterns without re.U
+ASCII_WORD = frozenset(
+    u'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+
+# Longer ranges of symbols are considered as any symbol
+MAX_RANGE = 4096
+
+_DIGIT_RUN = re.compile(r'[0-9]+')
+
+_spaces = None
+
+
+def _space_chars():
+    """Return set of the symbols matched by \\s with re.U
+    """
+    global _spaces
+    if _spaces is None:
+        _spaces = frozenset(
+            c for c in (unichr(i) for i in range(min(sys.maxunicode, 0xFFFF)))
+            if re.match(r'\s', c, re.U))
+    return _spaces
+
+
+def _variants(char):
+    """Symbols that can be equal to the char in a case insensitive pattern
+    """
+    return set([char, char.lower(), char.upper()])
+
+
+def _item_chars(op, av):
+    """Return set of symbols that the pattern item can match (a superset)
+    or None if it can be any symbol.
+    """
+    if op == sre.LITERAL:
+        return _variants(unichr(av))
+    if op == sre.IN:
+        chars = set()
+        for o, a in av:
+            if o == sre.LITERAL:
+                chars |= _variants(unichr(a))
+            elif o == sre.RANGE:
+                if a[1] - a[0] > MAX_RANGE:
+                    return None
+                for code in range(a[0], a[1] + 1):
+                    chars |= _variants(unichr(code))
+            elif o == sre.CATEGORY and a in (sre.CATEGORY_SPACE,
+                                             sre.CATEGORY_UNI_SPACE):
+                chars |= _space_chars()
+            else:
+                return None
+        return chars
+    if op in (sre.MAX_REPEAT, sre.MIN_REPEAT):
+        return _seq_chars(av[2])
+    if op == sre.SUBPATTERN:
+        return _seq_chars(av[-1])
+    if op == sre.BRANCH:
+        chars = set()
+        for branch in av[1]:
+            branch_chars = _seq_chars(branch)
+            if branch_chars is None:
+                return None
+            chars |= branch_chars
+        return chars
+    if op == sre.AT:
+        return set()
+
+    return None
+
+
+def _seq_chars(items):
+    chars = set()
+    for op, av in items:
+        item_chars = _item_chars(op, av)
+        if item_chars is None:
+            return None
+        chars |= item_chars
+    return chars
+
+
+def _first_chars(items):
+    """Return (set of the first symbols of the matches, nullable):
+    nullable is True if the items can match an empty string.
+    The set is None if it can be any symbol.
+    """
+    chars = set()
+    for op, av in items:
+        if op in (sre.LITERAL, sre.IN):
+            item_chars = _item_chars(op, av)
+            if item_chars is None:
+                return None, False
+            return chars | item_chars, False
+        elif op in (sre.MAX_REPEAT, sre.MIN_REPEAT):
+            item_chars, nullable = _first_chars(av[2])
+            nullable = nullable or av[0] == 0
+        elif op == sre.SUBPATTERN:
+            item_chars, nullable = _first_chars(av[-1])
+        elif op == sre.BRANCH:
+            item_chars, nullable = set(), False
+            for branch in av[1]:
+                branch_chars, branch_nullable = _first_chars(branch)
+                if branch_chars is None:
+                    return None, False
+                item_chars |= branch_chars
+                nullable = nullable or branch_nullable
+        elif op == sre.AT:
+            continue
+        else:
+            return None, False
+
+        if item_chars is None:
+            return None, False
+        chars |= item_chars
+        if not nullable:
+            return chars, False
+
+    return chars, True
+
+
+def analyse_pattern(name):
+    """Find the digit anchor of a pattern of the house list.
+
+    :param name:    pattern (regular expression without word boundaries)
+
+    :returns:   None if the pattern can't be anchored, else dict:
+                    prefix -- set of symbols of the prefix (the part
+                              before the first mandatory digit),
+                    min_width, max_width -- width of the prefix,
+                    first -- set of the first symbols of the matches
+    """
+    try:
+        parsed = sre_parse.parse(name, re.I | re.U)
+    except (sre.error, OverflowError):
+        return None
+
+    items = list(parsed)
+    for i, (op, av) in enumerate(items):
+        chars = _item_chars(op, av)
+        if chars is None:
+            return None
+        width = sre_parse.SubPattern(parsed.pattern, [(op, av)]).getwidth()
+        if chars and chars <= DIGITS and width[0] > 0:
+            prefix = _seq_chars(items[:i])
+            if prefix & DIGITS:
+                return None
+            first, _ = _first_chars(items[:i + 1])
+            if first is None:
+                return None
+            min_width, max_width = \
+                sre_parse.SubPattern(parsed.pattern, items[:i]).getwidth()
+            return dict(prefix=frozenset(prefix),
+                        min_width=min_width,
+                        max_width=max_width,
+                        first=frozenset(first))
+        if chars & DIGITS:
+            return None
+
+    return None
+
+
+class HouseScanner(object):
+    """Scanner of the positions of the house list patterns.
+
+    The result of scan(address) is the same as the result of
+    AddressSplitter._get_positions(address, patterns).
+    """
+    def __init__(self, patterns):
+        """
+        :param patterns:    dict of the category: name => compiled pattern
+        """
+        self.patterns = patterns
+        self._names = list(patterns)
+
+        # Patterns that can't be anchored
+        self._free = set()
+        # Groups of anchored patterns with the same prefix symbols:
+        # list of (prefix symbols, {first symbol: [(name, min, max)]})
+        groups = {}
+        for name in self._names:
+            info = analyse_pattern(name)
+            if info is None:
+                self._free.add(name)
+                continue
+            by_first = groups.setdefault(info['prefix'], {})
+            for char in info['first']:
+                by_first.setdefault(char, []).append(
+                    (name, info['min_width'], info['max_width']))
+        self._groups = groups.items()
+
+    @property
+    def free_patterns(self):
+        """Patterns that are matched by re.finditer
+        """
+        return sorted(self._free)
+
+    def scan(self, address, per_pattern=None):
+        """Return dict: found text => list of positions
+
+        :param per_pattern: dict, the positions of the patterns tried
+                            on the address are added to it: name =>
+                            list of positions
+        """
+        address = address.lower()
+        found = {}
+        runs = [m.start() for m in _DIGIT_RUN.finditer(address)]
+        if runs:
+            self._scan_runs(address, runs, found)
+
+        for name in self._free:
+            found[name] = [m.span()
+                           for m in self.patterns[name].finditer(address)]
+        if per_pattern is not None:
+            per_pattern.update(found)
+
+        res = dict()
+        for name in self._names:
+            for begin, end in found.get(name, ()):
+                try:
+                    res[address[begin:end]].append((begin, end))
+                except KeyError:
+                    res[address[begin:end]] = [(begin, end)]
+
+        return res
+
+    def _scan_runs(self, address, runs, found):
+        # Position of the next search for every pattern (as in finditer)
+        next_pos = {}
+        for prefix, by_first in self._groups:
+            for run in runs:
+                begin = run
+                while begin > 0 and address[begin - 1] in prefix:
+                    begin -= 1
+                for start in range(begin, run + 1):
+                    candidates = by_first.get(address[start])
+                    if not candidates:
+                        continue
+                    width = run - start
+                    for name, min_width, max_width in candidates:
+                        if not min_width <= width <= max_width:
+                            continue
+                        if next_pos.get(name, 0) > start:
+                            continue
+                        match = self.patterns[name].match(address, start)
+                        if match:
+                            found.setdefault(name, []).append(match.span())
+                            next_pos[name] = match.end()
+
+
+def find_index_positions(address):
+    """Return positions of the postal indexes: dict index => [position].
+
+    The result is the same as the result of
+    AddressSplitter._get_index_pos: six ASCII digits, the neighbour
+    symbols are not ASCII letters, digits or '_' (the pattern is
+    compiled without re.U). The last position is kept if the same
+    index is found several times.
+    """
+    res = {}
+    for run in _DIGIT_RUN.finditer(address):
+        begin, end = run.span()
+        if end - begin != 6:
+            continue
+        if begin > 0 and address[begin - 1] in ASCII_WORD:
+            continue
+        if end < len(address) and address[end] in ASCII_WORD:
+            continue
+        res[address[begin:end]] = [(begin, end)]
+
+    return res
@@ -0,0 +1,310 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Cost-aware scheduling of the parallel parsing of a file.
+
+The parsing time of an address differs by orders of magnitude: a city
+name is parsed in milliseconds, a long address with many parts in
+seconds (the count of the strategies grows with the count of the
+parts). The chunks of the consecutive lines (address_input.parse_file)
+are parsed in different times, and the workers wait for the chunk of
+the slowest address at the end.
+
+Here the lines are taken by windows of window_lines lines. The cost of
+every address of the window is estimated by estimate_cost (the squared
+count of the words and the commas: it is the best cheap predictor of
+the parsing time on a sample of the real addresses, the correlation is
+0.88, almost the same as of the count of the strategies that needs the
+matching), the addresses are sorted by the cost (the most expensive
+first, the duplicates are neighbours) and sent to the workers by chunks
+of the target cost: target_time * the throughput (cost per second)
+observed on the parsed chunks (the single addresses are sent before
+the first chunk is parsed), but not more than the remaining cost of
+the window / (2 * workers), so the chunks are smaller at the end of the
+window (guided self-scheduling). The results are collected in the order
+of the lines.
+
+ScheduleStats reports the busy time of every worker process and its
+part of the wall time (utilization).
+
+The parsing fails (instead of waiting for the lost chunks forever) if
+a chunk fails outside the parsing (e.g. its result can't be pickled),
+a worker process dies (the pool replaces it, its chunk is lost) or no
+chunk is parsed in task_timeout seconds.
+
+Usage: the 5th argument of the address_splitter.py CLI (the count of
+worker processes).
+"""
+
+import os
+import Queue
+import multiprocessing
+from timeit import default_timer
+
+from address_splitter import AddressSplitter
+from address_batch import BatchStats, normalize_address, parse_batch
+from address_input import CHECK_INTERVAL, LineIndex, check_workers, \
+    worker_pids
+
+# Count of the lines of a window
+WINDOW_LINES = 50000
+
+# Target time of a chunk (seconds)
+TARGET_TIME = 0.5
+
+# Max count of the addresses of a chunk
+MAX_CHUNK = 5000
+
+# Count of the chunks sent to a worker at once
+CHUNKS_PER_WORKER = 2
+
+# Worker process state: the splitter is created once per process
+_splitter = None
+
+
+def estimate_cost(address):
+    """Return the estimated parsing cost of the address (in arbitrary
+    units, proportional to the time)
+    """
+    parts = len(address.split()) + address.count(u',')
+    return 1 + parts * parts
+
+
+class ScheduleStats(object):
+    """Busy time and parsed chunks of the worker processes
+    """
+    def __init__(self):
+        self.busy = {}      # pid => seconds of parsing
+        self.chunks = {}    # pid => count of the chunks
+        self.cost = 0       # estimated cost of the parsed chunks
+        self.rows = BatchStats()
+        self.wall_time = 0.0
+
+    def add(self, pid, elapsed, cost, stats):
+        self.busy[pid] = self.busy.get(pid, 0.0) + elapsed
+        self.chunks[pid] = self.chunks.get(pid, 0) + 1
+        self.cost += cost
+        self.rows += stats
+
+    @property
+    def throughput(self):
+        """Return the observed cost per second of a worker (None if no
+        chunk is parsed)
+        """
+        busy = sum(self.busy.itervalues())
+        return self.cost / busy if busy else None
+
+    def utilization(self):
+        """Return dict: pid => part of the wall time the worker is busy
+        """
+        if not self.wall_time:
+            return {}
+        return {pid: busy / self.wall_time
+                for pid, busy in self.busy.iteritems()}
+
+    def __unicode__(self):
+        lines = [u'%s, %.1f s' % (self.rows, self.wall_time)]
+        utilization = self.utilization()
+        for pid in sorted(self.busy):
+            lines.append(u'worker %d: %d chunks, busy %.1f s (%.0f%%)' % (
+                pid, self.chunks[pid], self.busy[pid],
+                100 * utilization.get(pid, 0.0)))
+        return u'\n'.join(lines)
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+
+class _Window(object):
+    """Lines of a window, their costs and results
+    """
+    def __init__(self, first, lines):
+        self.first = first
+        self.lines = lines
+        self.parsed = [None] * len(lines)
+        self.remaining = len(lines)
+        costs = [estimate_cost(line) for line in lines]
+        self.order = sorted(range(len(lines)), key=lambda i: (
+            -costs[i], normalize_address(lines[i])))
+        self.costs = costs
+        self.remaining_cost = sum(costs)
+        self.next = 0
+
+    def take(self, cost):
+        """Return the rows of the next chunk of the cost (at least
+        one row)
+        """
+        rows = []
+        taken = 0
+        while self.next < len(self.order) and len(rows) < MAX_CHUNK and \
+                (not rows or taken + self.costs[self.order[self.next]] <=
+                 cost):
+            row = self.order[self.next]
+            rows.append(row)
+            taken += self.costs[row]
+            self.next += 1
+        self.remaining_cost -= taken
+        return rows, taken
+
+    @property
+    def sent(self):
+        return self.next == len(self.order)
+
+
+def _init_worker(path, options):
+    global _splitter
+    _splitter = AddressSplitter.from_directory(path, **options)
+
+
+def _parse_rows(args):
+    """Parse the lines of a chunk, return (number of the first line of
+    the window, rows, parsed addresses or the exception, pid, time,
+    cost, BatchStats)
+    """
+    first, rows, lines, cost = args
+    start = default_timer()
+    try:
+        parsed, stats = parse_batch(_splitter, lines)
+    except Exception as e:
+        # The callback of apply_async is not called on errors
+        return first, rows, e, os.getpid(), 0.0, cost, BatchStats()
+    return first, rows, parsed, os.getpid(), default_timer() - start, \
+        cost, stats
+
+
+def _chunk_cost(window, rate, target_time, workers):
+    """Return the cost of the next chunk of the window: the single
+    addresses are sent while the throughput (rate) is not known
+    """
+    if rate is None:
+        return 0
+    return min(target_time * rate, window.remaining_cost / (2.0 * workers))
+
+
+def parse_file_scheduled(filename, path, options=None, workers=None,
+                         first=0, last=None, window_lines=WINDOW_LINES,
+                         target_time=TARGET_TIME, stats=None,
+                         task_timeout=None):
+    """Parse the lines first <= line < last of the file in worker
+    processes, the most expensive addresses of a window first.
+
+    :param path:        directory of the list files
+    :param options:     arguments of AddressSplitter.from_directory
+    :param workers:     count of worker processes (CPU count if None)
+    :param target_time: target parsing time of a chunk (seconds)
+    :param stats:       ScheduleStats object, the busy time of the
+                        workers is added to it
+    :param task_timeout: max time of waiting for a parsed chunk
+                        (seconds, not limited if None)
+    :raises RuntimeError:   if a worker process dies or no chunk is
+                            parsed in task_timeout seconds
+
+    Generate (number of the first line, lines, parsed addresses) of the
+    windows in the order of the lines.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if stats is None:
+        stats = ScheduleStats()
+    index = LineIndex(filename)
+    windows = ((f, index.lines(f, b))
+               for f, b in _window_ranges(first, last, len(index),
+                                          window_lines))
+
+    started = default_timer()
+    done = Queue.Queue()
+    pool = multiprocessing.Pool(workers, _init_worker, (path, options or {}))
+    pids = worker_pids(pool)
+    try:
+        active = []     # windows in the order of the lines
+        pending = 0
+        tasks = []      # AsyncResult objects of the sent chunks
+        exhausted = False
+        while True:
+            # Send the chunks while the workers have less than
+            # CHUNKS_PER_WORKER chunks
+            while pending < CHUNKS_PER_WORKER * workers:
+                window = active[-1] if active else None
+                if window is None or window.sent:
+                    if exhausted:
+                        break
+                    try:
+                        window = _Window(*next(windows))
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    active.append(window)
+                    if not window.lines:
+                        continue
+                rows, cost = window.take(_chunk_cost(
+                    window, stats.throughput, target_time, workers))
+                tasks.append(pool.apply_async(
+                    _parse_rows,
+                    ((window.first, rows, [window.lines[i] for i in rows],
+                      cost),),
+                    callback=done.put))
+                pending += 1
+
+            while active and active[0].sent and not active[0].remaining:
+                window = active.pop(0)
+                stats.wall_time = default_timer() - started
+                yield window.first, window.lines, window.parsed
+            if not pending:
+                if exhausted and not active:
+                    break
+                continue
+
+            window, rows, parsed, pid, elapsed, cost, batch = _get(
+                done, tasks, pool, pids, task_timeout)
+            if isinstance(parsed, Exception):
+                raise parsed
+            pending -= 1
+            stats.add(pid, elapsed, cost, batch)
+            window = _find(active, window)
+            for i, address in zip(rows, parsed):
+                window.parsed[i] = address
+            window.remaining -= len(rows)
+        stats.wall_time = default_timer() - started
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _get(done, tasks, pool, pids, timeout=None):
+    """Return the next parsed chunk of the done queue
+
+    :param tasks:   list of AsyncResult objects of the sent chunks (the
+                    finished ones are removed)
+    :param pids:    pids of the worker processes of the pool
+    :raises:        the error of a chunk failed outside _parse_rows,
+                    RuntimeError (see address_input.check_workers)
+    """
+    started = default_timer()
+    while True:
+        # The callback of a successful chunk is called before the chunk
+        # is ready
+        for task in tasks:
+            if task.ready() and not task.successful():
+                task.get()
+        tasks[:] = [task for task in tasks if not task.ready()]
+        # Queue.get without a timeout can't be interrupted by Ctrl+C
+        try:
+            return done.get(timeout=CHECK_INTERVAL)
+        except Queue.Empty:
+            pass
+        check_workers(pool, pids, started, timeout)
+
+
+def _find(windows, first):
+    for window in windows:
+        if window.first == first:
+            return window
+    raise KeyError(first)
+
+
+def _window_ranges(first, last, count, window_lines):
+    """Generate (first, last) line numbers of the windows
+    """
+    last = count if last is None else min(last, count)
+    for begin in xrange(first, last, window_lines):
+        yield begin, min(begin + window_lines, last)
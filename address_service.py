@@ -0,0 +1,482 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""HTTP service for address parsing.
+
+The service holds a pool of worker processes, every worker keeps
+a preloaded AddressSplitter. Concurrent requests are coalesced into
+micro-batches: a dispatcher thread collects the waiting requests
+during a short delay (or until the batch is full) and sends them
+to a worker as one job.
+
+Endpoints:
+    GET  /health                    -- service status
+    GET  /metrics                   -- counters and latency percentiles
+    GET  /parse?address=...         -- parse one address
+    POST /parse                     -- {"address": "..."}
+    POST /parse_batch               -- {"addresses": ["...", ...]}
+
+POST requests can set the deadline of the request by the "timeout"
+key (seconds). The request that is not finished before its deadline
+returns 504.
+
+Only the standard library is used (the codebase supports python 2,
+so the server is based on the threading HTTP server instead of asyncio).
+"""
+
+import sys
+
+import json
+import time
+import threading
+import Queue
+import urlparse
+import BaseHTTPServer
+import SocketServer
+import multiprocessing
+from collections import deque
+
+from address_splitter import AddressSplitter
+from address_batch import parse_batch
+from address_cache import ResultCache
+
+
+class DeadlineExceeded(Exception):
+    """The request is not finished before its deadline
+    """
+    pass
+
+
+def percentile(values, q):
+    """Return q-th percentile (0 <= q <= 100) of the values
+    (nearest rank method). Return None for empty list.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(round(q / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+
+# Worker process state: the splitter is created once per process
+_splitter = None
+
+
+def _init_worker(path, options, cache_size=None, cache_snapshot=None):
+    global _splitter
+    if cache_size:
+        options = dict(options, result_cache=ResultCache(cache_size))
+    _splitter = AddressSplitter.from_directory(path, **options).warm_up()
+    if cache_size and cache_snapshot:
+        _splitter.preload_cache(cache_snapshot, background=True)
+
+
+def _parse_jobs(jobs):
+    """Parse a micro-batch in a worker process. The duplicated addresses
+    of the micro-batch are parsed once.
+
+    :param jobs:    list of (addresses, deadline) pairs
+    :returns:       (results, count of the parsed addresses,
+                    count of the distinct parsed addresses),
+                    results is the list of the job results: list of
+                    parsed addresses (dicts) for every job, None if the
+                    deadline is exceeded or error message if parsing
+                    is failed
+    """
+    results = [None] * len(jobs)
+    live = []
+    try:
+        now = time.time()
+        live = [i for i, (_, deadline) in enumerate(jobs) if deadline >= now]
+        addresses = [a for i in live for a in jobs[i][0]]
+        parsed, stats = parse_batch(_splitter, addresses)
+
+        start = 0
+        for i in live:
+            count = len(jobs[i][0])
+            results[i] = [a.as_dict() for a in parsed[start:start + count]]
+            start += count
+    except Exception as e:
+        # The callback of apply_async is not called on errors: the
+        # requests would wait for their deadlines
+        error = u'%s: %s' % (type(e).__name__, e)
+        for i in live:
+            results[i] = error
+        return results, 0, 0
+
+    return results, stats.rows, stats.distinct
+
+
+class Metrics(object):
+    """Thread safe counters of the service
+    """
+    def __init__(self, window=1000):
+        """
+        :param window:  count of the last requests used for latency
+                        percentiles
+        """
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self.requests = 0
+        self.addresses = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.parsed = 0
+        self.distinct = 0
+        self.timeouts = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=window)
+
+    def add_request(self, address_count, latency, status):
+        with self._lock:
+            self.requests += 1
+            self.addresses += address_count
+            self._latencies.append(latency)
+            if status == 'timeout':
+                self.timeouts += 1
+            elif status == 'error':
+                self.errors += 1
+
+    def add_batch(self, request_count):
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += request_count
+
+    def add_parsed(self, count, distinct):
+        with self._lock:
+            self.parsed += count
+            self.distinct += distinct
+
+    def as_dict(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            result = dict(
+                uptime=time.time() - self._started,
+                requests=self.requests,
+                addresses=self.addresses,
+                batches=self.batches,
+                mean_batch_size=float(self.batched_requests) / self.batches
+                if self.batches else 0.0,
+                duplicate_ratio=1 - float(self.distinct) / self.parsed
+                if self.parsed else 0.0,
+                timeouts=self.timeouts,
+                errors=self.errors
+            )
+        for q in [50, 90, 99]:
+            result['latency_p%s' % q] = percentile(latencies, q)
+
+        return result
+
+
+class _Request(object):
+    def __init__(self, addresses, deadline):
+        self.addresses = addresses
+        self.deadline = deadline
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher(object):
+    """Coalesce concurrent requests into micro-batches and
+    dispatch the batches to the worker pool.
+    """
+    def __init__(self, pool, metrics, max_batch_size=64, max_delay=0.005):
+        """
+        :param pool:            multiprocessing pool of the workers
+        :param metrics:         Metrics object
+        :param max_batch_size:  max count of addresses in the batch
+        :param max_delay:       max time (seconds) the first request
+                                waits for other requests
+        """
+        self._pool = pool
+        self._metrics = metrics
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+
+        self._queue = Queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, addresses, timeout):
+        """Parse the addresses, wait for the result.
+
+        :raises DeadlineExceeded: if the addresses are not parsed
+                                  in timeout seconds
+        """
+        request = _Request(addresses, time.time() + timeout)
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise DeadlineExceeded
+        if request.error:
+            if request.error is DeadlineExceeded:
+                raise DeadlineExceeded
+            raise RuntimeError(request.error)
+
+        return request.result
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            size = len(request.addresses)
+            flush_time = time.time() + self.max_delay
+            while size < self.max_batch_size:
+                remaining = flush_time - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except Queue.Empty:
+                    break
+                if request is None:
+                    self._dispatch(batch)
+                    return
+                batch.append(request)
+                size += len(request.addresses)
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        now = time.time()
+        live = []
+        for request in batch:
+            if request.deadline < now:
+                request.error = DeadlineExceeded
+                request.done.set()
+            else:
+                live.append(request)
+        if not live:
+            return
+
+        self._metrics.add_batch(len(live))
+        jobs = [(r.addresses, r.deadline) for r in live]
+        self._pool.apply_async(
+            _parse_jobs, (jobs, ),
+            callback=lambda results: self._scatter(live, results))
+
+    def _scatter(self, requests, results):
+        results, count, distinct = results
+        self._metrics.add_parsed(count, distinct)
+        for request, result in zip(requests, results):
+            if result is None:
+                request.error = DeadlineExceeded
+            elif isinstance(result, basestring):
+                request.error = result
+            else:
+                request.result = result
+            request.done.set()
+
+
+class AddressService(object):
+    """Address parsing service: worker pool and micro-batcher
+    """
+    def __init__(self,
+                 path,
+                 workers=None,
+                 max_batch_size=64,
+                 max_delay=0.005,
+                 timeout=10.0,
+                 splitter_options=None,
+                 cache_size=None,
+                 cache_snapshot=None):
+        """
+        :param path:            directory of the list files
+                                (see AddressSplitter.from_directory)
+        :param workers:         count of worker processes (default:
+                                count of CPUs)
+        :param max_batch_size:  max count of addresses in a micro-batch
+        :param max_delay:       max waiting time (seconds) for
+                                collecting a micro-batch
+        :param timeout:         default deadline of a request (seconds)
+        :param splitter_options: dict of keyword arguments for
+                                AddressSplitter.from_directory
+        :param cache_size:      count of the cached results of every
+                                worker (see address_cache), no cache
+                                if None
+        :param cache_snapshot:  snapshot of the cache (see
+                                AddressSplitter.dump_cache), it is loaded
+                                by every worker in background
+        """
+        self.timeout = timeout
+        self.metrics = Metrics()
+        self._pool = multiprocessing.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(path, splitter_options or {}, cache_size,
+                      cache_snapshot))
+        self._batcher = MicroBatcher(self._pool, self.metrics,
+                                     max_batch_size=max_batch_size,
+                                     max_delay=max_delay)
+
+    def parse(self, addresses, timeout=None):
+        """Parse list of addresses. Return list of dicts
+        (see Address.as_dict).
+
+        :raises DeadlineExceeded: if the deadline is exceeded
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.time()
+        status = 'ok'
+        try:
+            return self._batcher.submit(addresses, timeout)
+        except DeadlineExceeded:
+            status = 'timeout'
+            raise
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            self.metrics.add_request(len(addresses),
+                                     time.time() - start, status)
+
+    def close(self):
+        self._batcher.stop()
+        self._pool.terminate()
+        self._pool.join()
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """HTTP handler of the service. The server must have
+    'service' attribute (AddressService object).
+    """
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(
+                self, format, *args)
+
+    def _send_json(self, code, data):
+        body = json.dumps(data, ensure_ascii=False)
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _parse(self, addresses, timeout, single):
+        service = self.server.service
+        try:
+            result = service.parse(addresses, timeout=timeout)
+        except DeadlineExceeded:
+            self._send_json(504, {'error': 'deadline exceeded'})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': unicode(e)})
+            return
+
+        self._send_json(200, result[0] if single else result)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif url.path == '/metrics':
+            self._send_json(200, self.server.service.metrics.as_dict())
+        elif url.path == '/parse':
+            query = urlparse.parse_qs(url.query)
+            if 'address' not in query:
+                self._send_json(400, {'error': 'address is required'})
+                return
+            address = query['address'][0].decode('utf-8')
+            self._parse([address], None, single=True)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urlparse.urlparse(self.path)
+        if url.path not in ['/parse', '/parse_batch']:
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        length = int(self.headers.getheader('content-length', 0))
+        try:
+            data = json.loads(self.rfile.read(length).decode('utf-8'))
+            timeout = data.get('timeout')
+            if timeout is not None and (
+                    isinstance(timeout, bool) or
+                    not isinstance(timeout, (int, long, float)) or
+                    timeout < 0):
+                raise ValueError('timeout must be a non-negative number')
+            if url.path == '/parse':
+                addresses = [data['address']]
+            else:
+                addresses = data['addresses']
+                if not isinstance(addresses, list):
+                    raise ValueError('addresses must be a list')
+            if not all(isinstance(a, basestring) for a in addresses):
+                raise ValueError('addresses must be strings')
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self._send_json(400, {'error': unicode(e)})
+            return
+
+        self._parse(addresses, timeout, single=(url.path == '/parse'))
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_server(service, host='127.0.0.1', port=8080, verbose=False):
+    """Create HTTP server for the service.
+    Use port=0 to get a free port (see server.server_address).
+    """
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.service = service
+    server.verbose = verbose
+
+    return server
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Address parsing service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--path', default='csv_files/',
+                        help='directory of the list files')
+    parser.add_argument('--city-list', default='cities.csv',
+                        help='name of the city list file')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--delay', type=float, default=0.005,
+                        help='max delay (seconds) for collecting a batch')
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='default deadline of requests (seconds)')
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help='count of the cached results of a worker')
+    parser.add_argument('--cache-snapshot', default=None,
+                        help='snapshot of the cache to load on start '
+                             '(see address_cache.py)')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    service = AddressService(
+        args.path,
+        workers=args.workers,
+        max_batch_size=args.batch_size,
+        max_delay=args.delay,
+        timeout=args.timeout,
+        splitter_options={'city_list_file': args.city_list},
+        cache_size=args.cache_size,
+        cache_snapshot=args.cache_snapshot)
+    server = make_server(service, args.host, args.port, args.verbose)
+    sys.stderr.write('Listening on %s:%s\n' % server.server_address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
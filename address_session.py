@@ -0,0 +1,345 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Incremental parsing of the address being typed.
+
+IncrementalSession keeps the matches of the patterns and the scores
+of the strategies found for the previous text. When the text is changed
+(a symbol is appended or removed) only the tail after the common prefix
+of the old and the new text is examined again:
+
+    * an attempt of a pattern at the position i reads at most the
+      symbols i - 1 ... i + width of the pattern (the max length of
+      its match, the word bound checks one symbol more), so the matches
+      that begin before the common prefix length - width - 1 don't
+      change and the pattern is matched again (re.finditer from the
+      position) only after them;
+    * the pattern is matched again only if it had a match in the dirty
+      tail or the tail contains its literal or its anchor (see
+      address_matchers); the literals and the anchors of a category are
+      searched in one trie;
+    * the score of the strategy which parts are in the common prefix
+      changes by the penalty of the appended blank symbols only, so
+      the scores of such strategies are reused.
+
+The result is the same as AddressSplitter.get_parsed_address of the
+splitter without beam_width (the session searches all strategies, the
+splitters with a beam are rejected); the result_cache of the splitter
+is not used. The categories that are matched by a matcher or counted by pattern_stats,
+the index and the house scanner are searched in the whole text.
+
+Usage:
+    index = SessionIndex(splitter)     # shared by the sessions
+    session = IncrementalSession(splitter, index)
+    for text in (u'М', u'Мо', u'Мос', ...):
+        address = session.update(text)
+"""
+
+import os
+import sre_parse
+from itertools import product
+
+from address_splitter import SplitingStrategy, CATEGORIES
+from address_matchers import expand_pattern, required_literal
+from address_beam import spans_score
+
+# The patterns with a longer match are matched from the text beginning
+MAX_WIDTH = 256
+
+# Categories in the order of the candidates (see _get_candidates)
+CANDIDATE_PARTS = ['index', 'country', 'region', 'subregion', 'city',
+                   'street', 'house', 'poi']
+
+
+def pattern_width(name):
+    """Return max length of the match of the pattern, None if it is
+    not limited by MAX_WIDTH
+    """
+    try:
+        width = sre_parse.parse(name).getwidth()[1]
+    except Exception:
+        return None
+    return width if width <= MAX_WIDTH else None
+
+
+class CategoryIndex(object):
+    """Widths and the trie of the literals and the anchors
+    of the patterns of a category
+    """
+    def __init__(self, patterns):
+        """
+        :param patterns:    dict name => compiled pattern
+        """
+        self.patterns = patterns
+        self.names = list(patterns)
+        self.numbers = {name: i for i, name in enumerate(self.names)}
+        self.widths = {}
+        # The patterns without literals and anchors: they are matched
+        # on every change
+        self.free = []
+        # Trie: dict symbol => node, key None => list of names
+        self._root = {}
+        for name in self.names:
+            self.widths[name] = pattern_width(name)
+            keys = expand_pattern(name)
+            if keys is None:
+                anchor = required_literal(name)
+                keys = [anchor] if anchor is not None else []
+            if not keys:
+                self.free.append(name)
+            for key in keys:
+                node = self._root
+                for char in key:
+                    node = node.setdefault(char, {})
+                node.setdefault(None, []).append(name)
+
+    def dirty_begin(self, name, stable):
+        """Return the position from that the matches of the pattern can
+        change if the text is not changed before the stable position
+        """
+        width = self.widths[name]
+        if width is None:
+            return 0
+        return max(stable - width - 1, 0)
+
+    def scan(self, text):
+        """Return dict: name => the last begin of its literal or anchor
+        in the text (the text is lowercased)
+        """
+        found = {}
+        root = self._root
+        size = len(text)
+        for begin in xrange(size):
+            node = root.get(text[begin])
+            end = begin + 1
+            while node is not None:
+                names = node.get(None)
+                if names:
+                    for name in names:
+                        found[name] = begin
+                if end == size:
+                    break
+                node = node.get(text[end])
+                end += 1
+        return found
+
+
+class SessionIndex(object):
+    """Category indexes of a splitter (the index of a category is rebuilt
+    if the patterns of the category are changed). The index can be
+    shared by the sessions of the splitter.
+    """
+    def __init__(self, splitter):
+        self.splitter = splitter
+        self._indexes = {}
+
+    def incremental(self, category):
+        """Return True if the category is matched incrementally
+        """
+        splitter = self.splitter
+        if category == 'index' or splitter.pattern_stats is not None or \
+                category in splitter._matcher_classes:
+            return False
+        if category == 'house' and splitter.use_scanners:
+            return False
+        return True
+
+    def get(self, category):
+        """Return CategoryIndex of the category
+        """
+        patterns = self.splitter._get_list(category)
+        index = self._indexes.get(category)
+        if index is None or index.patterns is not patterns:
+            index = CategoryIndex(patterns)
+            self._indexes[category] = index
+        return index
+
+    def warm_up(self):
+        """Build the indexes of all categories
+        """
+        for category in CATEGORIES:
+            if self.incremental(category):
+                self.get(category)
+
+
+class IncrementalSession(object):
+    """Parsing of the text changed by small edits (see the module
+    description)
+    """
+    def __init__(self, splitter, index=None):
+        """
+        :param splitter:    AddressSplitter
+        :param index:       SessionIndex of the splitter (a new index
+                            is created if None)
+        :raises ValueError: if the splitter has beam_width (the session
+                            searches all strategies)
+        """
+        if splitter.beam_width is not None:
+            raise ValueError(u'The session needs a splitter without '
+                             u'beam_width')
+        self.splitter = splitter
+        self.index = index or SessionIndex(splitter)
+        self._penalties = splitter.strategy_penalties()
+        self.reset()
+
+    def reset(self):
+        """Forget the previous text
+        """
+        self._address = u''
+        self._lower = u''
+        # category => (CategoryIndex, dict name => list of positions)
+        self._matches = {}
+        # strategy positions => (score without the blank penalty
+        #                        of the length, end of the last part)
+        self._scores = {}
+        self._best = None
+        self._candidates = None
+
+    @property
+    def address(self):
+        return self._address
+
+    def append(self, text):
+        """Append the text to the current text and return the parsed
+        address
+        """
+        return self.update(self._address + text)
+
+    def update(self, address):
+        """Set the current text and return the parsed address
+        (the same as AddressSplitter.get_parsed_address without the
+        result cache)
+        """
+        return self.get_best_strategy(address).get_parsed_address()
+
+    def get_best_strategy(self, address):
+        """Return the best strategy of the text (the same as
+        AddressSplitter.get_best_strategy without the result cache)
+        """
+        if address == self._address and self._best is not None:
+            return self._best
+
+        lower = address.lower()
+        if len(lower) == len(address) and \
+                len(self._lower) == len(self._address):
+            stable = len(os.path.commonprefix([self._lower, lower]))
+        else:
+            # The positions of the lowercased text are shifted
+            stable = 0
+
+        candidates = self._get_candidates(address, lower, stable)
+        self._best = self._search(address, candidates, stable)
+        self._address = address
+        self._lower = lower
+        self._candidates = candidates
+        return self._best
+
+    def get_candidates(self, address):
+        """Return found positions of all address parts (the same as
+        AddressSplitter._get_candidates)
+        """
+        self.get_best_strategy(address)
+        return self._candidates
+
+    def _get_candidates(self, address, lower, stable):
+        splitter = self.splitter
+        candidates = []
+        for category in CANDIDATE_PARTS:
+            if self.index.incremental(category):
+                found = self._update_category(category, lower, stable)
+            else:
+                found = getattr(splitter, '_get_%s_pos' % category)(address)
+            candidates.append(found)
+
+        table = splitter._get_index_table()
+        if table is not None and candidates[0]:
+            candidates[2], candidates[3] = table.restrict(
+                candidates[0], candidates[2], candidates[3])
+        return candidates
+
+    def _update_category(self, category, lower, stable):
+        """Return dict: found text => list of positions of the category
+        """
+        index = self.index.get(category)
+        kept = self._matches.get(category)
+        if kept is None or kept[0] is not index:
+            # The patterns are changed: all matches are searched again
+            matches = {}
+            stable = 0
+        else:
+            matches = kept[1]
+        self._matches[category] = (index, matches)
+
+        changed = set(index.free)
+        for name, begin in index.scan(lower).iteritems():
+            if begin >= index.dirty_begin(name, stable):
+                changed.add(name)
+        for name, spans in matches.iteritems():
+            if spans[-1][0] >= index.dirty_begin(name, stable):
+                changed.add(name)
+
+        for name in changed:
+            dirty = index.dirty_begin(name, stable)
+            spans = [span for span in matches.get(name, ())
+                     if span[0] < dirty]
+            pos = dirty
+            if spans:
+                begin, end = spans[-1]
+                # finditer continues after an empty match from the next
+                # position
+                pos = max(pos, end + 1 if begin == end else end)
+            spans.extend(m.span()
+                         for m in index.patterns[name].finditer(lower, pos))
+            if spans:
+                matches[name] = spans
+            else:
+                matches.pop(name, None)
+
+        # The same order of the found texts as in _get_positions
+        res = dict()
+        for name in sorted(matches, key=index.numbers.get):
+            for begin, end in matches[name]:
+                try:
+                    res[lower[begin:end]].append((begin, end))
+                except KeyError:
+                    res[lower[begin:end]] = [(begin, end)]
+        return res
+
+    def _search(self, address, candidates, stable):
+        """Return the best strategy (the first one with the minimum
+        score in the order of AddressSplitter._iter_strategies)
+        """
+        size = len(address)
+        scores = {}
+        best = None
+        best_score = None
+        parts = [[spans for text, spans in found.iteritems() if text] +
+                 [[None]]
+                 for found in candidates]
+        blank_penalty = self._penalties[1]
+
+        for pos in product(*parts):
+            for p in product(*pos):
+                kept = self._scores.get(p)
+                if kept is None or kept[1] > stable:
+                    kept = spans_score(p, self._penalties)
+                scores[p] = kept
+                score = kept[0] + blank_penalty * size
+                if best is None or score < best_score:
+                    best, best_score = p, score
+
+        self._scores = scores
+        return self._strategy(address, best)
+
+    @staticmethod
+    def _strategy(address, p):
+        return SplitingStrategy(
+            address=address,
+            index_pos=p[0],
+            country_pos=p[1],
+            region_pos=p[2],
+            subregion_pos=p[3],
+            city_pos=p[4],
+            street_pos=p[5],
+            house_pos=p[6],
+            poi_pos=p[7])
@@ -0,0 +1,496 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Sharded batch parsing of large address files.
+
+The job directory (on a filesystem shared by the nodes) contains the
+manifest of the job and the files of the shards:
+
+    manifest.json           -- input file, split mode, parser options
+                               and the list of shards
+    shard-0000.in           -- input of the shard (hash mode only)
+    shard-0000.lock         -- the shard is taken by a node
+    shard-0000.status.json  -- progress of the shard
+    shard-0000.out          -- parsed rows (written to .out.tmp and
+                               renamed when the shard is done)
+
+Split modes:
+    bytes   -- the input file is split into byte ranges aligned to line
+               boundaries (the lines of every range are counted), the
+               shards read their ranges of the input file, the outputs
+               are concatenated by merge
+    hash    -- the lines are distributed by the hash of the normalized
+               address (the duplicates are parsed by the same shard and
+               hit the same cache), every line keeps its line number
+               and the outputs are merged by the line numbers
+
+The same input, shard count and mode give the same shards. The count
+of the lines of every shard is stored in the manifest: a shard checks
+its parsed rows and merge checks the rows of every output and the total
+against the input.
+
+Usage:
+    python address_shards.py plan input job_dir [--shards N] [--mode M]
+    python address_shards.py run job_dir [--shard K] [--processes P]
+    python address_shards.py status job_dir
+    python address_shards.py merge job_dir output
+"""
+
+import os
+import sys
+
+import json
+import time
+import heapq
+import errno
+import socket
+import zlib
+import multiprocessing
+
+from address_splitter import AddressSplitter
+from address_batch import normalize_address, parse_batches, format_result
+
+MANIFEST = 'manifest.json'
+
+MODES = ['bytes', 'hash']
+
+# Size of the blocks read by the line counting (bytes)
+BLOCK_SIZE = 1 << 20
+
+
+class ShardError(Exception):
+    """The job can't be processed (wrong manifest, unfinished shards,
+    count mismatch)
+    """
+    pass
+
+
+def _shard_file(job_dir, shard, suffix):
+    return os.path.join(job_dir, 'shard-%04d.%s' % (shard, suffix))
+
+
+def _write_json(filename, data):
+    """Write JSON file atomically (the readers never see a partial file)
+    """
+    tmp = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.rename(tmp, filename)
+
+
+def _read_json(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def read_manifest(job_dir):
+    try:
+        return _read_json(os.path.join(job_dir, MANIFEST))
+    except IOError:
+        raise ShardError(u'No manifest in %s' % job_dir)
+
+
+def _aligned_offsets(filename, shards):
+    """Return shards + 1 byte offsets of the shard bounds, every bound
+    is the beginning of a line
+    """
+    size = os.path.getsize(filename)
+    offsets = [0]
+    with open(filename, 'rb') as f:
+        for i in range(1, shards):
+            nominal = size * i // shards
+            if nominal <= offsets[-1]:
+                offsets.append(offsets[-1])
+                continue
+            f.seek(nominal - 1)
+            f.readline()
+            offsets.append(max(f.tell(), offsets[-1]))
+    offsets.append(size)
+    return offsets
+
+
+def _count_lines(filename, offsets):
+    """Return list of the counts of the lines of the byte ranges between
+    the offsets (the last line without the line feed is counted)
+    """
+    counts = []
+    with open(filename, 'rb') as f:
+        for begin, end in zip(offsets, offsets[1:]):
+            f.seek(begin)
+            count = 0
+            block = ''
+            remaining = end - begin
+            while remaining > 0:
+                block = f.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                count += block.count('\n')
+                remaining -= len(block)
+            if block and not block.endswith('\n'):
+                count += 1
+            counts.append(count)
+    return counts
+
+
+def shard_of(address, shards):
+    """Return shard number of the address in hash mode
+    (stable between processes and machines)
+    """
+    key = normalize_address(address).encode('utf-8')
+    return (zlib.crc32(key) & 0xffffffff) % shards
+
+
+def plan(input_file, job_dir, shards, mode='bytes', options=None):
+    """Split the input and write the manifest.
+
+    :param input_file:  file of addresses (utf-8, one per line)
+    :param job_dir:     job directory (created if absent)
+    :param shards:      count of shards
+    :param mode:        'bytes' or 'hash' (see the module description)
+    :param options:     parser options: path (directory of the list
+                        files), splitter (arguments of
+                        AddressSplitter.from_directory), delimiter,
+                        batch_size
+
+    :returns:   the manifest (dict)
+    """
+    if mode not in MODES:
+        raise ValueError(u'Unknown mode "%s"' % mode)
+    if shards < 1:
+        raise ValueError(u'Count of shards must be positive, got %s' % shards)
+    if not os.path.isdir(job_dir):
+        os.makedirs(job_dir)
+    if os.path.exists(os.path.join(job_dir, MANIFEST)):
+        raise ShardError(u'The job %s is already planned' % job_dir)
+
+    params = dict(path='csv_files/', splitter={}, delimiter=u',',
+                  batch_size=1000)
+    params.update(options or {})
+    manifest = dict(input=os.path.abspath(input_file),
+                    size=os.path.getsize(input_file),
+                    mode=mode,
+                    options=params,
+                    shards=[])
+
+    if mode == 'bytes':
+        offsets = _aligned_offsets(input_file, shards)
+        counts = _count_lines(input_file, offsets)
+        for i in range(shards):
+            manifest['shards'].append(dict(id=i, begin=offsets[i],
+                                           end=offsets[i + 1],
+                                           lines=counts[i]))
+        manifest['lines'] = sum(counts)
+    else:
+        outputs = [open(_shard_file(job_dir, i, 'in'), 'w')
+                   for i in range(shards)]
+        counts = [0] * shards
+        lines = 0
+        try:
+            with open(input_file) as f:
+                for lines, line in enumerate(f, 1):
+                    address = line.decode('utf-8').rstrip(u'\r\n')
+                    shard = shard_of(address, shards)
+                    outputs[shard].write('%d\t%s\n' % (
+                        lines, address.encode('utf-8')))
+                    counts[shard] += 1
+        finally:
+            for output in outputs:
+                output.close()
+        for i in range(shards):
+            manifest['shards'].append(dict(id=i, lines=counts[i]))
+        manifest['lines'] = lines
+
+    _write_json(os.path.join(job_dir, MANIFEST), manifest)
+    return manifest
+
+
+def _iter_shard_input(manifest, job_dir, shard):
+    """Generate (line number or None, address) of the shard
+    """
+    if manifest['mode'] == 'bytes':
+        info = manifest['shards'][shard]
+        with open(manifest['input'], 'rb') as f:
+            f.seek(info['begin'])
+            while f.tell() < info['end']:
+                line = f.readline()
+                if not line:
+                    break
+                yield None, line.decode('utf-8').rstrip(u'\r\n')
+    else:
+        with open(_shard_file(job_dir, shard, 'in')) as f:
+            for line in f:
+                number, address = line.decode('utf-8') \
+                    .rstrip(u'\r\n').split(u'\t', 1)
+                yield int(number), address
+
+
+def shard_status(job_dir, shard):
+    """Return status of the shard (dict), state is 'pending', 'running'
+    or 'done'
+    """
+    try:
+        return _read_json(_shard_file(job_dir, shard, 'status.json'))
+    except IOError:
+        return dict(state='pending', rows=0)
+
+
+def _claim(job_dir, shard, force=False):
+    """Take the shard by creating its lock file, return False if the
+    shard is taken by another process
+    """
+    lock = _shard_file(job_dir, shard, 'lock')
+    if force and os.path.exists(lock):
+        os.remove(lock)
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except OSError as e:
+        if e.errno == errno.EEXIST:
+            return False
+        raise
+    os.write(fd, '%s %d\n' % (socket.gethostname(), os.getpid()))
+    os.close(fd)
+    return True
+
+
+# Splitters of the process: options (JSON) => AddressSplitter
+_splitters = {}
+
+
+def _get_splitter(options):
+    key = json.dumps([options['path'], options['splitter']], sort_keys=True)
+    splitter = _splitters.get(key)
+    if splitter is None:
+        splitter = AddressSplitter.from_directory(options['path'],
+                                                  **options['splitter'])
+        _splitters[key] = splitter
+    return splitter
+
+
+def run_shard(job_dir, shard, splitter=None, force=False):
+    """Parse the shard.
+
+    :param splitter:    AddressSplitter object (created from the options
+                        of the manifest if None)
+    :param force:       run the shard even if it is taken by another
+                        process or done (e.g. after a node failure)
+
+    :returns:   status of the shard or None if the shard is taken
+                by another process
+    """
+    manifest = read_manifest(job_dir)
+    if not 0 <= shard < len(manifest['shards']):
+        raise ShardError(u'No shard %s in %s' % (shard, job_dir))
+    if not force and shard_status(job_dir, shard)['state'] == 'done':
+        return shard_status(job_dir, shard)
+    if not _claim(job_dir, shard, force):
+        return None
+
+    options = manifest['options']
+    if splitter is None:
+        splitter = _get_splitter(options)
+    status_file = _shard_file(job_dir, shard, 'status.json')
+    status = dict(state='running', rows=0, distinct=0,
+                  host=socket.gethostname(), pid=os.getpid(),
+                  started=time.time())
+    _write_json(status_file, status)
+
+    output = _shard_file(job_dir, shard, 'out')
+    rows = _iter_shard_input(manifest, job_dir, shard)
+    numbers = []
+
+    def addresses():
+        for number, address in rows:
+            numbers.append(number)
+            yield address
+
+    try:
+        with open(output + '.tmp', 'w') as out:
+            for batch, parsed, stats in parse_batches(
+                    splitter, addresses(), options['batch_size']):
+                for number, line, address in zip(numbers, batch, parsed):
+                    row = format_result(line, address, options['delimiter'])
+                    if number is not None:
+                        row = u'%d\t%s' % (number, row)
+                    out.write(row.encode('utf-8') + '\n')
+                del numbers[:]
+                status['rows'] += stats.rows
+                status['distinct'] += stats.distinct
+                status['updated'] = time.time()
+                _write_json(status_file, status)
+
+        expected = manifest['shards'][shard]['lines']
+        if expected != status['rows']:
+            raise ShardError(u'Shard %d: %d rows parsed, %d expected' %
+                             (shard, status['rows'], expected))
+        os.rename(output + '.tmp', output)
+        status['state'] = 'done'
+        status['finished'] = time.time()
+        _write_json(status_file, status)
+    finally:
+        os.remove(_shard_file(job_dir, shard, 'lock'))
+
+    return status
+
+
+def job_status(job_dir):
+    """Return list of the statuses of the shards
+    """
+    manifest = read_manifest(job_dir)
+    return [dict(shard_status(job_dir, info['id']), id=info['id'])
+            for info in manifest['shards']]
+
+
+def _run_worker(args):
+    job_dir, shard = args
+    status = run_shard(job_dir, shard)
+    return shard, status and status['state']
+
+
+def run_local(job_dir, processes=None, shards=None):
+    """Run the pending shards in local processes (the shards taken by
+    other nodes are skipped).
+
+    :param shards:  numbers of the shards (all shards if None)
+    :returns:       dict: shard => state ('done' or None if the shard
+                    is taken by another process)
+    """
+    manifest = read_manifest(job_dir)
+    if shards is None:
+        shards = [info['id'] for info in manifest['shards']]
+    pending = [shard for shard in shards
+               if shard_status(job_dir, shard)['state'] != 'done']
+
+    result = {shard: 'done' for shard in shards if shard not in pending}
+    if processes == 0:
+        result.update(_run_worker((job_dir, shard)) for shard in pending)
+    elif pending:
+        pool = multiprocessing.Pool(processes)
+        try:
+            result.update(pool.map(_run_worker,
+                                   [(job_dir, shard) for shard in pending],
+                                   chunksize=1))
+        finally:
+            pool.close()
+            pool.join()
+    return result
+
+
+def merge(job_dir, output_file):
+    """Merge the outputs of the shards in the order of the input lines.
+
+    :raises ShardError: if a shard is not done or the count of the
+                        rows of a shard output or of all merged rows
+                        differs from the count of the input lines
+    :returns:           count of the merged rows
+    """
+    manifest = read_manifest(job_dir)
+    statuses = job_status(job_dir)
+    unfinished = [s['id'] for s in statuses if s['state'] != 'done']
+    if unfinished:
+        raise ShardError(u'Shards are not done: %s' %
+                         u', '.join(map(unicode, unfinished)))
+    for info, status in zip(manifest['shards'], statuses):
+        if status['rows'] != info['lines']:
+            raise ShardError(u'Shard %d: %d rows parsed, the input has %d '
+                             u'lines' % (info['id'], status['rows'],
+                                         info['lines']))
+
+    outputs = [open(_shard_file(job_dir, s['id'], 'out')) for s in statuses]
+    counts = [0] * len(outputs)
+
+    def counted(i, f):
+        for line in f:
+            counts[i] += 1
+            yield line
+
+    merged = 0
+    try:
+        with open(output_file, 'w') as out:
+            files = [counted(i, f) for i, f in enumerate(outputs)]
+            if manifest['mode'] == 'bytes':
+                rows = (line for f in files for line in f)
+            else:
+                numbered = [((int(line.split('\t', 1)[0]), line) for line in f)
+                            for f in files]
+                rows = (line.split('\t', 1)[1]
+                        for _, line in heapq.merge(*numbered))
+            for line in rows:
+                out.write(line)
+                merged += 1
+    finally:
+        for f in outputs:
+            f.close()
+
+    for info, count in zip(manifest['shards'], counts):
+        if count != info['lines']:
+            raise ShardError(u'Shard %d: %d rows in the output, the input '
+                             u'has %d lines' % (info['id'], count,
+                                                info['lines']))
+    if merged != manifest['lines']:
+        raise ShardError(u'%d rows merged, the input has %d lines' %
+                         (merged, manifest['lines']))
+    return merged
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Sharded address parsing')
+    commands = parser.add_subparsers(dest='command')
+
+    plan_parser = commands.add_parser('plan', help='split the input')
+    plan_parser.add_argument('input')
+    plan_parser.add_argument('job_dir')
+    plan_parser.add_argument('--shards', type=int, default=8)
+    plan_parser.add_argument('--mode', default='bytes', choices=MODES)
+    plan_parser.add_argument('--path', default='csv_files/',
+                             help='directory of the list files')
+    plan_parser.add_argument('--city-list', default='cities.csv',
+                             help='name of the city list file')
+    plan_parser.add_argument('--delimiter', default=',')
+    plan_parser.add_argument('--batch-size', type=int, default=1000)
+
+    run_parser = commands.add_parser('run', help='parse the shards')
+    run_parser.add_argument('job_dir')
+    run_parser.add_argument('--shard', type=int, action='append',
+                            help='shard number (all pending shards '
+                                 'by default)')
+    run_parser.add_argument('--processes', type=int, default=None)
+    run_parser.add_argument('--force', action='store_true',
+                            help='run the shard even if it is locked')
+
+    status_parser = commands.add_parser('status', help='show progress')
+    status_parser.add_argument('job_dir')
+
+    merge_parser = commands.add_parser('merge', help='merge the outputs')
+    merge_parser.add_argument('job_dir')
+    merge_parser.add_argument('output')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'plan':
+            manifest = plan(args.input, args.job_dir, args.shards, args.mode,
+                            dict(path=args.path,
+                                 splitter={'city_list_file': args.city_list},
+                                 delimiter=args.delimiter.decode('utf-8'),
+                                 batch_size=args.batch_size))
+            print '%d shards planned' % len(manifest['shards'])
+        elif args.command == 'run':
+            if args.force:
+                shards = args.shard or [s['id'] for s
+                                        in job_status(args.job_dir)]
+                for shard in shards:
+                    run_shard(args.job_dir, shard, force=True)
+            else:
+                states = run_local(args.job_dir, args.processes, args.shard)
+                for shard, state in sorted(states.items()):
+                    print 'shard %d: %s' % (shard, state or 'locked')
+        elif args.command == 'status':
+            for status in job_status(args.job_dir):
+                print 'shard %(id)d: %(state)s, %(rows)d rows' % status
+        elif args.command == 'merge':
+            print '%d rows merged' % merge(args.job_dir, args.output)
+    except ShardError as e:
+        sys.stderr.write(unicode(e).encode('utf-8') + '\n')
+        sys.exit(1)
@@ -0,0 +1,226 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Parallel parsing of a file with the results in shared memory.
+
+address_input.parse_file returns the lines and the Address objects
+from the workers, they are pickled and sent to the parent process:
+most of the cost of the parallel parsing for the short addresses.
+Here the workers write the positions of the parts (int32 begin, end
+of every part, NO_SPAN for an absent part) and the score of every line
+to numpy arrays in shared memory (multiprocessing.RawArray) and return
+only (slot, first line, count of lines) of the chunk, so the size of
+the messages doesn't depend on the addresses. The parent reads the
+lines of the file itself and makes the Address objects only when they
+are asked (SpanChunk.addresses).
+
+The buffer has a fixed count of slots of chunk_lines rows, a chunk is
+written to the slot (number of the chunk) % slots, and the slot is used
+again after the parent has taken the chunk (the rows of the chunk are
+copied from the slot, (8 * 2 * 4 + 8) bytes per line).
+
+The parsing fails with RuntimeError if a worker process dies (the pool
+replaces it, its chunk is lost) or a chunk is not parsed in
+task_timeout seconds.
+"""
+
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+from collections import deque
+
+import numpy as np
+
+from address import Address
+from address_splitter import PARTS, AddressSplitter
+from address_batch import group_duplicates
+from address_beam import spans_score
+from address_input import LineIndex, read_lines, wait_task, worker_pids
+
+# Position of an absent part
+NO_SPAN = -1
+
+# Count of the slots of the buffer per worker
+SLOTS_PER_WORKER = 2
+
+# Arguments of Address of the parts in the order of PARTS
+ADDRESS_FIELDS = ['index', 'country', 'region', 'subregion', 'settlement',
+                  'street', 'house', 'poi']
+
+
+class SpanBuffer(object):
+    """Shared arrays of the positions and the scores of the chunks
+    """
+    def __init__(self, slots, chunk_lines):
+        """
+        :param slots:       count of the chunks in the buffer
+        :param chunk_lines: max count of the lines of a chunk
+        """
+        self.slots = slots
+        self.chunk_lines = chunk_lines
+        self._spans = RawArray('i', slots * chunk_lines * len(PARTS) * 2)
+        self._scores = RawArray('d', slots * chunk_lines)
+
+    def spans(self, slot):
+        """Return numpy view of the positions of the slot:
+        (chunk_lines, len(PARTS), 2) array of int32
+        """
+        spans = np.ctypeslib.as_array(self._spans)
+        spans = spans.reshape(self.slots, self.chunk_lines, len(PARTS), 2)
+        return spans[slot]
+
+    def scores(self, slot):
+        """Return numpy view of the scores of the slot
+        """
+        scores = np.ctypeslib.as_array(self._scores)
+        return scores.reshape(self.slots, self.chunk_lines)[slot]
+
+
+def write_spans(splitter, lines, spans, scores):
+    """Parse the lines (every distinct address once, see
+    address_batch.group_duplicates) and write the positions of the
+    parts and the scores of the best strategies to the arrays
+    (the rows of the arrays are the lines)
+    """
+    penalties = splitter.strategy_penalties()
+    blank_penalty = penalties[1]
+    for rows in group_duplicates(lines).itervalues():
+        strategy = splitter.get_best_strategy(lines[rows[0]])
+        positions = [getattr(strategy, part + '_pos') for part in PARTS]
+        spans[rows] = [pos or (NO_SPAN, NO_SPAN) for pos in positions]
+        score = spans_score(positions, penalties)[0]
+        for i in rows:
+            # The trailing spaces of the duplicates are blank symbols
+            scores[i] = score + blank_penalty * len(lines[i])
+
+
+def spans_address(spans, address):
+    """Return Address: the positions of the parts (a row of the spans
+    array) are applied to the address string
+
+    :rtype: Address
+    """
+    parts = {}
+    for field, (begin, end) in zip(ADDRESS_FIELDS, spans.tolist()):
+        parts[field] = address[begin:end] if begin != NO_SPAN else None
+    return Address(raw_address=address, **parts)
+
+
+class SpanChunk(object):
+    """Parsed chunk of the lines of the file: the positions and the
+    scores, the lines are read from the file when they are used
+    """
+    def __init__(self, filename, first, begin, end, spans, scores):
+        """
+        :param first:       number of the first line of the chunk
+        :param begin, end:  byte range of the lines in the file
+        :param spans:       (lines, len(PARTS), 2) array of the positions
+                            of the parts (NO_SPAN for an absent part)
+        :param scores:      array of the scores of the lines
+        """
+        self.filename = filename
+        self.first = first
+        self.begin = begin
+        self.end = end
+        self.spans = spans
+        self.scores = scores
+        self._lines = None
+
+    def __len__(self):
+        return len(self.spans)
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._lines = read_lines(self.filename, self.begin, self.end)
+        return self._lines
+
+    def positions(self, i):
+        """Return dict: part => (begin, end) or None of the i-th line
+        of the chunk
+        """
+        return {part: tuple(pos) if pos[0] != NO_SPAN else None
+                for part, pos in zip(PARTS, self.spans[i].tolist())}
+
+    def address(self, i):
+        """Return the parsed i-th line of the chunk
+
+        :rtype: Address
+        """
+        return spans_address(self.spans[i], self.lines[i])
+
+    def addresses(self):
+        """Return list of the parsed lines of the chunk
+        """
+        return [spans_address(spans, line)
+                for spans, line in zip(self.spans, self.lines)]
+
+
+# Worker process state: the splitter and the shared buffer are set once
+# per process
+_splitter = None
+_buffer = None
+
+
+def _init_worker(path, options, buffer):
+    global _splitter, _buffer
+    _splitter = AddressSplitter.from_directory(path, **options)
+    _buffer = buffer
+
+
+def _parse_chunk(args):
+    filename, slot, (first, begin, end) = args
+    lines = read_lines(filename, begin, end)
+    count = len(lines)
+    write_spans(_splitter, lines, _buffer.spans(slot)[:count],
+                _buffer.scores(slot)[:count])
+    return slot, count
+
+
+def parse_file_spans(filename, path, options=None, workers=None,
+                     chunk_lines=1000, first=0, last=None, slots=None,
+                     task_timeout=None):
+    """Parse the lines first <= line < last of the file in worker
+    processes, the results are sent through shared memory.
+
+    :param path:        directory of the list files
+    :param options:     arguments of AddressSplitter.from_directory
+    :param workers:     count of worker processes (CPU count if None)
+    :param slots:       count of the chunks in the shared buffer
+                        (SLOTS_PER_WORKER per worker if None)
+    :param task_timeout: max time of waiting for a parsed chunk
+                        (seconds, not limited if None)
+    :raises RuntimeError:   if a worker process dies or a chunk is not
+                            parsed in task_timeout seconds
+
+    Generate SpanChunk objects in the order of the lines.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if slots is None:
+        slots = SLOTS_PER_WORKER * workers
+    chunks = LineIndex(filename).chunks(chunk_lines, first, last)
+    buffer = SpanBuffer(slots, chunk_lines)
+
+    def take(task, chunk):
+        slot, count = wait_task(task, pool, pids, task_timeout)
+        return SpanChunk(filename, chunk[0], chunk[1], chunk[2],
+                         buffer.spans(slot)[:count].copy(),
+                         buffer.scores(slot)[:count].copy())
+
+    pool = multiprocessing.Pool(workers, _init_worker,
+                                (path, options or {}, buffer))
+    pids = worker_pids(pool)
+    try:
+        pending = deque()
+        for number, chunk in enumerate(chunks):
+            if len(pending) == slots:
+                # The slot of the oldest chunk is used by this chunk
+                yield take(*pending.popleft())
+            task = pool.apply_async(_parse_chunk,
+                                    ((filename, number % slots, chunk),))
+            pending.append((task, chunk))
+        while pending:
+            yield take(*pending.popleft())
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,194 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Log of the slow addresses and its replay.
+
+The splitter with a SlowLog (AddressSplitter(..., slow_log=SlowLog(...)))
+appends the address to the log if its parsing takes longer than
+max_time or the address has more than max_strategies strategies.
+Every line of the log is a JSON object:
+
+    address         -- the address
+    time            -- parsing time (seconds)
+    match_time      -- time of the search of the candidates
+    search_time     -- time of the search of the best strategy
+    candidates      -- dict: category => count of the candidate positions
+    strategies      -- count of the strategies
+    score           -- score of the best strategy
+    reasons         -- list of the exceeded limits ('time', 'strategies')
+    logged          -- unix time of the record
+
+The replay parses the addresses of the log by the current code and
+prints the logged and the current timings, so the log of the real
+problem addresses is a regression set.
+
+Usage:
+    python address_slowlog.py log.jsonl path [--engine NAME]
+        [--city-list-file FILE] [--repeat N] [--sort time|change]
+"""
+
+import json
+import time
+import argparse
+import threading
+from timeit import default_timer
+
+from address_splitter import PARTS
+
+
+def count_candidates(candidates):
+    """Return dict: category => count of the candidate positions
+    (candidates in the order of AddressSplitter._get_candidates)
+    """
+    return {part: sum(len(spans) for text, spans in found.iteritems()
+                      if text)
+            for part, found in zip(PARTS, candidates)}
+
+
+def count_strategies(candidates):
+    """Return count of the strategies of the candidates (every part has
+    its positions and the absence)
+    """
+    count = 1
+    for positions in count_candidates(candidates).itervalues():
+        count *= positions + 1
+    return count
+
+
+class SlowLog(object):
+    """Appends the slow addresses to a JSONL file
+    """
+    def __init__(self, filename, max_time=0.5, max_strategies=10000):
+        """
+        :param filename:        log file (the records are appended)
+        :param max_time:        max parsing time (seconds), not checked
+                                if None
+        :param max_strategies:  max count of the strategies, not checked
+                                if None
+        """
+        self.filename = filename
+        self.max_time = max_time
+        self.max_strategies = max_strategies
+        self.timer = default_timer
+        self._lock = threading.Lock()
+
+    def reasons(self, parse_time, strategies):
+        """Return list of the exceeded limits
+        """
+        reasons = []
+        if self.max_time is not None and parse_time > self.max_time:
+            reasons.append('time')
+        if self.max_strategies is not None and \
+                strategies > self.max_strategies:
+            reasons.append('strategies')
+        return reasons
+
+    def check(self, address, candidates, strategies, score,
+              match_time, search_time):
+        """Append the address to the log if it exceeds a limit
+        (the score can be a numpy number)
+
+        :returns:   the record or None
+        """
+        parse_time = match_time + search_time
+        reasons = self.reasons(parse_time, strategies)
+        if not reasons:
+            return None
+        record = dict(address=address,
+                      time=parse_time,
+                      match_time=match_time,
+                      search_time=search_time,
+                      candidates=count_candidates(candidates),
+                      strategies=strategies,
+                      score=getattr(score, 'item', lambda: score)(),
+                      reasons=reasons,
+                      logged=time.time())
+        line = json.dumps(record, sort_keys=True)
+        with self._lock:
+            with open(self.filename, 'a') as f:
+                f.write(line + '\n')
+        return record
+
+
+def read_log(filename):
+    """Return list of the records of the log
+    """
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay(records, engine, repeat=1):
+    """Parse the addresses of the records again.
+
+    :param engine:  engine of address_diff (e.g. SplitterEngine)
+    :param repeat:  count of the parsings of every address (the minimal
+                    time is taken)
+    :returns:   list of dicts: the record and the current 'new_time',
+                'new_strategies', 'new_score'
+    """
+    if records:
+        # The lists are loaded and the matchers are built before
+        # the timing
+        engine.parse(records[0]['address'])
+    results = []
+    for record in records:
+        new_time = None
+        for _ in range(repeat):
+            parsed = engine.parse(record['address'])
+            elapsed = sum(parsed['times'].itervalues())
+            if new_time is None or elapsed < new_time:
+                new_time = elapsed
+        result = dict(record)
+        result.update(new_time=new_time,
+                      new_strategies=count_strategies(parsed['candidates']),
+                      new_score=parsed['score'])
+        results.append(result)
+    return results
+
+
+def format_replay(results):
+    """Return the text table of the replay results
+    """
+    lines = ['%10s %10s %8s %10s %10s %7s  %s' % (
+        'before, ms', 'after, ms', 'change', 'strat. old', 'strat. new',
+        'score', 'address')]
+    before = after = 0.0
+    for r in results:
+        before += r['time']
+        after += r['new_time']
+        score = 'same' if r['new_score'] == r['score'] else 'CHANGED'
+        lines.append(u'%10.1f %10.1f %7.2fx %10d %10d %7s  %s' % (
+            r['time'] * 1e3, r['new_time'] * 1e3,
+            r['time'] / max(r['new_time'], 1e-9), r['strategies'],
+            r['new_strategies'], score, r['address']))
+    if results:
+        lines.append('total: %.1f ms => %.1f ms (%.2fx)' % (
+            before * 1e3, after * 1e3, before / max(after, 1e-9)))
+    return u'\n'.join(lines)
+
+
+if __name__ == '__main__':
+    from address_diff import create_engine
+
+    parser = argparse.ArgumentParser(
+        description=u'Replay the log of the slow addresses')
+    parser.add_argument('log', help=u'JSONL log of SlowLog')
+    parser.add_argument('path', help=u'directory of the list files')
+    parser.add_argument('--engine', default='scanners',
+                        help=u'engine of address_diff (default: scanners)')
+    parser.add_argument('--city-list-file', default='cities.csv')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--sort', choices=['time', 'change'],
+                        help=u'sort by the current time or by the change '
+                             u'of the time')
+    args = parser.parse_args()
+
+    engine = create_engine(args.engine, args.path,
+                           dict(city_list_file=args.city_list_file))
+    results = replay(read_log(args.log), engine, args.repeat)
+    if args.sort == 'time':
+        results.sort(key=lambda r: -r['new_time'])
+    elif args.sort == 'change':
+        results.sort(key=lambda r: r['new_time'] / max(r['time'], 1e-9),
+                     reverse=True)
+    print format_replay(results).encode('utf-8')
@@ -1,14 +1,68 @@
 #!/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import sys
 
 import re
+import errno
+import heapq
+import hashlib
+import threading
 from itertools import product
-import numpy as np
 from collections import OrderedDict
 
 from address import Address
+from address_scanner import HouseScanner, find_index_positions
+from address_matchers import get_matcher_class, compile_pattern, PatternTable
+from address_memory import memory_report
+from address_beam import beam_search, BEAM_WIDTH
+from postal_index import PostalIndexTable
+
+
+# Default names of the list files in a gazetteer directory (see csv_files/)
+LIST_FILES = {
+    'country_list_file': 'countries.csv',
+    'region_list_file': 'regions.csv',
+    'subregion_list_file': 'subregions.csv',
+    'city_list_file': 'cities.csv',
+    'street_list_file': 'streets.csv',
+    'house_list_file': 'houses.csv',
+    'poi_list_file': 'poi.csv'
+}
+
+# The list files that can be absent in a gazetteer directory
+OPTIONAL_LIST_FILES = ['poi_list_file']
+
+# Categories of the address parts that are described by the list files
+# (the patterns of a category are stored in '<category>_list' attribute)
+CATEGORIES = ['country', 'region', 'subregion', 'city',
+              'street', 'house', 'poi']
+
+# Names of the strategy positions ('<part>_pos' attributes of
+# SplitingStrategy) in the order of the candidates (see _get_candidates)
+PARTS = ['index', 'country', 'region', 'subregion', 'city', 'street',
+         'house', 'poi']
+
+
+# Symbols stripped from the ends of the residual text
+RESIDUAL_STRIP = u' \t\r\n,;.'
+
+
+def _blank_spans(address, spans):
+    """Replace the spans of the address by spaces (in one pass)
+    """
+    pieces = []
+    pos = 0
+    for begin, end in sorted(spans):
+        begin = max(begin, pos)
+        if begin >= end:
+            continue
+        pieces.append(address[pos:begin])
+        pieces.append(u' ' * (end - begin))
+        pos = end
+    pieces.append(address[pos:])
+    return u''.join(pieces)
 
 
 class SplitingStrategy(object):
@@ -72,6 +126,10 @@ class SplitingStrategy(object):
         # Index => the 0-th row of the matrix
         # Country => the 1st row ...
 
+        # numpy is imported on the first use: it is not needed
+        # to load the splitter
+        import numpy as np
+
         rows = len(self.names)
         cols = len(self.address)
         m = np.zeros((rows, cols), dtype=np.byte)
@@ -154,12 +212,48 @@ class SplitingStrategy(object):
 
         return address
 
+    def get_residual(self, per_gap=False, address=None):
+        """Return the text of the address that is not used by the parts.
+
+        :param per_gap:     return the list of the gaps between the parts
+                            instead of the text: (begin, end, text)
+                            tuples, the separators (RESIDUAL_STRIP)
+                            are stripped and the empty gaps are skipped
+        :param address:     the address the positions are applied to
+                            (self.address by default, see
+                            address_batch.apply_strategy)
+
+        :returns:   the texts of the gaps joined by spaces or the list
+                    of the gaps
+        """
+        if address is None:
+            address = self.address
+        spans = sorted(pos for _, pos in self.names.itervalues() if pos)
+
+        gaps = []
+        pos = 0
+        for begin, end in spans + [(len(address), len(address))]:
+            if begin > pos:
+                text = address[pos:begin]
+                stripped = text.lstrip(RESIDUAL_STRIP)
+                start = pos + len(text) - len(stripped)
+                stripped = stripped.rstrip(RESIDUAL_STRIP)
+                if stripped:
+                    gaps.append((start, start + len(stripped), stripped))
+            pos = max(pos, end)
+
+        if per_gap:
+            return gaps
+        return u' '.join(text for _, _, text in gaps)
+
     def _get_space_penalty(self):
         """Penalty for spaces betweeen address parts.
 
         Resurns count of symbols between the first
         and the last parts of the address
         """
+        import numpy as np
+
         sum_cols = self._score_matrix.sum(axis=0)
         nonzeros = np.where(sum_cols > 0)[0]     # Only one row is used
         if len(nonzeros) == 0:
@@ -205,7 +299,14 @@ class AddressSplitter(object):
                  city_list_file,
                  street_list_file,
                  house_list_file,
-                 poi_list_file):
+                 poi_list_file=None,
+                 use_scanners=True,
+                 index_table_file=None,
+                 pattern_stats=None,
+                 matchers=None,
+                 slow_log=None,
+                 beam_width=None,
+                 result_cache=None):
         """
         :param country_list_file: file name for list of country names
         :param region_list_file:  file name for list of region names
@@ -213,88 +314,275 @@ class AddressSplitter(object):
         :param street_list_file:  file name for list of street names
         :param house_list_file:   file name for list of houses names
         :param poi_list_file:     file name for list of poi names
+                                  (optional, the list is empty if None)
+        :param use_scanners:      use the digit run scanners for houses
+                                  and indexes (see address_scanner)
+                                  instead of matching every pattern
+                                  over the whole address
+        :param index_table_file:  file name of the table of postal index
+                                  prefixes (see postal_index), if it is
+                                  given the found index restricts
+                                  region and subregion candidates
+        :param pattern_stats:     PatternStats object (see address_stats),
+                                  if it is given the hits of every
+                                  pattern are counted (the time is
+                                  counted for the categories matched by
+                                  the regex loop only, a matcher and
+                                  the house scanner try the patterns
+                                  together)
+        :param matchers:          matcher backend (see address_matchers)
+                                  for all categories or dict: category =>
+                                  backend, the categories without a
+                                  backend are matched by the regex loop
+                                  (and the house scanner)
+        :param slow_log:          SlowLog object (see address_slowlog),
+                                  the addresses that are parsed longer
+                                  than its limits are logged
+        :param beam_width:        if it is given, the best strategy is
+                                  searched approximately by the beam
+                                  search of the width (see address_beam)
+        :param result_cache:      ResultCache object (see address_cache),
+                                  the results of the addresses are kept
+                                  in it and can be saved to a snapshot
 
         The files must contain regular expressions for names. Check that
         the RE are:
             * lowercase
             * duplicates are removed
         """
-        self.country_list = \
-            {name: re.compile(r'\b' + name + r'\b', re.I | re.U)
-             for name in self._read_list_file(country_list_file)}
-        self.region_list = \
-            {name: re.compile(r'\b' + name + r'\b', re.I | re.U)
-             for name in self._read_list_file(region_list_file)}
-        self.subregion_list = \
-            {name: re.compile(r'\b' + name + r'\b', re.I | re.U)
-             for name in self._read_list_file(subregion_list_file)}
-        self.city_list = \
-            {name: re.compile(r'\b' + name + r'\b', re.I | re.U)
-             for name in self._read_list_file(city_list_file)}
-        self.street_list = \
-            {name: re.compile(r'\b' + name + r'\b', re.I | re.U)
-             for name in self._read_list_file(street_list_file)}
-        self.house_list = \
-            {name: re.compile(r'\b' + name + r'\b', re.I | re.U)
-             for name in self._read_list_file(house_list_file)}
-        self.poi_list = \
-            {name: re.compile(r'\b' + name + r'\b', re.I | re.U)
-             for name in self._read_list_file(poi_list_file)}
+        files = [country_list_file, region_list_file, subregion_list_file,
+                 city_list_file, street_list_file, house_list_file,
+                 poi_list_file]
+        for filename in files + [index_table_file]:
+            if filename and not os.path.exists(filename):
+                raise IOError(errno.ENOENT, os.strerror(errno.ENOENT),
+                              filename)
+        # The lists are read and compiled on the first use
+        self._list_files = dict(zip(CATEGORIES, files))
+        self._lists = {}
+        self._load_lock = threading.Lock()
+        self._index_table_file = index_table_file
+        self._index_table = None
+        self.pattern_stats = pattern_stats
+        self.slow_log = slow_log
+        self.beam_width = beam_width
+        self._penalties = None
+        self.result_cache = result_cache
+        # The categories which patterns are changed after loading
+        self._changed_categories = set()
+
+        if matchers is None:
+            matchers = {}
+        elif not isinstance(matchers, dict):
+            matchers = dict.fromkeys(CATEGORIES, matchers)
+        for category in matchers:
+            self._category_attr(category)
+        self._matcher_classes = {category: get_matcher_class(name)
+                                 for category, name in matchers.items()}
+        self._matchers = {}
+
         self.index = re.compile(r'\b' + '[0-9]{6}' + r'\b')
 
+        self.use_scanners = use_scanners
+        self._house_scanner = None
+
         self._address = ""   # caching variable
         self._parsed_address = None   # caching variable
         self._best_strat = None
 
+    def _get_list(self, category):
+        """Return the patterns of the category, read and compile
+        the list file if the list is not loaded
+        """
+        patterns = self._lists.get(category)
+        if patterns is None:
+            with self._load_lock:
+                patterns = self._lists.get(category)
+                if patterns is None:
+                    filename = self._list_files[category]
+                    patterns = self._compile_list(
+                        self._read_list_file(filename),
+                        self._lazy_category(category)) if filename else {}
+                    self._lists[category] = patterns
+        return patterns
+
+    def _set_list(self, category, patterns):
+        self._lists[category] = patterns
+
+    def _list_property(category):
+        return property(
+            lambda self: self._get_list(category),
+            lambda self, patterns: self._set_list(category, patterns),
+            doc=u'Patterns of %s names: name => compiled pattern '
+                u'(loaded on the first use)' % category)
+
+    country_list = _list_property('country')
+    region_list = _list_property('region')
+    subregion_list = _list_property('subregion')
+    city_list = _list_property('city')
+    street_list = _list_property('street')
+    house_list = _list_property('house')
+    poi_list = _list_property('poi')
+    del _list_property
+
+    def _get_index_table(self):
+        """Return the table of postal index prefixes (None if the table
+        is not used)
+        """
+        if self._index_table is None and self._index_table_file:
+            with self._load_lock:
+                if self._index_table is None:
+                    self._index_table = PostalIndexTable.from_file(
+                        self._index_table_file)
+        return self._index_table
+
+    def loaded_categories(self):
+        """Return list of the categories which lists are loaded
+        """
+        return [c for c in CATEGORIES if c in self._lists]
+
+    def warm_up(self):
+        """Load all lists, build the scanners and import the modules
+        that are used for parsing (for the services that prefer
+        to load everything before the first request).
+        """
+        for category in CATEGORIES:
+            self._get_list(category)
+        self._get_index_table()
+        if self.use_scanners:
+            self._get_house_scanner()
+        for category in self._matcher_classes:
+            self._get_matcher(category)
+        import numpy    # used by SplitingStrategy
+        return self
+
+    @classmethod
+    def from_directory(cls, path, **kwargs):
+        """Create splitter from a directory of list files.
+
+        :param path:    directory that contains the list files (the names
+                        are listed in LIST_FILES, e.g. csv_files/)
+        :param kwargs:  file names that override the defaults, e.g.
+                        city_list_file='cities_big.csv', and other
+                        arguments of the constructor (the relative
+                        names of *_file arguments are joined with
+                        the path)
+
+        The optional lists (OPTIONAL_LIST_FILES) are skipped if the
+        files are absent.
+        """
+        files = dict(LIST_FILES)
+        params = {}
+        for param, value in kwargs.items():
+            if param in files:
+                files[param] = value
+            elif param.endswith('_file') and value:
+                params[param] = os.path.join(path, value)
+            else:
+                params[param] = value
+        for param, name in files.items():
+            filename = os.path.join(path, name)
+            if param in OPTIONAL_LIST_FILES and not os.path.exists(filename):
+                continue
+            params[param] = filename
+
+        return cls(**params)
+
     def _get_country_pos(self, address):
         """Return list of country positions in the address
         """
-        return self._get_positions(address, self.country_list)
+        return self._get_positions(address, self.country_list, 'country')
 
     def _get_region_pos(self, address):
         """Return list of region positions in the address
         """
-        return self._get_positions(address, self.region_list)
+        return self._get_positions(address, self.region_list, 'region')
 
     def _get_subregion_pos(self, address):
         """Return list of region positions in the address
         """
-        return self._get_positions(address, self.subregion_list)
+        return self._get_positions(address, self.subregion_list, 'subregion')
 
     def _get_city_pos(self, address):
         """Return list of city positions in the address
         """
-        return self._get_positions(address, self.city_list)
+        return self._get_positions(address, self.city_list, 'city')
 
     def _get_street_pos(self, address):
         """Return list of street positions in the address
         """
-        return self._get_positions(address, self.street_list)
+        return self._get_positions(address, self.street_list, 'street')
 
     def _get_house_pos(self, address):
         """Return list of house positions in the address
         """
-        return self._get_positions(address, self.house_list)
+        if self.use_scanners and 'house' not in self._matcher_classes:
+            scanner = self._get_house_scanner()
+            if self.pattern_stats is None:
+                return scanner.scan(address)
+            found = {}
+            res = scanner.scan(address, found)
+            self._count_found('house', found)
+            return res
+        return self._get_positions(address, self.house_list, 'house')
+
+    def _get_house_scanner(self):
+        """Return scanner of the house list (it is rebuilt if the list
+        is changed)
+        """
+        scanner = self._house_scanner
+        if scanner is None or scanner.patterns is not self.house_list:
+            scanner = HouseScanner(self.house_list)
+            self._house_scanner = scanner
+        return scanner
+
+    def _get_matcher(self, category):
+        """Return matcher of the category (it is rebuilt if the list
+        is changed)
+        """
+        patterns = self._get_list(category)
+        matcher = self._matchers.get(category)
+        if matcher is None or matcher.patterns is not patterns:
+            matcher = self._matcher_classes[category](patterns)
+            self._matchers[category] = matcher
+        return matcher
 
     def _get_poi_pos(self, address):
         """Return list of house positions in the address
         """
-        return self._get_positions(address, self.poi_list)
+        return self._get_positions(address, self.poi_list, 'poi')
 
     def _get_index_pos(self, address):
         """Return list of index positions in the address
         """
+        if self.use_scanners:
+            return find_index_positions(address)
         pos = {address[match.start(): match.end()]: [match.span()]
                for match in re.finditer(self.index, address)}
         return pos
 
-    def _get_positions(self, address, patterns):
+    def _get_positions(self, address, patterns, category=None):
         """Return list of matching positions of patterns in string
 
         :param address:     Address string
         :param patterns:    List of patterns
+        :param category:    category of the patterns, the matcher of
+                            the category is used if it is set, the
+                            statistics of the patterns are counted if
+                            it is given and the splitter has
+                            pattern_stats
         :return:
         """
+        if category in self._matcher_classes:
+            if self.pattern_stats is None:
+                return self._get_matcher(category).find_all(address)
+            found = {}
+            res = self._get_matcher(category).find_all(address, found)
+            self._count_found(category, found)
+            return res
+        if category and self.pattern_stats is not None:
+            return self._get_positions_counted(address, patterns, category)
+
         res = dict()
         address = address.lower()
         for name in patterns:
@@ -309,93 +597,408 @@ class AddressSplitter(object):
 
         return res
 
+    def _get_positions_counted(self, address, patterns, category):
+        """The same as _get_positions, the hits and the time of every
+        pattern are added to pattern_stats
+        """
+        timer = self.pattern_stats.timer
+        res = dict()
+        counted = dict()
+        address = address.lower()
+        for name in patterns:
+            start = timer()
+            spans = [match.span()
+                     for match in re.finditer(patterns[name], address)]
+            counted[name] = (len(spans), timer() - start)
+            for begin, end in spans:
+                try:
+                    res[address[begin:end]].append((begin, end))
+                except KeyError:
+                    res[address[begin:end]] = [(begin, end)]
+
+        self.pattern_stats.update(category, counted)
+        return res
+
+    def _count_found(self, category, found):
+        """Add the hits of the patterns tried by a matcher or the house
+        scanner to pattern_stats (the time of a single pattern is
+        not known)
+
+        :param found:   dict: name => list of positions
+        """
+        self.pattern_stats.update(category, {
+            name: (len(spans), 0.0) for name, spans in found.iteritems()})
+
     def _read_list_file(self, filename):
         with open(filename) as f:
             names = [line.decode('utf-8').rstrip() for line in f]
 
         return names
 
-    def _get_strategies(self, address):
-        """Return list of splitting strategies:
-        return list of all possible divisions of the address
+    @staticmethod
+    def _compile(name):
+        """Compile a pattern of the list file (the compiled patterns are
+        shared by the splitters of the process, see compile_pattern)
+        """
+        return compile_pattern(name)
+
+    def _compile_list(self, names, lazy=False):
+        """Return dict of compiled patterns: name => compiled pattern
+
+        :param lazy:    return PatternTable: the patterns are compiled
+                        on the first use
+        """
+        if lazy:
+            return PatternTable(names)
+        return {name: self._compile(name) for name in names}
+
+    def _lazy_category(self, category):
+        """Return True if the patterns of the category are compiled on the
+        first use: the matchers and the house scanner use the compiled
+        patterns of a part of the list only
+        """
+        return category in self._matcher_classes or \
+            (category == 'house' and self.use_scanners)
+
+    @staticmethod
+    def _category_attr(category):
+        if category not in CATEGORIES:
+            raise ValueError(u'Unknown category "%s"' % category)
+        return category + '_list'
+
+    def _update_category(self, category, added=(), removed=()):
+        """Change patterns of the category.
+
+        Only the added patterns are compiled. The new dict of patterns
+        replaces the old one by a single assignment, so the concurrent
+        parsing uses either the old or the new patterns.
+        Only the cached results that can be changed by the added or
+        removed patterns are dropped.
+
+        :returns:   count of added and removed patterns
+        """
+        attr = self._category_attr(category)
+        current = getattr(self, attr)
+        removed = set(removed)
+        for name in removed:
+            if name not in current:
+                raise KeyError(name)
+
+        changed = [current[name] for name in removed]
+        if isinstance(current, PatternTable):
+            patterns = current.copy()
+            for name in removed:
+                del patterns[name]
+        else:
+            patterns = {name: compiled
+                        for name, compiled in current.iteritems()
+                        if name not in removed}
+        for name in added:
+            if name not in patterns:
+                patterns[name] = self._compile(name)
+                changed.append(patterns[name])
+
+        setattr(self, attr, patterns)
+        self._changed_categories.add(category)
+        self._invalidate_cache(changed)
+
+        return len(changed)
+
+    def _invalidate_cache(self, patterns):
+        """Drop the cached results if one of the patterns matches
+        the cached address
+        """
+        address = self._address.lower()
+        if any(p.search(address) for p in patterns):
+            self._address = ""
+            self._parsed_address = None
+            self._best_strat = None
+        if self.result_cache is not None:
+            self.result_cache.invalidate(patterns)
+
+    def gazetteer_hash(self):
+        """Return hex digest of the gazetteers: the contents of the list
+        files (the patterns of the categories changed after loading),
+        of the postal index table, and the search options that change
+        the results
+        """
+        digest = hashlib.sha1()
+        for category in CATEGORIES:
+            digest.update('\0%s\0' % category)
+            if category in self._changed_categories:
+                for name in sorted(self._get_list(category)):
+                    digest.update(name.encode('utf-8') + '\n')
+            elif self._list_files[category]:
+                with open(self._list_files[category], 'rb') as f:
+                    digest.update(f.read())
+        digest.update('\0index\0')
+        if self._index_table_file:
+            with open(self._index_table_file, 'rb') as f:
+                digest.update(f.read())
+        digest.update('\0beam_width=%r' % self.beam_width)
+        return digest.hexdigest()
+
+    def dump_cache(self, filename, n=None):
+        """Write the snapshot of the n most frequently requested addresses
+        of result_cache (see address_cache.ResultCache.dump)
+
+        :returns:   count of the addresses of the snapshot
+        """
+        return self.result_cache.dump(filename, self.gazetteer_hash(), n)
+
+    def preload_cache(self, filename, background=False):
+        """Load the snapshot to result_cache, the snapshot of other
+        gazetteers is skipped
+
+        :param background:  load the snapshot in a daemon thread
+                            (the addresses are parsed meanwhile)
+        :returns:   count of the loaded addresses or the started thread
+        """
+        def load():
+            return self.result_cache.load(filename, self.gazetteer_hash())
+
+        if not background:
+            return load()
+        thread = threading.Thread(target=load, name='preload_cache')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def add_patterns(self, category, names):
+        """Add patterns to the category.
+
+        :param category:    category name (see CATEGORIES)
+        :param names:       list of patterns (regular expressions)
+        :returns:           count of the new patterns
+        """
+        return self._update_category(category, added=names)
+
+    def remove_patterns(self, category, names):
+        """Remove patterns from the category.
+
+        :param category:    category name (see CATEGORIES)
+        :param names:       list of patterns (regular expressions)
+        :raises KeyError:   if a pattern is absent in the category
+        """
+        self._update_category(category, removed=names)
+
+    def replace_pattern(self, category, old_name, new_name):
+        """Replace a pattern of the category by another pattern.
         """
+        self._update_category(category, added=[new_name], removed=[old_name])
+
+    def reload_category(self, category, filename):
+        """Replace patterns of the category by the patterns of the file.
+        The patterns that are not changed are not recompiled.
+
+        :param category:    category name (see CATEGORIES)
+        :param filename:    list file of the category
+        :returns:           count of added and removed patterns
+        """
+        names = set(self._read_list_file(filename))
+        current = getattr(self, self._category_attr(category))
+        return self._update_category(
+            category,
+            added=[name for name in names if name not in current],
+            removed=[name for name in current if name not in names])
+
+    def _get_candidates(self, address):
+        """Return found positions of all address parts.
+
+        The result is the list of dicts (found text => list of positions)
+        in the order: index, country, region, subregion, city, street,
+        house, poi. If the table of postal indexes is used, the regions
+        and subregions that don't belong to the found index are removed.
+        """
+        candidates = [self._get_index_pos(address),
+                      self._get_country_pos(address),
+                      self._get_region_pos(address),
+                      self._get_subregion_pos(address),
+                      self._get_city_pos(address),
+                      self._get_street_pos(address),
+                      self._get_house_pos(address),
+                      self._get_poi_pos(address)]
+
+        table = self._get_index_table()
+        if table is not None and candidates[0]:
+            candidates[2], candidates[3] = table.restrict(
+                candidates[0], candidates[2], candidates[3])
+
+        return candidates
+
+    def _iter_strategies(self, address, candidates=None):
+        """Generate splitting strategies: all possible divisions
+        of the address.
+
+        :param candidates:  found positions of the address parts
+                            (see _get_candidates), they are searched
+                            if None
+        """
+        if candidates is None:
+            candidates = self._get_candidates(address)
 
         # Find cross product of all possible positions of address parts
         # (add one 'None' position to all possible position: it allows
         # to elliminate dublicates of adress paerts)
+        # (empty matches are the same as 'None' position)
+        parts = [[spans for text, spans in found.iteritems() if text] +
+                 [[None]]
+                 for found in candidates]
+
+        for pos in product(*parts):
+            for p in product(*pos):
+                yield SplitingStrategy(
+                    address=address,
+                    index_pos=p[0],
+                    country_pos=p[1],
+                    region_pos=p[2],
+                    subregion_pos=p[3],
+                    city_pos=p[4],
+                    street_pos=p[5],
+                    house_pos=p[6],
+                    poi_pos=p[7])
 
-        cntrs = self._get_country_pos(address)
-        cntrs['None_position'] = [None]
-
-        regns = self._get_region_pos(address)
-        regns['None_position'] = [None]
-
-        subregs = self._get_subregion_pos(address)
-        subregs['None_position'] = [None]
-
-        cities = self._get_city_pos(address)
-        cities['None_position'] = [None]
-
-        strts = self._get_street_pos(address)
-        strts['None_position'] = [None]
-
-        houses = self._get_house_pos(address)
-        houses['None_position'] = [None]
-
-        indxs = self._get_index_pos(address)
-        indxs['None_position'] = [None]
-
-        poi = self._get_poi_pos(address)
-        poi['None_position'] = [None]
-
-        parts = [p for p in [indxs, cntrs, regns,
-                             subregs, cities, strts, houses, poi]]
-
-        positions = [(indxs[s[0]] if s[0] else [None],
-                      cntrs[s[1]] if s[1] else [None],
-                      regns[s[2]] if s[2] else [None],
-                      subregs[s[3]] if s[3] else [None],
-                      cities[s[4]] if s[4] else [None],
-                      strts[s[5]] if s[5] else [None],
-                      houses[s[6]] if s[6] else [None],
-                      poi[s[7]] if s[7] else [None])
-                     for s in product(*tuple(parts))]
-
-        strategies = []
-        for pos in positions:
-            s = [SplitingStrategy(
-                address=address,
-                index_pos=p[0],
-                country_pos=p[1],
-                region_pos=p[2],
-                subregion_pos=p[3],
-                city_pos=p[4],
-                street_pos=p[5],
-                house_pos=p[6],
-                poi_pos=p[7])
-                for p in product(*pos)
-            ]
-            strategies += s
-
-        return strategies
+    def _get_strategies(self, address):
+        """Return list of splitting strategies:
+        return list of all possible divisions of the address
+        """
+        return list(self._iter_strategies(address))
+
+    def _remember(self, address, best):
+        """Store the best strategy of the address in the cache
+        """
+        if self._address != address:
+            self._parsed_address = None
+        self._address = address
+        self._best_strat = best
 
     def get_best_strategy(self, address):
         """Return startegy with minimum weight
+        (the first one if there are several strategies with the same
+        weight)
         """
 
         if self._address == address and self._best_strat:
             return self._best_strat
 
-        strategies = self._get_strategies(address)
-        w = [s.get_score() for s in strategies]
-        best_ind = w.index(min(w))
-        best = strategies[best_ind]
+        cache = self.result_cache
+        if cache is not None:
+            positions = cache.get(address)
+            if positions is not None:
+                best = SplitingStrategy(address, *positions)
+                self._remember(address, best)
+                return best
+
+        if self.beam_width is not None:
+            best, _ = self._beam_search(address)
+        elif self.slow_log is not None:
+            best = self._get_best_strategy_logged(address)
+        else:
+            best = None
+            best_score = None
+            for s in self._iter_strategies(address):
+                score = s.get_score()
+                if best is None or score < best_score:
+                    best, best_score = s, score
+
+        self._remember(address, best)
+        if cache is not None:
+            # The positions in the order of the rows
+            cache.put(address, [pos for _, pos in
+                                sorted(best.names.itervalues())])
 
-        self._address = address
-        self._best_strat = best
+        return best
+
+    def _get_best_strategy_logged(self, address):
+        """The same as get_best_strategy, the slow address is appended
+        to slow_log
+        """
+        timer = self.slow_log.timer
+        start = timer()
+        candidates = self._get_candidates(address)
+        matched = timer()
+
+        best = None
+        best_score = None
+        count = 0
+        for s in self._iter_strategies(address, candidates):
+            count += 1
+            score = s.get_score()
+            if best is None or score < best_score:
+                best, best_score = s, score
+
+        self.slow_log.check(address, candidates, count, best_score,
+                            matched - start, timer() - matched)
+        self._remember(address, best)
 
         return best
 
+    def strategy_penalties(self):
+        """Return (overlap penalty, blank penalty, space ratio, list of
+        the absence penalties of the parts) of the strategies
+        (see address_beam.spans_score)
+        """
+        if self._penalties is None:
+            s = SplitingStrategy(u'', *[None] * 8)
+            absences = [0] * 8
+            for row, penalty in s.absences_penalty.itervalues():
+                absences[row] = penalty
+            self._penalties = (s.overlap_penalty, s.blank_penalty,
+                               s.space_ratio, absences)
+        return self._penalties
+
+    def _beam_search(self, address, candidates=None, width=None):
+        """Return (strategy, score) found by the beam search
+        (see address_beam)
+
+        :param width:   width of the beam, beam_width (or the default
+                        width) if None
+        """
+        if candidates is None:
+            candidates = self._get_candidates(address)
+        width = width or self.beam_width or BEAM_WIDTH
+        p = beam_search(candidates, self.strategy_penalties(), width)
+        best = SplitingStrategy(address, *p)
+        return best, best.get_score()
+
+    def get_top_strategies(self, address, k):
+        """Return k strategies with minimum weights.
+
+        Only k strategies are kept during the search (bounded heap),
+        the candidate list is not sorted. All strategies are searched
+        (beam_width is not used) and the result is not cached, so it
+        doesn't change the result of get_best_strategy.
+
+        :param address:     Address string
+        :param k:           count of the returned strategies
+
+        :returns:   list of (strategy, score, margin) tuples ordered by
+                    score, margin is the difference between the score
+                    and the score of the best strategy. The first item
+                    is the strategy returned by get_best_strategy of
+                    the splitter without beam_width (the beam search
+                    can miss it).
+        :rtype:     list
+        """
+        if k < 1:
+            raise ValueError(u'k must be positive, got %s' % k)
+
+        # Max-heap of the kept strategies: the worst kept strategy is
+        # on the top. The sequence number makes the earlier strategy
+        # better among the strategies with the same score.
+        heap = []
+        for seq, s in enumerate(self._iter_strategies(address)):
+            score = s.get_score()
+            if len(heap) < k:
+                heapq.heappush(heap, (-score, -seq, s))
+            elif score < -heap[0][0]:
+                heapq.heapreplace(heap, (-score, -seq, s))
+
+        ranked = sorted((-score, -seq, s) for score, seq, s in heap)
+        best_score = ranked[0][0]
+
+        return [(s, score, score - best_score) for score, _, s in ranked]
+
     def get_parsed_address(self, address):
         """Parse address string and return an Address object.
 
@@ -430,27 +1033,30 @@ class AddressSplitter(object):
             return address
 
     def _drop_parts(self, address):
-        addr = address
-        s = self.get_best_strategy(addr)
-        addr = self.drop_index(addr)
-        if s.country_pos:
-            addr = self._drop_part(addr, s.country_pos)
-        if s.region_pos:
-            addr = self._drop_part(addr, s.region_pos)
-        if s.subregion_pos:
-            addr = self._drop_part(addr, s.subregion_pos)
-        if s.city_pos:
-            addr = self._drop_part(addr, s.city_pos)
-        if s.street_pos:
-            addr = self._drop_part(addr, s.street_pos)
-        if s.house_pos:
-            addr = self._drop_part(addr, s.house_pos)
-
-        m = re.search('^[, ]+', addr)
-        if m:
-            addr = addr[: m.start()] + addr[m.end():]
-
-        return addr
+        """Replace the parts (except poi) by spaces and strip the leading
+        separators (see get_residual)
+        """
+        s = self.get_best_strategy(address)
+        spans = [pos for pos in (s.index_pos, s.country_pos, s.region_pos,
+                                 s.subregion_pos, s.city_pos, s.street_pos,
+                                 s.house_pos) if pos]
+        return _blank_spans(address, spans).lstrip(u', ')
+
+    def memory_report(self):
+        """Return the estimated memory of the loaded lists, the matchers,
+        the scanners and the cache (see address_memory.memory_report)
+        """
+        return memory_report(self)
+
+    def get_residual(self, address, per_gap=False):
+        """Return the text of the address that is not used by the parts
+        of the best strategy (see SplitingStrategy.get_residual).
+
+        :param address:     Address string
+        :param per_gap:     return the list of (begin, end, text) of the
+                            gaps between the parts
+        """
+        return self.get_best_strategy(address).get_residual(per_gap)
 
 
 if __name__ == '__main__':
@@ -459,24 +1065,34 @@ if __name__ == '__main__':
     '''
 
     from progressbar import ProgressBar, Bar, Counter, ETA
+    from address_batch import BatchStats, parse_batches, format_result
+    from address_input import LineIndex
 
     datafile = sys.argv[1]
-    delimiter = ","
+    delimiter = u","
     if len(sys.argv) >= 3:
-        delimiter = sys.argv[2]
+        delimiter = sys.argv[2].decode('utf-8')
+    batch_size = 1000
+    if len(sys.argv) >= 4:
+        batch_size = int(sys.argv[3])
+    # Number of the first line to parse (from 0), e.g. to restart the parsing
+    first_line = 0
+    if len(sys.argv) >= 5:
+        first_line = int(sys.argv[4])
+    # Count of the worker processes, the lines are parsed in this process
+    # if 0 (see address_schedule: the most expensive addresses first)
+    workers = 0
+    if len(sys.argv) >= 6:
+        workers = int(sys.argv[5])
 
     path = 'csv_files/'
-    splitter = AddressSplitter(
-        country_list_file=path + 'countries.csv',
-        region_list_file=path + 'regions.csv',
-        subregion_list_file=path + 'subregions.csv',
-        # city_list_file=path + 'cities_big.csv',
-        city_list_file=path + 'cities.csv',
-        street_list_file=path + 'streets.csv',
-        house_list_file=path + 'houses.csv'
+    options = dict(
+        # city_list_file='cities_big.csv',
+        city_list_file='cities.csv'
     )
 
-    num_lines = sum(1 for line in open(datafile))
+    index = LineIndex(datafile)
+    num_lines = max(len(index) - first_line, 0)
     pbar = ProgressBar(
         widgets=[
             Bar('=', '[', ']'), ' ', Counter(),
@@ -484,32 +1100,30 @@ if __name__ == '__main__':
     ).start()
     pbar.maxval = num_lines
 
-    with open(datafile) as data:
-        for address in data:
-            pbar.update(pbar.currval + 1)
-            line_text = address.decode('utf-8')
-            address = address.decode('utf-8')
-            parced_address = splitter.get_parsed_address(address)
-            if parced_address.index is None:
-                parced_address.index = ""
-            if parced_address.country is None:
-                parced_address.country = ""
-            if parced_address.region is None:
-                parced_address.region = ""
-            if parced_address.subregion is None:
-                parced_address.subregion = ""
-            if parced_address.settlement is None:
-                parced_address.settlement = ""
-            if parced_address.street is None:
-                parced_address.street = ""
-            if parced_address.house is None:
-                parced_address.house = ""
-            result = delimiter.join([line_text, parced_address.index,
-                                     parced_address.country,
-                                     parced_address.region,
-                                     parced_address.subregion,
-                                     parced_address.settlement,
-                                     parced_address.street,
-                                     parced_address.house])
-            print result.encode('utf-8')
-    pbar.finish()
+    if workers:
+        from address_schedule import ScheduleStats, parse_file_scheduled
+
+        schedule = ScheduleStats()
+        windows = parse_file_scheduled(datafile, path, options, workers,
+                                       first=first_line, stats=schedule)
+        for _, batch, parsed in windows:
+            for line_text, parced_address in zip(batch, parsed):
+                result = format_result(line_text, parced_address, delimiter)
+                print result.encode('utf-8')
+            pbar.update(pbar.currval + len(batch))
+        pbar.finish()
+        sys.stderr.write('total: %s\n' % schedule)
+    else:
+        splitter = AddressSplitter.from_directory(path, **options)
+        total = BatchStats()
+        lines = index.iter_lines(first_line)
+        batches = parse_batches(splitter, lines, batch_size)
+        for num, (batch, parsed, stats) in enumerate(batches):
+            for line_text, parced_address in zip(batch, parsed):
+                result = format_result(line_text, parced_address, delimiter)
+                print result.encode('utf-8')
+            pbar.update(pbar.currval + len(batch))
+            total += stats
+            sys.stderr.write('\nbatch %d: %s\n' % (num, stats))
+        pbar.finish()
+        sys.stderr.write('total: %s\n' % total)
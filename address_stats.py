@@ -0,0 +1,139 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Hit statistics of the gazetteer patterns.
+
+The splitter with a PatternStats object (see the pattern_stats argument
+of AddressSplitter) counts for every pattern of a category the number
+of addresses it was tried on, the number of matches and the time spent
+in the pattern. The categories with a matcher (see address_matchers)
+and the house scanner are counted through them: a pattern is tried
+only if its literals are found in the address, and the time of a single
+pattern is not measured. The statistics can be saved to a JSON file and
+merged with the statistics of other processes, the patterns that never
+matched are listed by cold_patterns() and the report shows the patterns
+that dominate the matching time.
+
+The order of the patterns doesn't change the matching time (every
+pattern is tried on an address and the results are joined in a dict),
+so the statistics don't reorder the lists: the cold expensive patterns
+are the candidates to be removed from the list files or rewritten.
+
+Usage:
+    python address_stats.py stats.json [top]
+"""
+
+import sys
+import json
+import threading
+from timeit import default_timer
+
+
+class PatternStats(object):
+    """Counters of the patterns: category => name => [calls, hits, time]
+    """
+    CALLS, HITS, TIME = range(3)
+
+    def __init__(self, counters=None):
+        """
+        :param counters:    dict: category => name => [calls, hits, time]
+                            (the format of the saved file)
+        """
+        self._counters = {}
+        self._lock = threading.Lock()
+        for category, patterns in (counters or {}).iteritems():
+            self._counters[category] = {
+                name: list(values) for name, values in patterns.iteritems()}
+
+    timer = staticmethod(default_timer)
+
+    @classmethod
+    def load(cls, filename):
+        """Load the statistics saved by save()
+        """
+        with open(filename) as f:
+            return cls(json.load(f))
+
+    def save(self, filename):
+        with self._lock:
+            with open(filename, 'w') as f:
+                json.dump(self._counters, f, indent=1, sort_keys=True)
+
+    def categories(self):
+        return sorted(self._counters)
+
+    def get(self, category, name):
+        """Return (calls, hits, time) of the pattern
+        """
+        return tuple(self._counters.get(category, {}).get(name, (0, 0, 0.0)))
+
+    def update(self, category, found):
+        """Add the counters of one address.
+
+        :param found:   dict: name => (hits, time) for every pattern
+                        tried on the address
+        """
+        with self._lock:
+            counters = self._counters.setdefault(category, {})
+            for name, (hits, seconds) in found.iteritems():
+                values = counters.get(name)
+                if values is None:
+                    counters[name] = [1, hits, seconds]
+                else:
+                    values[self.CALLS] += 1
+                    values[self.HITS] += hits
+                    values[self.TIME] += seconds
+
+    def merge(self, other):
+        """Add the counters of other PatternStats (e.g. collected
+        by another process)
+        """
+        for category, patterns in other._counters.iteritems():
+            with self._lock:
+                counters = self._counters.setdefault(category, {})
+                for name, values in patterns.iteritems():
+                    mine = counters.setdefault(name, [0, 0, 0.0])
+                    for i in range(3):
+                        mine[i] += values[i]
+
+    def cold_patterns(self, category, min_calls=1):
+        """Return list of (name, calls, time) of the patterns that never
+        matched, the most expensive first.
+
+        :param min_calls:   skip the patterns tried less times
+        """
+        cold = [(name, calls, seconds) for name, (calls, hits, seconds)
+                in self._counters.get(category, {}).iteritems()
+                if not hits and calls >= min_calls]
+        return sorted(cold, key=lambda row: -row[2])
+
+    def report(self, top=10):
+        """Return text report: for every category the total time and the
+        patterns that take the most time
+        """
+        lines = []
+        for category in self.categories():
+            counters = self._counters[category]
+            total = sum(v[self.TIME] for v in counters.values())
+            cold = self.cold_patterns(category)
+            lines.append(
+                u'%s: %d patterns, %d never matched, %.3f s' %
+                (category, len(counters), len(cold), total))
+            rows = sorted(counters.iteritems(),
+                          key=lambda item: -item[1][self.TIME])[:top]
+            for name, (calls, hits, seconds) in rows:
+                share = seconds / total * 100 if total else 0.0
+                lines.append(u'  %6.2f%% %10.6f s %8d calls %8d hits  %s' %
+                             (share, seconds, calls, hits, name))
+
+        return u'\n'.join(lines)
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print PatternStats.load(sys.argv[1]).report(top).encode('utf-8')
@@ -0,0 +1,333 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Suggestions for the address part being typed.
+
+The index is built from the literal stems of the patterns of the
+gazetteer lists (regions, subregions, cities, streets): the literals of
+the patterns with a short finite language (see
+address_matchers.expand_pattern), the canonical text of the other
+patterns (the first alternative of every branch, the minimum count of
+every repeat, e.g. '1 *- *е +засеймье' => '1-е засеймье').
+
+The stems of every category (and scope) are stored in a compressed
+prefix trie, every node keeps the best TOP_N stems of its subtree
+(by the frequency, then the shorter stem first), so the suggestions for
+a prefix are found by the walk along the prefix only.
+
+The stems of a list can be bound to a scope (e.g. the streets of
+mos_street.csv are the streets of Moscow), such stems are suggested
+only if the scope is not given or it contains the scope of the list
+(e.g. the parsed settlement 'г. Москва').
+
+The index is serialized by dumps/save (cPickle) together with the
+other precompiled gazetteer data (see address_matchers).
+
+Usage (suggestions for the prefixes):
+    python address_suggest.py path prefix [prefix ...]
+"""
+
+import os
+
+import re
+import argparse
+import cPickle
+import sre_parse
+import sre_constants as sre
+
+from address_splitter import LIST_FILES
+from address_matchers import expand_pattern
+from address_generator import read_patterns
+
+# Count of the suggestions kept in every node of the trie
+TOP_N = 10
+
+# Min length of the suggested stems
+MIN_STEM = 2
+
+# Categories of the suggestions: category => list file parameter
+SUGGEST_FILES = [
+    ('region', 'region_list_file'),
+    ('subregion', 'subregion_list_file'),
+    ('city', 'city_list_file'),
+    ('street', 'street_list_file')
+]
+
+# The lists bound to a scope: (category, file name, scope)
+SCOPED_FILES = [
+    ('street', 'mos_street.csv', u'москва')
+]
+
+
+def _canonical_items(items):
+    """Return the canonical text of the items, None if the items
+    contain a symbol class or any symbol
+    """
+    text = u''
+    for op, av in items:
+        if op == sre.LITERAL:
+            text += unichr(av).lower()
+        elif op == sre.IN:
+            first = av[0]
+            if first[0] == sre.LITERAL:
+                text += unichr(first[1]).lower()
+            elif first[0] == sre.RANGE:
+                text += unichr(first[1][0]).lower()
+            else:
+                return None
+        elif op == sre.SUBPATTERN:
+            part = _canonical_items(av[-1])
+            if part is None:
+                return None
+            text += part
+        elif op == sre.BRANCH:
+            part = _canonical_items(av[1][0])
+            if part is None:
+                return None
+            text += part
+        elif op in (sre.MAX_REPEAT, sre.MIN_REPEAT):
+            low, high, inner = av
+            if low == 0:
+                continue
+            part = _canonical_items(inner)
+            if part is None:
+                return None
+            text += part * low
+        elif op != sre.AT:
+            return None
+    return text
+
+
+def pattern_stems(name):
+    """Return list of the stems of the pattern (lowercased)
+    """
+    stems = expand_pattern(name)
+    if stems is not None:
+        return stems
+    try:
+        text = _canonical_items(list(sre_parse.parse(name, re.I | re.U)))
+    except (sre.error, OverflowError):
+        return []
+    text = text.strip(u' -.,') if text else None
+    return [text] if text else []
+
+
+def _stems(name):
+    return [text for text in pattern_stems(name) if len(text) >= MIN_STEM]
+
+
+def _rank(entry):
+    """Sort key of the entries: (text, category, name, frequency)
+    """
+    return -entry[3], len(entry[0]), entry[0]
+
+
+def _best(entries, top_n):
+    """Return top_n best entries, the stems of the same pattern and the
+    same stems of other patterns are skipped
+    """
+    result = []
+    names = set()
+    texts = set()
+    for entry in sorted(entries, key=_rank):
+        if entry[2] in names or entry[0] in texts:
+            continue
+        names.add(entry[2])
+        texts.add(entry[0])
+        result.append(entry)
+        if len(result) == top_n:
+            break
+    return result
+
+
+def _compress(node, top_n):
+    """Return the compressed node of the plain trie node: [dict first
+    symbol => (label, node), list of the best entries of the subtree]
+    """
+    children = {}
+    entries = list(node.get(None, ()))
+    for char, child in node.iteritems():
+        if char is None:
+            continue
+        label = char
+        # Join the chain of the nodes with one child and without stems
+        while len(child) == 1 and None not in child:
+            next_char, child = child.items()[0]
+            label += next_char
+        compressed = _compress(child, top_n)
+        children[char] = (label, compressed)
+        entries.extend(compressed[1])
+    return [children, _best(entries, top_n)]
+
+
+class SuggestIndex(object):
+    """Prefix tries of the stems of the categories (see the module
+    description)
+    """
+    def __init__(self, top_n=TOP_N):
+        """
+        :param top_n:   max count of the suggestions
+        """
+        self.top_n = top_n
+        # (category, scope) => dict stem => list of entries
+        self._stems = {}
+        # (category, scope) => compressed trie
+        self._tries = {}
+
+    def add(self, category, names, frequencies=None, scope=None):
+        """Add the stems of the patterns.
+
+        :param category:    category of the patterns
+        :param names:       list of the patterns
+        :param frequencies: dict name => frequency (e.g. the hits of
+                            pattern_stats), the frequency is 0 for the
+                            absent patterns
+        :param scope:       scope of the patterns (lowercased text)
+        """
+        stems = self._stems.setdefault((category, scope), {})
+        frequencies = frequencies or {}
+        for name in names:
+            frequency = frequencies.get(name, 0)
+            for text in _stems(name):
+                stems.setdefault(text, []).append(
+                    (text, category, name, frequency))
+        self._tries.pop((category, scope), None)
+        return self
+
+    def build(self):
+        """Build the tries of the added stems
+        """
+        for key, stems in self._stems.iteritems():
+            if key in self._tries:
+                continue
+            root = {}
+            for text, entries in stems.iteritems():
+                node = root
+                for char in text:
+                    node = node.setdefault(char, {})
+                node[None] = entries
+            self._tries[key] = _compress(root, self.top_n)
+        return self
+
+    @classmethod
+    def from_directory(cls, path, pattern_stats=None, top_n=TOP_N,
+                       scoped_files=SCOPED_FILES, **files):
+        """Create the index of the list files of a gazetteer directory.
+
+        :param pattern_stats:   PatternStats, the hits of the patterns
+                                are the frequencies
+        :param scoped_files:    list of (category, file name, scope),
+                                the absent files are skipped
+        :param files:           file names that override the defaults
+                                (see AddressSplitter.from_directory)
+        """
+        index = cls(top_n)
+        lists = [(category, files.get(param, LIST_FILES[param]), None)
+                 for category, param in SUGGEST_FILES]
+        for category, filename, scope in lists + list(scoped_files):
+            filename = os.path.join(path, filename)
+            if scope is not None and not os.path.exists(filename):
+                continue
+            names = read_patterns(filename)
+            frequencies = None
+            if pattern_stats is not None:
+                frequencies = {name: pattern_stats.get(category, name)[1]
+                               for name in names}
+            index.add(category, names, frequencies, scope)
+        return index.build()
+
+    @property
+    def categories(self):
+        return sorted(set(category for category, _ in self._stems))
+
+    def _find(self, root, prefix):
+        """Return the best entries of the node of the prefix
+        """
+        node = root
+        pos = 0
+        while pos < len(prefix):
+            child = node[0].get(prefix[pos])
+            if child is None:
+                return []
+            label, node = child
+            rest = prefix[pos:pos + len(label)]
+            if not label.startswith(rest):
+                return []
+            pos += len(label)
+        return node[1]
+
+    def suggest(self, prefix, category=None, scope=None, n=None):
+        """Return list of (stem, category, pattern) of the best stems that
+        begin with the prefix.
+
+        :param prefix:      typed text of the part
+        :param category:    category of the part or list of categories,
+                            all categories if None
+        :param scope:       text of the parsed region or settlement,
+                            the stems of the other scopes are skipped
+        :param n:           max count of the suggestions (top_n if None
+                            or greater)
+        """
+        self.build()
+        if isinstance(category, basestring):
+            category = [category]
+        prefix = prefix.lower().lstrip()
+        scope = scope.lower() if scope else None
+        entries = []
+        for (trie_category, trie_scope), root in self._tries.iteritems():
+            if category is not None and trie_category not in category:
+                continue
+            if scope is not None and trie_scope is not None and \
+                    trie_scope not in scope:
+                continue
+            entries.extend(self._find(root, prefix))
+        if n is None or n > self.top_n:
+            n = self.top_n
+        return [(text, trie_category, name)
+                for text, trie_category, name, _ in _best(entries, n)]
+
+    def dumps(self):
+        """Return the index serialized into a string
+        """
+        self.build()
+        return cPickle.dumps((self.top_n, self._stems, self._tries), 2)
+
+    @classmethod
+    def loads(cls, data):
+        index = cls.__new__(cls)
+        index.top_n, index._stems, index._tries = cPickle.loads(data)
+        return index
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(self.dumps())
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as f:
+            return cls.loads(f.read())
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description=u'Suggestions for the prefixes of the address parts')
+    parser.add_argument('path', help=u'directory of the list files')
+    parser.add_argument('prefixes', nargs='*')
+    parser.add_argument('--city-list-file', default=LIST_FILES[
+        'city_list_file'])
+    parser.add_argument('--category', action='append')
+    parser.add_argument('--scope')
+    parser.add_argument('--save', help=u'save the index into the file')
+    args = parser.parse_args()
+
+    index = SuggestIndex.from_directory(
+        args.path, city_list_file=args.city_list_file)
+    if args.save:
+        index.save(args.save)
+    scope = args.scope.decode('utf-8') if args.scope else None
+    for prefix in args.prefixes:
+        prefix = prefix.decode('utf-8')
+        print prefix.encode('utf-8')
+        for text, category, _ in index.suggest(prefix, args.category, scope):
+            print ('    %s (%s)' % (text, category)).encode('utf-8')
@@ -0,0 +1 @@
+__author__ = 'Dmitry Kolesov <kolesov.dm@gmail.com>'
@@ -0,0 +1,62 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the beam search (address_beam.py): the agreement with
+the full search and the throughput for several widths of the beam.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_beam [addresses.txt]
+
+The built-in sample of addresses is used if the file is not given.
+The candidates are found once, only the search of the strategy is timed.
+"""
+
+import sys
+
+import timeit
+
+from address_splitter import AddressSplitter
+from address_beam import BEAM_WIDTHS
+from address_diff import SplitterEngine, BeamEngine, strategy_spans
+
+from benchmarks.bench_scanner import PATH, SAMPLE
+
+
+def run(addresses, widths=BEAM_WIDTHS):
+    """Return list of (name, agreement with the full search, addresses
+    per second of the search)
+    """
+    splitter = AddressSplitter.from_directory(PATH)
+    candidates = [splitter._get_candidates(a) for a in addresses]
+    timer = timeit.default_timer
+
+    engines = [('full', SplitterEngine(splitter))] + \
+        [('beam %d' % width, BeamEngine(splitter, width))
+         for width in widths]
+    results = []
+    exact = None
+    for name, engine in engines:
+        start = timer()
+        found = [engine.search(a, c)
+                 for a, c in zip(addresses, candidates)]
+        elapsed = timer() - start
+        spans = [strategy_spans(strategy) for strategy, _ in found]
+        if exact is None:
+            exact = spans
+        agreement = sum(1 for s, e in zip(spans, exact) if s == e)
+        results.append((name, float(agreement) / len(addresses),
+                        len(addresses) / elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            addresses = [line.decode('utf-8').rstrip() for line in f]
+    else:
+        addresses = SAMPLE
+
+    print '%d addresses' % len(addresses)
+    print '%-8s %10s %12s' % ('', 'agreement', 'addresses/s')
+    for name, agreement, speed in run(addresses):
+        print '%-8s %9.2f%% %12.1f' % (name, agreement * 100, speed)
@@ -0,0 +1,62 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the matcher backends (address_matchers.py) for every
+category of the gazetteer.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_matchers [addresses.txt]
+
+The built-in sample of addresses is used if the file is not given.
+"""
+
+import sys
+
+import timeit
+
+from address_splitter import AddressSplitter, CATEGORIES
+from address_matchers import available_matchers, get_matcher_class
+
+from benchmarks.bench_scanner import PATH, SAMPLE
+
+
+def run(addresses, repeat=3):
+    """Return list of (category, backend, count of the patterns
+    matched by re, build time, time per address)
+    """
+    splitter = AddressSplitter.from_directory(PATH)
+    results = []
+    for category in CATEGORIES:
+        patterns = splitter._get_list(category)
+        if not patterns:
+            continue
+        for backend in available_matchers():
+            start = timeit.default_timer()
+            matcher = get_matcher_class(backend)(patterns)
+            build_time = timeit.default_timer() - start
+
+            def find():
+                for a in addresses:
+                    matcher.find_all(a)
+
+            find_time = min(timeit.repeat(find, number=1, repeat=repeat))
+            free = len(getattr(matcher, 'free_patterns', patterns))
+            results.append((category, backend, free, build_time,
+                            find_time / len(addresses)))
+
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            addresses = [line.decode('utf-8').rstrip() for line in f]
+    else:
+        addresses = SAMPLE * 20
+
+    print '%d addresses' % len(addresses)
+    print '%-10s %-8s %8s %10s %12s' % ('', 'backend', 'free', 'build, s',
+                                        'find, us')
+    for category, backend, free, build_time, find_time in run(addresses):
+        print '%-10s %-8s %8d %10.2f %12.1f' % (
+            category, backend, free, build_time, find_time * 1e6)
@@ -0,0 +1,84 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the house and index scanners (address_scanner.py)
+against matching of every pattern of the house list.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_scanner [addresses.txt]
+
+The built-in sample of addresses is used if the file is not given.
+"""
+
+import sys
+
+import timeit
+
+from address_splitter import AddressSplitter
+from address_scanner import find_index_positions
+
+PATH = 'csv_files/'
+
+SAMPLE = [
+    u'москва, улица малая, дом 18/3',
+    u'Москва, ул. Вавилова, д. 18, корп. 2, стр. 1',
+    u'117312, г. Москва, ул. Вавилова, д.18а',
+    u'г Тверь, пр-кт Ленина, 18б, кв 3',
+    u'Московская область, Одинцовский район, деревня Бутынь',
+    u'Российская федерация, Рязанская обл., г. Рязань, ул. Есенина',
+    u'Тверская обл., Конаковский р-н, пгт Редкино, ул. Школьная, д. 5',
+    u'390000, Рязань, Почтовая улица, дом 61, строение 2',
+    u'Санкт-Петербург, Невский проспект, дом 28, литера А',
+    u'Зеленоград, корпус 1824',
+]
+
+
+def run(addresses, repeat=5):
+    splitter = AddressSplitter.from_directory(PATH)
+    scanner = splitter._get_house_scanner()
+    house_list = splitter.house_list
+    splitter.use_scanners = False
+
+    def regex_houses():
+        for a in addresses:
+            splitter._get_positions(a, house_list)
+
+    def scanner_houses():
+        for a in addresses:
+            scanner.scan(a)
+
+    def regex_index():
+        for a in addresses:
+            splitter._get_index_pos(a)
+
+    def scanner_index():
+        for a in addresses:
+            find_index_positions(a)
+
+    results = []
+    for name, regex_func, scanner_func in [
+            ('houses', regex_houses, scanner_houses),
+            ('index', regex_index, scanner_index)]:
+        regex_time = min(timeit.repeat(regex_func, number=1, repeat=repeat))
+        scanner_time = min(timeit.repeat(scanner_func, number=1,
+                                         repeat=repeat))
+        results.append((name, regex_time, scanner_time))
+
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            addresses = [line.decode('utf-8').rstrip() for line in f]
+    else:
+        addresses = SAMPLE * 100
+
+    print '%d addresses' % len(addresses)
+    print '%-8s %12s %12s %8s' % ('', 'regex, us', 'scanner, us', 'speedup')
+    for name, regex_time, scanner_time in run(addresses):
+        print '%-8s %12.1f %12.1f %7.1fx' % (
+            name,
+            regex_time / len(addresses) * 1e6,
+            scanner_time / len(addresses) * 1e6,
+            regex_time / scanner_time)
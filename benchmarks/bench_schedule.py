@@ -0,0 +1,105 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the cost-aware scheduling (address_schedule.py): the
+parsing time of every address is measured once, then the parallel
+parsing is simulated for several counts of workers (every chunk is
+taken by the first free worker):
+
+    fixed   -- chunks of chunk_lines consecutive lines
+               (address_input.parse_file)
+    sorted  -- the most expensive addresses first by estimate_cost,
+               the chunks of the target cost, smaller at the end
+               (address_schedule.parse_file_scheduled)
+
+The simulation shows the time of the schedules on more CPUs than the
+benchmark machine has.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_schedule [addresses.txt [chunk_lines]]
+"""
+
+import sys
+
+import heapq
+import timeit
+
+from address_splitter import AddressSplitter
+from address_schedule import (
+    TARGET_TIME,
+    CHUNKS_PER_WORKER,
+    _Window,
+    _chunk_cost
+)
+
+from benchmarks.bench_scanner import PATH, SAMPLE
+
+# Counts of the simulated workers
+WORKERS = [2, 4, 8, 16]
+
+
+def measure(addresses):
+    """Return list of the parsing times of the addresses
+    """
+    splitter = AddressSplitter.from_directory(PATH).warm_up()
+    timer = timeit.default_timer
+    times = []
+    for address in addresses:
+        start = timer()
+        splitter.get_best_strategy(address)
+        times.append(timer() - start)
+    return times
+
+
+def simulate(chunks, workers):
+    """Return (wall time, utilization) of the chunks (lists of times)
+    taken by the first free worker in the given order
+    """
+    free = [0.0] * workers
+    for chunk in chunks:
+        heapq.heapreplace(free, free[0] + sum(chunk))
+    wall = max(free)
+    return wall, sum(sum(c) for c in chunks) / (wall * workers)
+
+
+def fixed_chunks(times, chunk_lines):
+    return [times[i:i + chunk_lines]
+            for i in xrange(0, len(times), chunk_lines)]
+
+
+def sorted_chunks(addresses, times, workers, target_time=TARGET_TIME):
+    """Return the chunks of the scheduler: the throughput is not known
+    for the first chunks sent to the workers, then it is the mean cost
+    per second of the sample
+    """
+    window = _Window(0, addresses)
+    rate = window.remaining_cost / sum(times)
+    chunks = []
+    while not window.sent:
+        known = len(chunks) >= CHUNKS_PER_WORKER * workers
+        rows, _ = window.take(_chunk_cost(window, rate if known else None,
+                                          target_time, workers))
+        chunks.append([times[i] for i in rows])
+    return chunks
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            addresses = [line.decode('utf-8').rstrip() for line in f]
+    else:
+        addresses = SAMPLE
+    chunk_lines = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    times = measure(addresses)
+    print '%d addresses, %.1f s, max %.2f s' % (len(addresses), sum(times),
+                                                max(times))
+    print '%8s %14s %14s %14s %14s' % ('workers', 'fixed, s', 'fixed util.',
+                                       'sorted, s', 'sorted util.')
+    for workers in WORKERS:
+        fixed = simulate(fixed_chunks(times, chunk_lines), workers)
+        cost_sorted = simulate(sorted_chunks(addresses, times, workers),
+                               workers)
+        print '%8d %14.1f %13.0f%% %14.1f %13.0f%%' % (
+            workers, fixed[0], 100 * fixed[1], cost_sorted[0],
+            100 * cost_sorted[1])
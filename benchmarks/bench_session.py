@@ -0,0 +1,65 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the incremental session (address_session.py): latency
+of every keystroke of the typed addresses against the full parsing.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_session [city_list_file [addresses.txt]]
+
+The built-in sample of addresses is used if the file is not given.
+"""
+
+import sys
+
+import timeit
+
+from address_splitter import AddressSplitter
+from address_session import IncrementalSession, SessionIndex
+from address_service import percentile
+
+from benchmarks.bench_scanner import PATH, SAMPLE
+
+
+def run(addresses, city_list_file='cities.csv'):
+    """Return (list of the session latencies, list of the full parsing
+    latencies) of the keystrokes
+    """
+    splitter = AddressSplitter.from_directory(PATH,
+                                              city_list_file=city_list_file)
+    splitter.warm_up()
+    index = SessionIndex(splitter)
+    index.warm_up()
+    timer = timeit.default_timer
+
+    session_times = []
+    full_times = []
+    for address in addresses:
+        session = IncrementalSession(splitter, index)
+        for i in range(1, len(address) + 1):
+            start = timer()
+            session.update(address[:i])
+            session_times.append(timer() - start)
+
+            start = timer()
+            splitter.get_parsed_address(address[:i])
+            full_times.append(timer() - start)
+
+    return session_times, full_times
+
+
+if __name__ == '__main__':
+    city_list_file = sys.argv[1] if len(sys.argv) > 1 else 'cities.csv'
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as f:
+            addresses = [line.decode('utf-8').rstrip() for line in f]
+    else:
+        addresses = SAMPLE
+
+    print '%d addresses, %s' % (len(addresses), city_list_file)
+    print '%-8s %10s %10s %10s' % ('', 'p50, ms', 'p95, ms', 'max, ms')
+    for name, times in zip(['session', 'full'], run(addresses,
+                                                    city_list_file)):
+        print '%-8s %10.2f %10.2f %10.2f' % (
+            name, percentile(times, 50) * 1e3, percentile(times, 95) * 1e3,
+            max(times) * 1e3)
@@ -0,0 +1,58 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the transport of the parallel parsing results:
+address_input.parse_file (pickled lines and Address objects) against
+address_shared.parse_file_spans (positions in shared memory).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_shared addresses.txt [workers [beam_width]]
+
+The addresses are parsed by the beam search of the given width
+(1 by default), so the time of the transport is not hidden by the
+search of the strategies.
+"""
+
+import sys
+
+import cPickle
+import timeit
+
+from address_input import parse_file
+from address_shared import parse_file_spans
+
+from benchmarks.bench_scanner import PATH
+
+
+def run(filename, workers=None, beam_width=1):
+    """Return list of (name, seconds, bytes sent to the parent per
+    address)
+    """
+    options = dict(beam_width=beam_width)
+    timer = timeit.default_timer
+
+    start = timer()
+    results = list(parse_file(filename, PATH, options, workers))
+    pickled_time = timer() - start
+    count = sum(len(lines) for _, lines, _ in results)
+    pickled = sum(len(cPickle.dumps(r, cPickle.HIGHEST_PROTOCOL))
+                  for r in results)
+
+    start = timer()
+    chunks = list(parse_file_spans(filename, PATH, options, workers))
+    shared_time = timer() - start
+    # The worker returns (slot, count of the lines) of a chunk
+    shared = sum(len(cPickle.dumps((0, len(c)), cPickle.HIGHEST_PROTOCOL))
+                 for c in chunks)
+
+    return [('pickled', pickled_time, float(pickled) / max(count, 1)),
+            ('shared', shared_time, float(shared) / max(count, 1))]
+
+
+if __name__ == '__main__':
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    beam_width = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+
+    print '%-8s %10s %16s' % ('', 'time, s', 'bytes/address')
+    for name, seconds, size in run(sys.argv[1], workers, beam_width):
+        print '%-8s %10.2f %16.2f' % (name, seconds, size)
@@ -0,0 +1,83 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the splitter startup time.
+
+Every measurement is made in a new python process:
+    import      -- import of address_splitter
+    lazy        -- construction of the splitter (the lists are loaded
+                   on the first use)
+    first parse -- the first get_parsed_address call of the lazy
+                   splitter (it loads all lists)
+    eager       -- construction and warm_up() (all lists are loaded
+                   before the first parse)
+    countries   -- construction and search of the countries only
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup [--city-list cities_big.csv]
+"""
+
+import sys
+
+import json
+import subprocess
+
+SCRIPT = r'''
+import json, time
+start = time.time()
+from address_splitter import AddressSplitter
+imported = time.time()
+splitter = AddressSplitter.from_directory(%(path)r,
+                                          city_list_file=%(city)r)
+constructed = time.time()
+mode = %(mode)r
+if mode == 'parse':
+    splitter.get_parsed_address(u'Москва, ул. Вавилова, д. 18')
+elif mode == 'eager':
+    splitter.warm_up()
+elif mode == 'countries':
+    splitter._get_country_pos(u'Москва, Россия')
+finished = time.time()
+print json.dumps(dict(imported=imported - start,
+                      constructed=constructed - imported,
+                      finished=finished - constructed))
+'''
+
+
+def measure(mode, path='csv_files/', city='cities.csv', repeat=3):
+    """Return min timings of the mode over the repeats (seconds)
+    """
+    best = None
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c',
+             SCRIPT % dict(path=path, city=city, mode=mode)])
+        timings = json.loads(output)
+        if best is None:
+            best = timings
+        else:
+            best = {k: min(best[k], timings[k]) for k in best}
+    return best
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Startup time benchmark')
+    parser.add_argument('--path', default='csv_files/')
+    parser.add_argument('--city-list', default='cities.csv')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    lazy = measure('none', args.path, args.city_list, args.repeat)
+    parse = measure('parse', args.path, args.city_list, args.repeat)
+    eager = measure('eager', args.path, args.city_list, args.repeat)
+    countries = measure('countries', args.path, args.city_list, args.repeat)
+
+    print 'import:               %8.1f ms' % (lazy['imported'] * 1000)
+    print 'lazy construction:    %8.1f ms' % (lazy['constructed'] * 1000)
+    print 'first parse (lazy):   %8.1f ms' % (parse['finished'] * 1000)
+    print 'eager (warm_up):      %8.1f ms' % (
+        (eager['constructed'] + eager['finished']) * 1000)
+    print 'countries only:       %8.1f ms' % (
+        (countries['constructed'] + countries['finished']) * 1000)
@@ -0,0 +1,135 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Load generator for the address parsing service (address_service.py).
+
+Usage (from the repository root):
+    python address_service.py --port 8080 &
+    python -m benchmarks.load_service addresses.txt --concurrency 16
+
+Every thread sends requests one by one, the latencies of the requests
+are collected and the percentiles are printed.
+"""
+
+import sys
+
+import json
+import time
+import random
+import threading
+import urllib2
+
+from address_service import percentile
+
+
+def _worker(url, addresses, count, batch, timeout, latencies, statuses,
+            lock, seed):
+    rnd = random.Random(seed)
+    for _ in range(count):
+        if batch > 1:
+            data = {'addresses': [rnd.choice(addresses)
+                                  for _ in range(batch)]}
+            path = '/parse_batch'
+        else:
+            data = {'address': rnd.choice(addresses)}
+            path = '/parse'
+        if timeout:
+            data['timeout'] = timeout
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+        start = time.time()
+        try:
+            response = urllib2.urlopen(url + path, body)
+            response.read()
+            status = response.getcode()
+        except urllib2.HTTPError as e:
+            status = e.code
+        except urllib2.URLError:
+            status = 'connection error'
+        latency = time.time() - start
+
+        with lock:
+            latencies.append(latency)
+            statuses[status] = statuses.get(status, 0) + 1
+
+
+def run_load(url, addresses, concurrency=8, requests=1000, batch=1,
+             timeout=None, seed=0):
+    """Send requests to the service from concurrent threads.
+
+    :param url:         service url, e.g. http://127.0.0.1:8080
+    :param addresses:   list of addresses, the requests use random ones
+    :param concurrency: count of concurrent threads
+    :param requests:    total count of requests
+    :param batch:       count of addresses per request (batch > 1 uses
+                        /parse_batch endpoint)
+    :param timeout:     deadline of the requests (seconds)
+
+    :returns:   dict of statistics
+    """
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    per_thread = [requests // concurrency +
+                  (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(url.rstrip('/'), addresses, per_thread[i], batch, timeout,
+                  latencies, statuses, lock, seed + i))
+        for i in range(concurrency)]
+
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    stats = dict(
+        requests=len(latencies),
+        elapsed=elapsed,
+        throughput=len(latencies) / elapsed if elapsed else 0.0,
+        statuses=statuses
+    )
+    for q in [50, 90, 95, 99]:
+        stats['p%s' % q] = percentile(latencies, q)
+    stats['max'] = max(latencies) if latencies else None
+
+    return stats
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Load generator for the address parsing service')
+    parser.add_argument('datafile', help='file of addresses, one per line')
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.datafile) as f:
+        addresses = [line.decode('utf-8').rstrip() for line in f]
+        addresses = [a for a in addresses if a]
+    if not addresses:
+        sys.exit('No addresses in %s' % args.datafile)
+
+    stats = run_load(args.url, addresses,
+                     concurrency=args.concurrency,
+                     requests=args.requests,
+                     batch=args.batch,
+                     timeout=args.timeout,
+                     seed=args.seed)
+
+    print 'requests:    %d in %.2f s (%.1f req/s)' % (
+        stats['requests'], stats['elapsed'], stats['throughput'])
+    print 'statuses:    %s' % stats['statuses']
+    for key in ['p50', 'p90', 'p95', 'p99', 'max']:
+        if stats[key] is not None:
+            print '%-12s %.2f ms' % (key + ':', stats[key] * 1000)
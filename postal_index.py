@@ -0,0 +1,101 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Table of postal index prefixes.
+
+The table maps the prefixes of postal indexes to the regions (and
+subregions) that use the indexes. If the address contains an index,
+the region and subregion candidates that don't belong to the index
+are removed before the strategy search.
+
+File format (see csv_files/index_regions.csv), one row per line:
+    prefix;region[;subregion]
+The region and subregion are regular expressions, they are searched
+in the found candidates (case insensitive). Several rows can have the
+same prefix, the longest prefix of the index is used.
+"""
+
+import re
+
+
+class PostalIndexTable(object):
+    """Map of index prefixes to the patterns of regions and subregions
+    """
+    def __init__(self, rows):
+        """
+        :param rows:    iterable of (prefix, region, subregion) tuples,
+                        region and subregion are regular expressions
+                        or None
+        """
+        self._table = {}
+        for prefix, region, subregion in rows:
+            if not prefix.isdigit():
+                raise ValueError(u'Wrong index prefix "%s"' % prefix)
+            regions, subregions = self._table.setdefault(prefix, ([], []))
+            if region:
+                regions.append(re.compile(region, re.I | re.U))
+            if subregion:
+                subregions.append(re.compile(subregion, re.I | re.U))
+        self._lengths = sorted(set(len(p) for p in self._table),
+                               reverse=True)
+
+    @classmethod
+    def from_file(cls, filename):
+        """Read the table from the file (see the module description)
+        """
+        rows = []
+        with open(filename) as f:
+            for line in f:
+                line = line.decode('utf-8').strip()
+                if not line or line.startswith(u'#'):
+                    continue
+                fields = line.split(u';')
+                if len(fields) > 3:
+                    raise ValueError(u'Wrong row of %s: "%s"' %
+                                     (filename, line))
+                fields += [None] * (3 - len(fields))
+                rows.append(tuple(fields))
+
+        return cls(rows)
+
+    def __len__(self):
+        return len(self._table)
+
+    def lookup(self, index):
+        """Return (region patterns, subregion patterns) of the longest
+        prefix of the index, ([], []) if the prefix is not found.
+        """
+        for length in self._lengths:
+            found = self._table.get(index[:length])
+            if found:
+                return found
+        return [], []
+
+    def restrict(self, indexes, regions, subregions):
+        """Remove the region and subregion candidates that don't belong
+        to the indexes. The candidates are not changed if none of them
+        belong to the indexes (the index or the table can be wrong).
+
+        :param indexes:     found indexes (dict: index => positions)
+        :param regions:     found regions (dict: text => positions)
+        :param subregions:  found subregions (dict: text => positions)
+
+        :returns:   (regions, subregions)
+        """
+        region_patterns = []
+        subregion_patterns = []
+        for index in indexes:
+            r, s = self.lookup(index)
+            region_patterns += r
+            subregion_patterns += s
+
+        return (self._restrict(regions, region_patterns),
+                self._restrict(subregions, subregion_patterns))
+
+    @staticmethod
+    def _restrict(found, patterns):
+        if not patterns or not found:
+            return found
+        kept = {text: positions for text, positions in found.iteritems()
+                if any(p.search(text) for p in patterns)}
+        return kept or found
@@ -2,4 +2,23 @@
 
 python -m test_address.test_address
 python -m test_address.test_address_splitter
-
+python -m test_address.test_address_batch
+python -m test_address.test_address_service
+python -m test_address.test_address_linkage
+python -m test_address.test_address_scanner
+python -m test_address.test_postal_index
+python -m test_address.test_address_router
+python -m test_address.test_address_stats
+python -m test_address.test_address_diff
+python -m test_address.test_address_generator
+python -m test_address.test_address_matchers
+python -m test_address.test_address_shards
+python -m test_address.test_address_input
+python -m test_address.test_address_session
+python -m test_address.test_address_suggest
+python -m test_address.test_address_slowlog
+python -m test_address.test_address_beam
+python -m test_address.test_address_shared
+python -m test_address.test_address_cache
+python -m test_address.test_address_db
+python -m test_address.test_address_schedule
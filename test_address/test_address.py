@@ -140,6 +140,27 @@ class TestAddress(unittest.TestCase):
         # import ipdb; ipdb.set_trace()
         self.assertEqual(new, expected)
 
+    def test_as_dict(self):
+        address = Address(
+            raw_address=u'Москва, Малая, 234',
+            settlement=u'Москва',
+            street=u'Малая',
+            house=u'234'
+        )
+        expected = {
+            'raw_address': u'Москва, Малая, 234',
+            'index': None,
+            'country': None,
+            'region': None,
+            'subregion': None,
+            'settlement': u'Москва',
+            'street': u'Малая',
+            'house': u'234',
+            'poi': None
+        }
+        self.assertEqual(address.as_dict(), expected)
+        self.assertEqual(Address(**address.as_dict()), address)
+
 
 if __name__ == '__main__':
     suite = unittest.makeSuite(TestAddress, 'test')
@@ -0,0 +1,110 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+import unittest
+
+from address_splitter import AddressSplitter
+from address_batch import (
+    BatchStats,
+    normalize_address,
+    group_duplicates,
+    parse_batch,
+    parse_batches,
+    residual_batch,
+    iter_batches,
+    format_result
+)
+
+from address import Address
+
+from testing import DATADIR
+
+
+class TestAddressBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.splitter = AddressSplitter.from_directory(DATADIR)
+
+    def test_normalize_address(self):
+        self.assertEqual(normalize_address(u'Москва, Вавилова  \n'),
+                         u'москва, вавилова')
+        self.assertEqual(normalize_address(u'москва, вавилова'),
+                         u'москва, вавилова')
+
+    def test_group_duplicates(self):
+        addresses = [u'Москва', u'зеленоград', u'москва ', u'МОСКВА']
+        groups = group_duplicates(addresses)
+        self.assertEqual(groups.items(),
+                         [(u'москва', [0, 2, 3]), (u'зеленоград', [1])])
+
+    def test_parse_batch(self):
+        addresses = [
+            u'Москва, вавилова, дом 3',
+            u'зеленоград, улица россия',
+            u'москва, вавилова, дом 3\n',
+            u'Москва, вавилова, дом 3',
+            u'МОСКВА, ВАВИЛОВА, ДОМ 3',
+        ]
+        parsed, stats = parse_batch(self.splitter, addresses)
+
+        self.assertEqual(stats.rows, 5)
+        self.assertEqual(stats.distinct, 2)
+        self.assertEqual(stats.duplicates, 3)
+        self.assertAlmostEqual(stats.duplicate_ratio, 0.6)
+
+        # The results are the same as the results of the splitter
+        splitter = AddressSplitter.from_directory(DATADIR)
+        for address, got in zip(addresses, parsed):
+            expected = splitter.get_parsed_address(address)
+            self.assertEqual(got, expected)
+        self.assertEqual(parsed[4].settlement, u'МОСКВА')
+        self.assertEqual(parsed[4].raw_address, addresses[4])
+
+        parsed, stats = parse_batch(self.splitter, [])
+        self.assertEqual(parsed, [])
+        self.assertEqual(stats.duplicate_ratio, 0.0)
+
+    def test_residual_batch(self):
+        addresses = [u'Москва, вавилова, офис',
+                     u'МОСКВА, ВАВИЛОВА, ОФИС',
+                     u'зеленоград']
+        residuals, stats = residual_batch(self.splitter, addresses)
+        self.assertEqual(residuals, [u'офис', u'ОФИС', u''])
+        self.assertEqual(stats.distinct, 2)
+
+        residuals, _ = residual_batch(self.splitter, addresses[1:2], True)
+        self.assertEqual(residuals, [[(18, 22, u'ОФИС')]])
+
+    def test_parse_batches(self):
+        self.assertEqual(list(iter_batches(range(5), 2)),
+                         [[0, 1], [2, 3], [4]])
+
+        addresses = (u'москва, дом %d' % (i % 3) for i in range(10))
+        total = BatchStats()
+        count = 0
+        for batch, parsed, stats in parse_batches(self.splitter,
+                                                  addresses, 4):
+            self.assertEqual(len(batch), len(parsed))
+            self.assertEqual(stats.rows, len(batch))
+            count += 1
+            total += stats
+        self.assertEqual(count, 3)
+        self.assertEqual(total.rows, 10)
+        self.assertEqual(total.distinct, 3 + 3 + 2)
+
+    def test_format_result(self):
+        address = Address(raw_address=u'москва, дом 3', settlement=u'москва',
+                          house=u'дом 3')
+        self.assertEqual(format_result(u'москва, дом 3', address, u';'),
+                         u'москва, дом 3;;;;;москва;;дом 3')
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestAddressBatch, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,73 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+import unittest
+
+from address_splitter import AddressSplitter, SplitingStrategy
+from address_beam import beam_search, spans_score
+from address_diff import PARTS, create_engine, strategy_spans
+
+from testing import DATADIR
+
+
+class TestBeam(unittest.TestCase):
+
+    def setUp(self):
+        self.splitter = AddressSplitter.from_directory(DATADIR)
+        self.addresses = [u'Москва, Новый Арбат 5, Зеленоград',
+                          u'119607, г. Москва, ул. Раменки 17',
+                          u'Рязанская область, Рязань',
+                          u'Москва']
+
+    def test_spans_score(self):
+        penalties = self.splitter.strategy_penalties()
+        for address in self.addresses:
+            for s in self.splitter._get_strategies(address):
+                positions = [getattr(s, part + '_pos') for part in PARTS]
+                score, _ = spans_score(positions, penalties)
+                self.assertAlmostEqual(
+                    score + s.blank_penalty * len(address), s.get_score())
+
+    def test_exact_width(self):
+        penalties = self.splitter.strategy_penalties()
+        for address in self.addresses:
+            best = self.splitter.get_best_strategy(address)
+            candidates = self.splitter._get_candidates(address)
+            count = len(self.splitter._get_strategies(address))
+            positions = beam_search(candidates, penalties, count)
+            self.assertEqual(strategy_spans(SplitingStrategy(address,
+                                                             *positions)),
+                             strategy_spans(best))
+
+        self.assertRaises(ValueError, beam_search, candidates, penalties, 0)
+
+    def test_splitter_option(self):
+        splitter = AddressSplitter.from_directory(DATADIR, beam_width=1000)
+        for address in self.addresses:
+            self.assertEqual(splitter.get_parsed_address(address),
+                             self.splitter.get_parsed_address(address))
+
+        narrow = AddressSplitter.from_directory(DATADIR, beam_width=1)
+        best = narrow.get_best_strategy(self.addresses[0])
+        self.assertTrue(best.get_score() >=
+                        self.splitter.get_best_strategy(self.addresses[0])
+                        .get_score() - 1e-9)
+
+    def test_engine(self):
+        reference = create_engine('reference', DATADIR)
+        beam = create_engine('beam32', DATADIR)
+        self.assertEqual(beam.width, 32)
+        for address in self.addresses:
+            self.assertEqual(beam.parse(address)['address'],
+                             reference.parse(address)['address'])
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestBeam, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,92 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import unittest
+
+from address_splitter import AddressSplitter
+from address_cache import ResultCache, build_snapshot
+
+from testing import DATADIR, TMPFILE
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.addresses = [u'Москва, Новый Арбат 5, Зеленоград',
+                          u'Рязанская область, Рязань',
+                          u'Москва, Новый Арбат 5, Зеленоград',
+                          u'москва, новый арбат 5, зеленоград  ',
+                          u'Зеленоград',
+                          u'Рязанская область, Рязань']
+        self.reference = AddressSplitter.from_directory(DATADIR)
+
+    def tearDown(self):
+        if os.path.exists(TMPFILE):
+            os.remove(TMPFILE)
+
+    def _splitter(self, max_size=100, **options):
+        return AddressSplitter.from_directory(
+            DATADIR, result_cache=ResultCache(max_size), **options)
+
+    def test_lru(self):
+        cache = ResultCache(2)
+        cache.put(u'Москва', [(0, 6)])
+        cache.put(u'Тверь', [(0, 5)])
+        self.assertEqual(cache.get(u'МОСКВА '), ((0, 6),))
+        cache.put(u'Рязань', [(0, 6)])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(u'Тверь'), None)
+        self.assertEqual(cache.hot(), [(u'москва', 2, ((0, 6),)),
+                                       (u'рязань', 1, ((0, 6),))])
+
+    def test_splitter(self):
+        splitter = self._splitter()
+        for address in self.addresses:
+            self.assertEqual(splitter.get_parsed_address(address),
+                             self.reference.get_parsed_address(address))
+        self.assertEqual([(key, count) for key, count, _
+                          in splitter.result_cache.hot(2)],
+                         [(u'москва, новый арбат 5, зеленоград', 3),
+                          (u'рязанская область, рязань', 2)])
+
+        # The results matched by the changed patterns are dropped
+        splitter.add_patterns('city', [u'рязань'])
+        self.assertEqual(len(splitter.result_cache), 2)
+
+    def test_snapshot(self):
+        splitter = self._splitter()
+        self.assertEqual(build_snapshot(splitter, self.addresses, TMPFILE,
+                                        n=2), 2)
+
+        loaded = self._splitter()
+        self.assertEqual(loaded.preload_cache(TMPFILE), 2)
+        self.assertEqual(loaded.result_cache.hot(),
+                         splitter.result_cache.hot(2))
+        for address in self.addresses:
+            self.assertEqual(loaded.get_parsed_address(address),
+                             self.reference.get_parsed_address(address))
+
+        thread = self._splitter().preload_cache(TMPFILE, background=True)
+        thread.join()
+
+        # The snapshot of other gazetteers is skipped
+        changed = self._splitter()
+        changed.add_patterns('street', [u'новая'])
+        self.assertNotEqual(changed.gazetteer_hash(),
+                            splitter.gazetteer_hash())
+        self.assertEqual(changed.preload_cache(TMPFILE), 0)
+        self.assertEqual(self._splitter(beam_width=4).preload_cache(TMPFILE),
+                         0)
+        self.assertEqual(loaded.preload_cache(TMPFILE + '.absent'), 0)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestResultCache, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,103 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+import sqlite3
+import unittest
+
+from address_splitter import AddressSplitter
+from address_db import (
+    RESULT_COLUMNS,
+    ResultSink,
+    iter_rows,
+    parse_table,
+    quote
+)
+
+from testing import DATADIR
+
+
+class TestAddressDB(unittest.TestCase):
+
+    def setUp(self):
+        self.addresses = [u'Москва, Новый Арбат %d' % i for i in range(7)] + \
+            [u'зеленоград', None, u'Рязанская область, Рязань']
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('CREATE TABLE addresses '
+                          '(id INTEGER PRIMARY KEY, address TEXT)')
+        # The keys are not consecutive
+        self.conn.executemany('INSERT INTO addresses VALUES (?, ?)',
+                              [(i * 3, a)
+                               for i, a in enumerate(self.addresses)])
+        self.conn.commit()
+        self.splitter = AddressSplitter.from_directory(DATADIR)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _results(self):
+        rows = self.conn.execute(
+            'SELECT * FROM parsed_addresses ORDER BY id').fetchall()
+        return [(row[0], dict(zip(RESULT_COLUMNS, row[1:])))
+                for row in rows]
+
+    def _expected(self):
+        expected = []
+        for i, address in enumerate(self.addresses):
+            parsed = self.splitter.get_parsed_address(address or u'')
+            expected.append((i * 3, {c: getattr(parsed, c)
+                                     for c in RESULT_COLUMNS}))
+        return expected
+
+    def test_iter_rows(self):
+        batches = list(iter_rows(self.conn, 'addresses', batch_size=4))
+        self.assertEqual([len(b) for b in batches], [4, 4, 2])
+        self.assertEqual(batches[0][1], (3, self.addresses[1]))
+        self.assertEqual(batches[2][0], (24, u''))
+        self.assertEqual(list(iter_rows(self.conn, 'addresses', start=20)),
+                         [[(21, self.addresses[7]), (24, u''),
+                           (27, self.addresses[9])]])
+        self.assertRaises(ValueError, quote, 'addresses; DROP TABLE x')
+        # MySQLdb is rejected before the first query
+        self.assertRaises(ValueError, parse_table, self.conn, 'addresses',
+                          DATADIR, paramstyle='format')
+
+    def test_parse_table(self):
+        stats = parse_table(self.conn, 'addresses', DATADIR, batch_size=3,
+                            commit_rows=4)
+        self.assertEqual(stats.rows, len(self.addresses))
+        self.assertEqual(self._results(), self._expected())
+
+        # Nothing is parsed again
+        self.assertEqual(parse_table(self.conn, 'addresses', DATADIR).rows,
+                         0)
+
+    def test_resume(self):
+        sink = ResultSink(self.conn, 'parsed_addresses')
+        self.assertEqual(sink.last_key(), None)
+        # The interrupted run: the first rows are written
+        parsed = [self.splitter.get_parsed_address(a)
+                  for a in self.addresses[:4]]
+        sink.write([0, 3, 6, 9], parsed)
+        sink.commit()
+        self.assertEqual(sink.last_key(), 9)
+
+        stats = parse_table(self.conn, 'addresses', DATADIR, batch_size=2,
+                            workers=2)
+        self.assertEqual(stats.rows, len(self.addresses) - 4)
+        self.assertEqual(self._results(), self._expected())
+
+        # The rows are updated by the restarted run
+        self.conn.execute('UPDATE parsed_addresses SET street = NULL')
+        parse_table(self.conn, 'addresses', DATADIR, resume=False)
+        self.assertEqual(self._results(), self._expected())
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestAddressDB, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,86 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+import unittest
+
+from address_diff import (
+    ENGINES,
+    SplitterEngine,
+    register_engine,
+    create_engine,
+    compare,
+    run_diff
+)
+
+from testing import DATADIR
+
+
+class _DropHouseEngine(SplitterEngine):
+    """Broken engine: never finds houses"""
+    def match(self, address):
+        candidates = SplitterEngine.match(self, address)
+        candidates[6] = {}
+        return candidates
+
+
+class TestAddressDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.addresses = [u'Москва, Новый Арбат 5',
+                          u'117312, Москва, Вавилова',
+                          u'Зеленоград',
+                          u'Россия, Москва, Вавилова 18']
+        register_engine('drop_house', lambda path, options: _DropHouseEngine(
+            create_engine('reference', path, options).splitter))
+
+    def tearDown(self):
+        ENGINES.pop('drop_house', None)
+
+    def test_engine(self):
+        engine = create_engine('reference', DATADIR)
+        result = engine.parse(self.addresses[0])
+        self.assertEqual(result['address'],
+                         engine.splitter.get_parsed_address(
+                             self.addresses[0]))
+        self.assertEqual(sorted(result['times']), ['match', 'search'])
+        self.assertEqual(compare(1, self.addresses[0], result, result), None)
+
+        self.assertRaises(ValueError, create_engine, 'unknown', DATADIR)
+
+    def test_no_mismatches(self):
+        results = list(run_diff(self.addresses, 'scanners', DATADIR,
+                                workers=0, chunk_size=3))
+        self.assertEqual(len(results), 2)
+        summary = results[-1][0]
+        self.assertEqual(summary.rows, 4)
+        self.assertEqual(summary.mismatches, 0)
+        self.assertEqual([m for _, mismatches in results
+                          for m in mismatches], [])
+        self.assertTrue(summary.speedup() > 0)
+        self.assertEqual(len(summary.format().splitlines()), 5)
+
+    def test_mismatches(self):
+        mismatches = [m for _, chunk in run_diff(self.addresses,
+                                                 'drop_house', DATADIR,
+                                                 workers=2, chunk_size=1)
+                      for m in chunk]
+        self.assertEqual([m['line'] for m in mismatches], [1, 2, 4])
+        mismatch = mismatches[2]
+        self.assertEqual(mismatch['address'], self.addresses[3])
+        self.assertEqual(mismatch['reference']['parsed']['house'], u'18')
+        self.assertEqual(mismatch['alternative']['parsed']['house'], None)
+        self.assertEqual(mismatch['reference']['spans']['house'], (25, 27))
+        self.assertEqual(mismatch['alternative']['candidates']['house'], {})
+        self.assertTrue(mismatch['reference']['score'] <
+                        mismatch['alternative']['score'])
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestAddressDiff, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
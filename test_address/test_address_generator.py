@@ -0,0 +1,89 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import sys
+import json
+import random
+from StringIO import StringIO
+
+import unittest
+
+from address_generator import (
+    PARTS,
+    RegexSampler,
+    NoiseOptions,
+    AddressGenerator,
+    read_patterns,
+    format_row,
+    write_corpus
+)
+
+from testing import DATADIR, HOUSE_LIST, SUBREGION_LIST
+
+
+class TestAddressGenerator(unittest.TestCase):
+
+    def test_sampler(self):
+        sampler = RegexSampler(random.Random(1))
+        patterns = read_patterns(HOUSE_LIST) + \
+            read_patterns(SUBREGION_LIST) + \
+            [u'[^0-9]x', u'(а|б)-\\1', u'\\d{2}\\s\\w']
+        for pattern in patterns:
+            for _ in range(10):
+                text = sampler.sample(pattern)
+                self.assertTrue(
+                    re.match(u'(?:%s)$' % pattern, text, re.I | re.U),
+                    u'%s does not match %s' % (text, pattern))
+
+    def test_clean(self):
+        generator = AddressGenerator.from_directory(
+            DATADIR, seed=1, noise=NoiseOptions.clean())
+        for _ in range(20):
+            address, labels, noise = generator.generate()
+            self.assertEqual(noise, [])
+            self.assertEqual(sorted(labels), sorted(PARTS))
+            self.assertTrue(labels['index'].isdigit())
+            self.assertTrue(labels['settlement'])
+            for part, text in labels.items():
+                if text is not None:
+                    self.assertTrue(text in address)
+
+    def test_seed(self):
+        def rows(seed):
+            generator = AddressGenerator.from_directory(
+                DATADIR, seed=seed, noise=NoiseOptions(missing=0.3,
+                                                       typo=0.3,
+                                                       extra=0.3,
+                                                       reorder=0.3))
+            return [generator.generate() for _ in range(50)]
+
+        self.assertEqual(rows(7), rows(7))
+        self.assertNotEqual(rows(7), rows(8))
+        noise = set(kind for _, _, kinds in rows(7) for kind in kinds)
+        self.assertEqual(noise, set(['missing', 'typo', 'extra', 'reorder']))
+
+    def test_write_corpus(self):
+        generator = AddressGenerator.from_directory(DATADIR, seed=2)
+        out = StringIO()
+        write_corpus(generator, 10, out)
+        lines = out.getvalue().decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 11)
+        self.assertEqual(lines[0].split(u'\t'),
+                         ['address'] + PARTS + ['noise'])
+        self.assertEqual(len(lines[1].split(u'\t')), len(PARTS) + 2)
+
+        row = format_row(u'117312, Москва', {'index': u'117312',
+                                            'settlement': u'Москва'},
+                         ['missing'], fmt='jsonl')
+        self.assertEqual(json.loads(row)['labels']['settlement'], u'Москва')
+        self.assertRaises(ValueError, format_row, u'', {}, [], 'xml')
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestAddressGenerator, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,135 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+import unittest
+
+from address_splitter import AddressSplitter
+from address_input import (
+    INDEX_SUFFIX,
+    LineIndex,
+    scan_offsets,
+    parse_file,
+    wait_task,
+    worker_pids
+)
+import address_input
+
+from testing import DATADIR
+
+
+class TestLineIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'input.txt')
+        self.addresses = [u'Москва, Новый Арбат %d' % i for i in range(25)] + \
+            [u'', u'зеленоград']
+        self._write(self.addresses)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, addresses, end='\n'):
+        with open(self.filename, 'w') as f:
+            f.write('\n'.join(a.encode('utf-8') for a in addresses) + end)
+
+    def test_offsets(self):
+        index = LineIndex(self.filename)
+        self.assertEqual(len(index), len(self.addresses))
+        self.assertTrue(os.path.exists(self.filename + INDEX_SUFFIX))
+        self.assertEqual(index.lines(), self.addresses)
+        self.assertEqual(index.lines(24, 26), self.addresses[24:26])
+        self.assertEqual(index.lines(30), [])
+        self.assertEqual(list(index.iter_lines(3, chunk_lines=4)),
+                         self.addresses[3:])
+
+        # The last line without the line end and the file in small blocks
+        self._write(self.addresses, end='')
+        address_input.SCAN_BLOCK, block = 7, address_input.SCAN_BLOCK
+        try:
+            offsets = scan_offsets(self.filename)
+        finally:
+            address_input.SCAN_BLOCK = block
+        self.assertEqual(len(offsets), len(self.addresses) + 1)
+        self.assertEqual(offsets[-1], os.path.getsize(self.filename))
+
+        self._write([], end='')
+        self.assertEqual(len(LineIndex(self.filename, cache=False)), 0)
+
+    def test_cache(self):
+        index = LineIndex(self.filename)
+        self.assertEqual(LineIndex(self.filename).offsets.tolist(),
+                         index.offsets.tolist())
+
+        # The changed file is scanned again
+        self._write(self.addresses[:3])
+        self.assertEqual(LineIndex(self.filename).lines(),
+                         self.addresses[:3])
+
+        # The file of the same size with another mtime is scanned again
+        self._write(self.addresses[1:4])
+        os.utime(self.filename, (0, 0))
+        self.assertEqual(LineIndex(self.filename).lines(),
+                         self.addresses[1:4])
+
+    def test_unwritable_cache(self):
+        # The cache file can't be written (the same as in a read-only
+        # directory): the offsets are kept in memory
+        os.mkdir(self.filename + INDEX_SUFFIX)
+        index = LineIndex(self.filename)
+        self.assertEqual(index.lines(), self.addresses)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ['input.txt', 'input.txt' + INDEX_SUFFIX])
+
+    def test_chunks(self):
+        index = LineIndex(self.filename)
+        chunks = index.chunks(10, first=5)
+        self.assertEqual([c[0] for c in chunks], [5, 15, 25])
+        self.assertEqual(chunks[0][2], chunks[1][1])
+        self.assertEqual(chunks[-1][2], os.path.getsize(self.filename))
+        self.assertRaises(ValueError, index.chunks, 0)
+
+    def test_parse_file(self):
+        splitter = AddressSplitter.from_directory(DATADIR)
+        results = list(parse_file(self.filename, DATADIR, workers=2,
+                                  chunk_lines=10, first=5))
+        self.assertEqual([r[0] for r in results], [5, 15, 25])
+        lines = [line for r in results for line in r[1]]
+        self.assertEqual(lines, self.addresses[5:])
+        parsed = [p for r in results for p in r[2]]
+        self.assertEqual(parsed, [splitter.get_parsed_address(a)
+                                  for a in lines])
+
+    def test_wait_task(self):
+        pool = multiprocessing.Pool(1)
+        pids = worker_pids(pool)
+        try:
+            self.assertEqual(wait_task(pool.apply_async(int, ('5', )), pool,
+                                       pids), 5)
+            self.assertRaises(ValueError, wait_task,
+                              pool.apply_async(int, ('x', )), pool, pids)
+            # The task of the dead worker is lost
+            self.assertRaises(RuntimeError, wait_task,
+                              pool.apply_async(os._exit, (1, )), pool, pids)
+            self.assertRaises(RuntimeError, wait_task,
+                              pool.apply_async(time.sleep, (2, )), pool,
+                              worker_pids(pool), 0.5)
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestLineIndex, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
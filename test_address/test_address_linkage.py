@@ -0,0 +1,122 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+import unittest
+
+from address import Address
+from address_linkage import (
+    BlockingIndex,
+    KeySorter,
+    normalize_part,
+    find_duplicates,
+    merge_groups,
+    sorted_groups
+)
+
+
+class TestBlockingIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [
+            (1, Address(settlement=u'Москва', street=u'Вавилова',
+                        house=u'18')),
+            (2, Address(settlement=u'москва', street=u'вавилова,',
+                        house=u'18', index=u'117312')),
+            (3, Address(settlement=u'москва', street=u'вавилова',
+                        house=u'18а')),
+            (4, Address(settlement=u'Тверь', street=u'Вавилова',
+                        house=u'18')),
+            (5, Address(settlement=u'москва', street=u'вавилова')),
+            (6, Address(index=u'117312', house=u'18')),
+        ]
+
+    def test_normalize_part(self):
+        self.assertEqual(normalize_part(u' Улица  Малая, д.3 '),
+                         u'улица малая д 3')
+        self.assertEqual(normalize_part(u', '), u'')
+
+    def test_blocking_keys(self):
+        index = BlockingIndex([['settlement', 'street', 'house'],
+                               ['index', 'house']])
+        keys = index.blocking_keys(self.records[1][1])
+        self.assertEqual(keys, [(u'москва', u'вавилова', u'18'),
+                                (u'117312', u'18')])
+        keys = index.blocking_keys(self.records[4][1])
+        self.assertEqual(keys, [None, None])
+
+        self.assertRaises(ValueError, BlockingIndex, [['town']])
+        self.assertRaises(ValueError, BlockingIndex, [['house']], 0)
+
+    def test_candidate_groups(self):
+        index = BlockingIndex([['settlement', 'street', 'house'],
+                               ['index', 'house']])
+        index.add_all(self.records)
+        self.assertEqual(index.records, 6)
+        self.assertEqual(index.key_count(), [3, 1])
+
+        groups = sorted(index.candidate_groups())
+        self.assertEqual(groups, [
+            (('index', 'house'), [(u'117312', u'18')], [2, 6]),
+            (('settlement', 'street', 'house'),
+             [(u'москва', u'вавилова', u'18')], [1, 2])
+        ])
+        self.assertEqual(len(list(index.candidate_groups(min_size=3))), 0)
+
+        self.assertEqual(sorted(sorted(g) for g in merge_groups(groups)),
+                         [[1, 2, 6]])
+
+    def test_sorted_neighbourhood(self):
+        groups = list(find_duplicates(self.records,
+                                      [['settlement', 'street', 'house']],
+                                      window=2))
+        self.assertEqual(groups, [
+            (('settlement', 'street', 'house'),
+             [(u'москва', u'вавилова', u'18'),
+              (u'москва', u'вавилова', u'18а')],
+             [1, 2, 3]),
+            (('settlement', 'street', 'house'),
+             [(u'москва', u'вавилова', u'18а'),
+              (u'тверь', u'вавилова', u'18')],
+             [3, 4])
+        ])
+
+        groups = list(find_duplicates(self.records[:1], [['street']],
+                                      window=5, min_size=1))
+        self.assertEqual(groups, [(('street', ), [(u'вавилова', )], [1])])
+
+    def test_external_sort(self):
+        part_sets = [['settlement', 'street', 'house'], ['index', 'house']]
+        index = BlockingIndex(part_sets)
+        index.add_all(self.records)
+        for window in (None, 2):
+            index.window = window
+            # The runs of 2 keys are written to temporary files
+            self.assertEqual(
+                sorted(find_duplicates(self.records, part_sets,
+                                       window=window, run_size=2)),
+                sorted(index.candidate_groups()))
+
+        sorter = KeySorter(run_size=2)
+        for record_id, key in [(1, u'b'), (2, u'a'), (3, u'b'), (4, u'c'),
+                               (5, u'a')]:
+            sorter.add(key, record_id)
+        pairs = list(sorter.pairs())
+        sorter.close()
+        self.assertEqual(pairs, [(u'a', 2), (u'a', 5), (u'b', 1), (u'b', 3),
+                                 (u'c', 4)])
+        self.assertEqual(list(sorted_groups(pairs)),
+                         [([u'a'], [2, 5]), ([u'b'], [1, 3]), ([u'c'], [4])])
+        self.assertEqual(list(sorted_groups(pairs, window=2)),
+                         [([u'a', u'b'], [2, 5, 1, 3]),
+                          ([u'b', u'c'], [1, 3, 4])])
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestBlockingIndex, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
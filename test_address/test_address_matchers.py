@@ -0,0 +1,128 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+import unittest
+
+from address_splitter import AddressSplitter
+from address_matchers import (
+    RegexMatcher,
+    TrieMatcher,
+    AhoCorasickMatcher,
+    ScannerMatcher,
+    Matcher,
+    PatternTable,
+    available_matchers,
+    get_matcher_class,
+    compile_pattern,
+    expand_pattern,
+    required_literal
+)
+
+from testing import DATADIR
+
+
+class TestMatchers(unittest.TestCase):
+
+    def setUp(self):
+        names = [u'абакан(а)?', u'((г. )|(г ))?абакан', u'алтайск((ий)|(ой))',
+                 u'ново[- ]?град', u'абазинск((ий)|(ого))( +р-н)?',
+                 u'[0-9]{1,3}', u'а+', u'москва', u'(ул\\.?)?']
+        self.patterns = {name: compile_pattern(name) for name in names}
+        self.addresses = [
+            u'Г. Абакан, г абакана, абакан-2',
+            u'Алтайский край, Абазинский  р-н, новоград',
+            u'ново-град, ново град, 12 ааа а, 1234',
+            u'москвамосква москва_ москва',
+            u'',
+        ]
+        self.backends = [TrieMatcher, ScannerMatcher]
+        if 'aho' in available_matchers():
+            self.backends.append(AhoCorasickMatcher)
+
+    def test_expand_pattern(self):
+        self.assertEqual(expand_pattern(u'абакан(а)?'),
+                         [u'абакана', u'абакан'])
+        self.assertEqual(expand_pattern(u'абакан(а)??'),
+                         [u'абакан', u'абакана'])
+        self.assertEqual(expand_pattern(u'((г\\. )|(г ))?Абакан'),
+                         [u'г. абакан', u'г абакан', u'абакан'])
+        self.assertEqual(expand_pattern(u'[А-В]'), [u'а', u'б', u'в'])
+        self.assertEqual(expand_pattern(u'а +б'), None)
+        self.assertEqual(expand_pattern(u'(ул)?'), None)
+        self.assertEqual(required_literal(u'абазинск((ий)|(ого))( +р-н)?'),
+                         u'абазинск')
+        self.assertEqual(required_literal(u'[0-9]+'), None)
+
+    def test_pattern_table(self):
+        table = PatternTable([u'москва', u'ново[- ]?град'])
+        self.assertEqual(table.compiled_count(), 0)
+        compiled = table[u'москва']
+        self.assertEqual(table.compiled_count(), 1)
+        # The compiled patterns are shared
+        self.assertTrue(compiled is compile_pattern(u'москва'))
+        self.assertEqual(compiled.pattern, u'\\bмосква\\b')
+        self.assertEqual(compiled.groupindex, {})
+        self.assertEqual(compile_pattern(u'(?P<n>а)(б)').groupindex,
+                         {'n': 1})
+        self.assertEqual(
+            [m.span() for m in table.get(u'ново[- ]?град').finditer(
+                u'новоград, ново-град')], [(0, 8), (10, 19)])
+        self.assertEqual(table.get(u'тверь'), None)
+
+        copy = table.copy()
+        self.assertTrue(isinstance(copy, PatternTable))
+        self.assertEqual(copy.compiled_count(), 2)
+        self.assertEqual(sorted(copy.items()), sorted(table.items()))
+
+    def test_find_all(self):
+        reference = RegexMatcher(self.patterns)
+        splitter = AddressSplitter.from_directory(DATADIR)
+        for address in self.addresses:
+            expected = reference.find_all(address)
+            self.assertEqual(
+                expected, splitter._get_positions(address, self.patterns))
+            for backend in self.backends:
+                self.assertEqual(backend(self.patterns).find_all(address)
+                                 .items(), expected.items())
+
+    def test_dumps(self):
+        for backend in [RegexMatcher] + self.backends:
+            matcher = backend(self.patterns)
+            loaded = Matcher.loads(matcher.dumps())
+            self.assertEqual(type(loaded), backend)
+            for address in self.addresses:
+                self.assertEqual(loaded.find_all(address),
+                                 matcher.find_all(address))
+
+    def test_splitter(self):
+        self.assertRaises(ValueError, get_matcher_class, 'unknown')
+        self.assertRaises(ValueError, AddressSplitter.from_directory,
+                          DATADIR, matchers={'town': 'trie'})
+
+        reference = AddressSplitter.from_directory(DATADIR)
+        splitter = AddressSplitter.from_directory(
+            DATADIR, matchers={'city': 'trie', 'street': 'auto',
+                               'house': 'regex'})
+        address = u'Москва, Новый Арбат 5, Зеленоград'
+        self.assertEqual(splitter._get_candidates(address),
+                         reference._get_candidates(address))
+        self.assertEqual(splitter.get_parsed_address(address),
+                         reference.get_parsed_address(address))
+        self.assertEqual(sorted(splitter._matchers), ['city', 'house',
+                                                      'street'])
+
+        # The matcher is rebuilt when the list is changed
+        splitter.add_patterns('city', [u'тверь'])
+        self.assertEqual(splitter._get_city_pos(u'Тверь'),
+                         {u'тверь': [(0, 5)]})
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestMatchers, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
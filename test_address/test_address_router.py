@@ -0,0 +1,101 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+
+import unittest
+
+from address_router import GazetteerPack, CountryRouter
+
+from testing import DATADIR, TMPFILE
+
+
+class TestCountryRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = CountryRouter([
+            GazetteerPack('ru', DATADIR),
+            GazetteerPack('kz', DATADIR, splitter_options=dict(
+                country_list_file='kz_countries.csv')),
+            GazetteerPack('by', DATADIR, splitter_options=dict(
+                country_list_file='by_countries.csv'))
+        ])
+
+    def tearDown(self):
+        if os.path.exists(TMPFILE):
+            os.remove(TMPFILE)
+
+    def test_detect(self):
+        detect = self.router.detect
+        # Explicit country
+        self.assertEqual(detect(u'Россия, Москва'), 'ru')
+        self.assertEqual(detect(u'Казахстан, Алматы'), 'kz')
+        self.assertEqual(detect(u'Республика Беларусь, Минск'), 'by')
+        # Country wins over the other hints
+        self.assertEqual(detect(u'Беларусь, 050000, Москва'), 'by')
+        # Letters and keywords
+        self.assertEqual(detect(u'Алматы облысы, Абай көшесі 5'), 'kz')
+        self.assertEqual(detect(u'Мінская вобласць, вуліца Леніна'), 'by')
+        # Postal code
+        self.assertEqual(detect(u'050000, Алматы'), 'kz')
+        self.assertEqual(detect(u'220030, Минск'), 'by')
+        self.assertEqual(detect(u'117312, Москва'), 'ru')
+        # The codes of Russia starting with 1 are not the hints of 'kz'
+        router = CountryRouter(list(reversed(self.router.packs)))
+        self.assertEqual(router.detect(u'101000, Москва'), 'ru')
+        self.assertEqual(router.detect(u'160000, Шымкент'), 'ru')
+        self.assertEqual(router.detect(u'160000, Шымкент, Казахстан'), 'kz')
+        # No hints
+        self.assertEqual(detect(u'Москва, Вавилова'), 'ru')
+
+    def test_lazy_packs(self):
+        # The hints don't need the splitters
+        self.assertEqual(self.router.detect(u'Казахстан, Алматы'), 'kz')
+        self.assertFalse(any(pack.loaded for pack in self.router.packs))
+
+        self.router.get_parsed_address(u'Казахстан, Алматы')
+        self.assertEqual([pack.code for pack in self.router.packs
+                          if pack.loaded], ['kz'])
+
+    def test_get_parsed_address(self):
+        address = self.router.get_parsed_address(
+            u'Казахстан, Москва, Вавилова 18')
+        self.assertEqual(address.country, u'Казахстан')
+        self.assertEqual(address.street, u'Вавилова')
+        self.assertEqual(address.house, u'18')
+
+    def test_parse_batch(self):
+        addresses = [u'Россия, Москва', u'Казахстан, Москва',
+                     u'Россия, Москва', u'Беларусь']
+        results, stats = self.router.parse_batch(addresses)
+        self.assertEqual([a.country for a in results],
+                         [u'Россия', u'Казахстан', u'Россия', u'Беларусь'])
+        self.assertEqual(sorted(stats), ['by', 'kz', 'ru'])
+        self.assertEqual(stats['ru'].rows, 2)
+        self.assertEqual(stats['ru'].distinct, 1)
+
+    def test_from_config(self):
+        with open(TMPFILE, 'w') as f:
+            json.dump({'default': 'kz',
+                       'packs': [{'code': 'ru', 'path': DATADIR},
+                                 {'code': 'kz', 'path': DATADIR,
+                                  'keywords': [u'облысы']}]}, f)
+        router = CountryRouter.from_config(TMPFILE)
+        self.assertEqual([p.code for p in router.packs], ['ru', 'kz'])
+        self.assertEqual(router.detect(u'Москва'), 'kz')
+        self.assertEqual(router.detect(u'117312, Москва'), 'ru')
+
+        self.assertRaises(ValueError, CountryRouter, [])
+        self.assertRaises(ValueError, CountryRouter,
+                          [GazetteerPack('ru', DATADIR)], 'kz')
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestCountryRouter, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,115 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import random
+import unittest
+
+from address_splitter import AddressSplitter
+from address_scanner import (
+    HouseScanner,
+    analyse_pattern,
+    find_index_positions
+)
+
+from testing import (
+    DATADIR,
+    HOUSE_LIST,
+    CSV_FILES_DIR
+)
+
+
+ADDRESSES = [
+    u'москва, улица малая, дом 18/3',
+    u'Москва, ул. Вавилова, д. 18, корп. 2, стр. 1',
+    u'117312, г. Москва, ул. Вавилова, д.18а',
+    u'д.18 «а», дом 5-7, домовл. 12, вл 3, к.1',
+    u'г Тверь, пр-кт Ленина, 18б, кв 3',
+    u'д.  №  5, дом№7-8-9, дома 12/4а, строение 3',
+    u'лит. вв 12, в3. в4 ,д123456 a-12 корпус12',
+    u'1234567 12345 123456_ 123456а x123456 ‚123456',
+    u'Российская федерация, москва, улица россия',
+    u'',
+]
+
+ALPHABET = (u'0123456789 .,-/"№«»_\\'
+            u'дмоаеквлнитрпсгбйяюДКМaxX')
+
+
+def random_addresses(count, seed=0):
+    rnd = random.Random(seed)
+    for _ in range(count):
+        length = rnd.randint(1, 40)
+        yield u''.join(rnd.choice(ALPHABET) for _ in range(length))
+
+
+class TestScanner(unittest.TestCase):
+
+    def _check_conformance(self, house_list_file):
+        splitter = AddressSplitter(
+            country_list_file=HOUSE_LIST,
+            region_list_file=HOUSE_LIST,
+            subregion_list_file=HOUSE_LIST,
+            city_list_file=HOUSE_LIST,
+            street_list_file=HOUSE_LIST,
+            house_list_file=house_list_file,
+            use_scanners=False
+        )
+        scanner = HouseScanner(splitter.house_list)
+        self.assertEqual(scanner.free_patterns, [])
+
+        addresses = ADDRESSES + list(random_addresses(3000))
+        for address in addresses:
+            expected = splitter._get_positions(address, splitter.house_list)
+            self.assertEqual(scanner.scan(address), expected,
+                             address.encode('utf-8'))
+
+            expected = splitter._get_index_pos(address)
+            self.assertEqual(find_index_positions(address), expected,
+                             address.encode('utf-8'))
+
+    def test_conformance(self):
+        self._check_conformance(HOUSE_LIST)
+        self._check_conformance(os.path.join(CSV_FILES_DIR, 'houses.csv'))
+
+    def test_analyse_pattern(self):
+        info = analyse_pattern(u'д\\.? *[0-9]{1,3}')
+        self.assertEqual(info['min_width'], 1)
+        self.assertTrue(info['max_width'] > 1000)
+        self.assertEqual(info['prefix'], frozenset(u'дД. '))
+        self.assertEqual(info['first'], frozenset(u'дД'))
+
+        info = analyse_pattern(u'дом((а)|(е))? *№ *[0-9]{1,3}')
+        self.assertEqual(info['min_width'], 4)
+        self.assertEqual(info['first'], frozenset(u'дД'))
+
+        info = analyse_pattern(u'[0-9]+/[0-9]+')
+        self.assertEqual((info['min_width'], info['max_width']), (0, 0))
+        self.assertEqual(info['first'], frozenset(u'0123456789'))
+
+        # Patterns without a mandatory digit
+        self.assertEqual(analyse_pattern(u'дом'), None)
+        self.assertEqual(analyse_pattern(u'(д )?[0-9]?а'), None)
+        self.assertEqual(analyse_pattern(u'.[0-9]'), None)
+        self.assertEqual(analyse_pattern(u'\\w+ [0-9]'), None)
+
+    def test_free_patterns(self):
+        patterns = {name: AddressSplitter._compile(name)
+                    for name in [u'дом', u'[0-9]+', u'кв\\.? ?[0-9]?']}
+        scanner = HouseScanner(patterns)
+        self.assertEqual(scanner.free_patterns, [u'дом', u'кв\\.? ?[0-9]?'])
+        address = u'дом 1, кв. 2, кв'
+        splitter = AddressSplitter.from_directory(DATADIR)
+        self.assertEqual(scanner.scan(address),
+                         splitter._get_positions(address, patterns))
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestScanner, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
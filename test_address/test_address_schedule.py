@@ -0,0 +1,98 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import Queue
+import shutil
+import tempfile
+import multiprocessing
+
+import unittest
+
+from address_splitter import AddressSplitter
+from address_schedule import (
+    ScheduleStats,
+    estimate_cost,
+    parse_file_scheduled,
+    _get
+)
+from address_input import worker_pids
+
+from testing import DATADIR
+
+
+class TestSchedule(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'input.txt')
+        self.addresses = [u'Москва, Новый Арбат %d' % i for i in range(20)] + \
+            [u'', u'зеленоград', u'Рязанская область, Рязань',
+             u'119607, Россия, Москва, Зеленоград, ул. Раменки 17'] * 3
+        with open(self.filename, 'w') as f:
+            f.write('\n'.join(a.encode('utf-8')
+                              for a in self.addresses) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_estimate_cost(self):
+        self.assertEqual(estimate_cost(u''), 1)
+        self.assertEqual(estimate_cost(u'Москва'), 2)
+        self.assertTrue(estimate_cost(self.addresses[-1]) >
+                        estimate_cost(self.addresses[0]) >
+                        estimate_cost(u'Зеленоград'))
+
+    def test_parse_file(self):
+        splitter = AddressSplitter.from_directory(DATADIR)
+        stats = ScheduleStats()
+        results = list(parse_file_scheduled(self.filename, DATADIR,
+                                            workers=2, first=3,
+                                            window_lines=10,
+                                            target_time=0.01,
+                                            stats=stats))
+        self.assertEqual([r[0] for r in results], [3, 13, 23])
+        lines = [line for r in results for line in r[1]]
+        self.assertEqual(lines, self.addresses[3:])
+        parsed = [p for r in results for p in r[2]]
+        self.assertEqual(parsed, [splitter.get_parsed_address(a)
+                                  for a in lines])
+
+        self.assertEqual(stats.rows.rows, len(lines))
+        self.assertTrue(stats.throughput > 0)
+        utilization = stats.utilization()
+        self.assertTrue(0 < len(utilization) <= 2)
+        for part in utilization.itervalues():
+            self.assertTrue(0 < part <= 1)
+        self.assertEqual(len(unicode(stats).splitlines()),
+                         len(utilization) + 1)
+
+    def test_lost_chunks(self):
+        pool = multiprocessing.Pool(1)
+        pids = worker_pids(pool)
+        try:
+            # The chunk failed outside the parsing
+            tasks = [pool.apply_async(int, ('x', ))]
+            self.assertRaises(ValueError, _get, Queue.Queue(), tasks, pool,
+                              pids)
+            # The dead worker is replaced by the pool
+            pool.apply_async(os._exit, (1, ))
+            self.assertRaises(RuntimeError, _get, Queue.Queue(), [], pool,
+                              pids)
+            self.assertRaises(RuntimeError, _get, Queue.Queue(),
+                              [pool.apply_async(time.sleep, (2, ))], pool,
+                              worker_pids(pool), 0.5)
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestSchedule, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,143 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+import json
+import time
+import threading
+import urllib2
+import unittest
+
+from address_service import (
+    AddressService,
+    DeadlineExceeded,
+    _parse_jobs,
+    make_server,
+    percentile
+)
+
+from testing import DATADIR
+
+
+class TestAddressService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.service = AddressService(DATADIR, workers=2, max_delay=0.01)
+        cls.server = make_server(cls.service, port=0)
+        cls.url = 'http://%s:%s' % cls.server.server_address
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.service.close()
+
+    def _post(self, path, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        try:
+            response = urllib2.urlopen(self.url + path, body)
+        except urllib2.HTTPError as e:
+            return e.code, json.loads(e.read().decode('utf-8'))
+        return response.getcode(), json.loads(response.read().decode('utf-8'))
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 50), None)
+        self.assertEqual(percentile([3, 1, 2], 50), 2)
+        self.assertEqual(percentile(range(101), 90), 90)
+        self.assertEqual(percentile(range(101), 100), 100)
+
+    def test_parse(self):
+        address = u'Российская федерация, москва, улица россия, дом 3'
+        got = self.service.parse([address])
+        self.assertEqual(len(got), 1)
+        self.assertEqual(got[0]['country'], u'Российская федерация')
+        self.assertEqual(got[0]['settlement'], u'москва')
+        self.assertEqual(got[0]['street'], u'улица россия')
+        self.assertEqual(got[0]['house'], u'дом 3')
+        self.assertEqual(got[0]['raw_address'], address)
+
+    def test_concurrent_requests(self):
+        addresses = [u'москва, вавилова, дом %s' % i for i in range(20)]
+        results = [None] * len(addresses)
+
+        def parse(i):
+            results[i] = self.service.parse([addresses[i]])[0]
+
+        threads = [threading.Thread(target=parse, args=(i, ))
+                   for i in range(len(addresses))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for i, result in enumerate(results):
+            self.assertEqual(result['raw_address'], addresses[i])
+            self.assertEqual(result['house'], u'дом %s' % i)
+        metrics = self.service.metrics.as_dict()
+        self.assertTrue(metrics['batches'] <= metrics['requests'])
+
+    def test_deadline(self):
+        self.assertRaises(DeadlineExceeded,
+                          self.service.parse, [u'москва'], 0)
+
+    def test_parse_jobs_error(self):
+        # The error outside the parsing fails the live jobs
+        deadline = time.time() + 10
+        results, parsed, distinct = _parse_jobs([([u'москва'], deadline),
+                                                 (None, deadline),
+                                                 ([u'москва'], 0)])
+        self.assertTrue(results[0].startswith(u'TypeError'))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[2], None)
+        self.assertEqual((parsed, distinct), (0, 0))
+
+    def test_http(self):
+        code, data = self._post('/parse', {'address': u'москва, вавилова'})
+        self.assertEqual(code, 200)
+        self.assertEqual(data['settlement'], u'москва')
+        self.assertEqual(data['street'], u'вавилова')
+
+        code, data = self._post(
+            '/parse_batch', {'addresses': [u'москва', u'зеленоград']})
+        self.assertEqual(code, 200)
+        self.assertEqual([d['settlement'] for d in data],
+                         [u'москва', u'зеленоград'])
+
+        code, data = self._post('/parse', {'address': u'москва',
+                                           'timeout': 0})
+        self.assertEqual(code, 504)
+
+        code, data = self._post('/parse', {'addresses': u'москва'})
+        self.assertEqual(code, 400)
+
+        for addresses in [u'москва', {u'москва': 1}, 5, [u'москва', 5]]:
+            code, data = self._post('/parse_batch',
+                                    {'addresses': addresses})
+            self.assertEqual(code, 400)
+
+        code, data = self._post('/parse', {'address': u'москва',
+                                           'timeout': u'10'})
+        self.assertEqual(code, 400)
+        self.assertTrue('timeout' in data['error'])
+
+        response = urllib2.urlopen(self.url + '/health')
+        self.assertEqual(json.loads(response.read()), {'status': 'ok'})
+
+        response = urllib2.urlopen(self.url + '/metrics')
+        metrics = json.loads(response.read())
+        self.assertTrue(metrics['requests'] > 0)
+        self.assertTrue('latency_p99' in metrics)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestAddressService, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,92 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+import unittest
+
+from address_splitter import AddressSplitter
+from address_session import (
+    IncrementalSession,
+    SessionIndex,
+    pattern_width
+)
+
+from testing import DATADIR
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.addresses = [
+            u'Россия, Москва, Новый Арбат 5',
+            u'117312, зеленоград, ул. Новый Арбат, д. 15',
+            u'Москва Москва  москва, 3',
+        ]
+
+    def _check_typing(self, splitter, session, texts):
+        for text in texts:
+            self.assertEqual(session.update(text),
+                             splitter.get_parsed_address(text))
+            self.assertEqual(
+                [found.items() for found in session.get_candidates(text)],
+                [found.items() for found in splitter._get_candidates(text)])
+
+    def _typing(self, address):
+        texts = [address[:i] for i in range(len(address) + 1)]
+        # Backspace, the edit in the middle and the replaced text
+        return texts + [address[:-1], address, u'x' + address[1:],
+                        address[::-1]]
+
+    def test_pattern_width(self):
+        self.assertEqual(pattern_width(u'абакан(а)?'), 7)
+        self.assertEqual(pattern_width(u'ново[- ]?град'), 9)
+        self.assertEqual(pattern_width(u'ул +ленина'), None)
+
+    def test_typing(self):
+        splitter = AddressSplitter.from_directory(DATADIR)
+        index = SessionIndex(splitter)
+        for address in self.addresses:
+            session = IncrementalSession(splitter, index)
+            self._check_typing(splitter, session, self._typing(address))
+
+        session = IncrementalSession(splitter, index)
+        session.update(u'Москва, Новый')
+        self.assertEqual(session.append(u' Арбат').street,
+                         u'Новый Арбат')
+        self.assertEqual(session.address, u'Москва, Новый Арбат')
+
+        # The session searches all strategies
+        self.assertRaises(ValueError, IncrementalSession,
+                          AddressSplitter.from_directory(DATADIR,
+                                                         beam_width=4))
+
+    def test_without_scanners(self):
+        splitter = AddressSplitter.from_directory(DATADIR,
+                                                  use_scanners=False)
+        index = SessionIndex(splitter)
+        self.assertTrue(index.incremental('house'))
+        for address in self.addresses:
+            session = IncrementalSession(splitter, index)
+            self._check_typing(splitter, session, self._typing(address))
+
+    def test_changed_patterns(self):
+        splitter = AddressSplitter.from_directory(DATADIR)
+        session = IncrementalSession(splitter)
+        address = u'Тверь, Новый Арбат 5'
+        self._check_typing(splitter, session, [address])
+
+        # The index of the category is rebuilt
+        splitter.add_patterns('city', [u'тверь'])
+        self.assertEqual(session.update(address + u' '),
+                         splitter.get_parsed_address(address + u' '))
+        self.assertEqual(session.update(address).settlement, u'Тверь')
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestSession, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
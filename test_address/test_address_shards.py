@@ -0,0 +1,122 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+
+import unittest
+
+from address_splitter import AddressSplitter
+from address_batch import format_result
+from address_shards import (
+    ShardError,
+    plan,
+    shard_of,
+    run_shard,
+    run_local,
+    job_status,
+    merge
+)
+
+from testing import DATADIR
+
+
+class TestShards(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.input = os.path.join(self.tmpdir, 'input.txt')
+        self.addresses = [u'Москва, Новый Арбат %d' % (i % 7)
+                          for i in range(40)] + [u'', u'зеленоград']
+        with open(self.input, 'w') as f:
+            for address in self.addresses:
+                f.write(address.encode('utf-8') + '\n')
+        self.options = dict(path=DATADIR, delimiter=u';', batch_size=4)
+
+        splitter = AddressSplitter.from_directory(DATADIR)
+        self.expected = [
+            format_result(a, splitter.get_parsed_address(a), u';')
+            for a in self.addresses]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _read_output(self, filename):
+        with open(filename) as f:
+            return [line.decode('utf-8').rstrip(u'\n') for line in f]
+
+    def test_bytes(self):
+        job = os.path.join(self.tmpdir, 'job')
+        manifest = plan(self.input, job, 3, 'bytes', self.options)
+        shards = manifest['shards']
+        self.assertEqual(shards[0]['begin'], 0)
+        self.assertEqual(shards[-1]['end'], os.path.getsize(self.input))
+        for left, right in zip(shards, shards[1:]):
+            self.assertEqual(left['end'], right['begin'])
+        self.assertRaises(ShardError, plan, self.input, job, 3)
+        self.assertEqual(manifest['lines'], len(self.addresses))
+        self.assertEqual(sum(s['lines'] for s in shards),
+                         len(self.addresses))
+
+        self.assertEqual(run_local(job, processes=0),
+                         {0: 'done', 1: 'done', 2: 'done'})
+        self.assertEqual(sum(s['rows'] for s in job_status(job)),
+                         len(self.addresses))
+
+        output = os.path.join(self.tmpdir, 'output.txt')
+        self.assertEqual(merge(job, output), len(self.addresses))
+        self.assertEqual(self._read_output(output), self.expected)
+
+        # The line duplicated at a shard bound is detected
+        with open(os.path.join(job, 'shard-0001.out'), 'r+') as f:
+            rows = f.readlines()
+            f.seek(0)
+            f.writelines(rows[:1] + rows)
+        self.assertRaises(ShardError, merge, job, output)
+
+    def test_count_lines(self):
+        with open(self.input, 'ab') as f:
+            f.write('без перевода строки')
+        job = os.path.join(self.tmpdir, 'job')
+        manifest = plan(self.input, job, 5, 'bytes', self.options)
+        self.assertEqual(manifest['lines'], len(self.addresses) + 1)
+
+    def test_hash(self):
+        self.assertEqual(shard_of(u'Москва ', 5), shard_of(u'москва', 5))
+
+        job = os.path.join(self.tmpdir, 'job')
+        manifest = plan(self.input, job, 4, 'hash', self.options)
+        self.assertEqual(manifest['lines'], len(self.addresses))
+        self.assertEqual(sum(s['lines'] for s in manifest['shards']),
+                         len(self.addresses))
+
+        output = os.path.join(self.tmpdir, 'output.txt')
+        self.assertRaises(ShardError, merge, job, output)
+        run_shard(job, 0)
+        self.assertEqual([s['state'] for s in job_status(job)],
+                         ['done', 'pending', 'pending', 'pending'])
+
+        # The shard taken by another node is skipped
+        open(os.path.join(job, 'shard-0001.lock'), 'w').close()
+        states = run_local(job, processes=2)
+        self.assertEqual(states, {0: 'done', 1: None, 2: 'done', 3: 'done'})
+        self.assertEqual(run_shard(job, 1, force=True)['state'], 'done')
+
+        self.assertEqual(merge(job, output), len(self.addresses))
+        self.assertEqual(self._read_output(output), self.expected)
+
+        # The rows added to an output are detected
+        with open(os.path.join(job, 'shard-0002.out'), 'a') as f:
+            f.write('1\textra\n')
+        self.assertRaises(ShardError, merge, job, output)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestShards, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
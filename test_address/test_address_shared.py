@@ -0,0 +1,77 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+
+import unittest
+
+from address_splitter import AddressSplitter
+from address_shared import (
+    NO_SPAN,
+    SpanBuffer,
+    write_spans,
+    spans_address,
+    parse_file_spans
+)
+
+from testing import DATADIR
+
+
+class TestShared(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'input.txt')
+        self.addresses = [u'Москва, Новый Арбат %d' % i for i in range(5)] + \
+            [u'', u'зеленоград', u'Зеленоград  ', u'Рязанская область']
+        with open(self.filename, 'w') as f:
+            f.write('\n'.join(a.encode('utf-8')
+                              for a in self.addresses * 3) + '\n')
+        self.splitter = AddressSplitter.from_directory(DATADIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_write_spans(self):
+        buffer = SpanBuffer(2, len(self.addresses))
+        spans, scores = buffer.spans(1), buffer.scores(1)
+        write_spans(self.splitter, self.addresses, spans, scores)
+        self.assertEqual(spans.shape, (len(self.addresses), 8, 2))
+        self.assertTrue((buffer.spans(0) == 0).all())
+
+        for i, address in enumerate(self.addresses):
+            strategy = self.splitter.get_best_strategy(address)
+            self.assertAlmostEqual(scores[i], strategy.get_score())
+            self.assertEqual(spans_address(spans[i], address),
+                             strategy.get_parsed_address())
+        # The empty address has no parts
+        self.assertTrue((spans[5] == NO_SPAN).all())
+
+    def test_parse_file(self):
+        chunks = list(parse_file_spans(self.filename, DATADIR, workers=2,
+                                       chunk_lines=4, first=2, slots=2))
+        self.assertEqual([c.first for c in chunks], range(2, 27, 4))
+        lines = [line for c in chunks for line in c.lines]
+        self.assertEqual(lines, (self.addresses * 3)[2:])
+        parsed = [p for c in chunks for p in c.addresses()]
+        self.assertEqual(parsed, [self.splitter.get_parsed_address(a)
+                                  for a in lines])
+
+        chunk = chunks[0]
+        self.assertEqual(chunk.address(1), parsed[1])
+        strategy = self.splitter.get_best_strategy(chunk.lines[1])
+        self.assertEqual(chunk.positions(1)['street'],
+                         strategy.street_pos)
+        self.assertEqual(chunk.positions(1)['poi'], None)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestShared, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
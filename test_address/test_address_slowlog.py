@@ -0,0 +1,93 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import unittest
+
+from address_splitter import AddressSplitter
+from address_diff import create_engine
+from address_slowlog import (
+    SlowLog,
+    count_strategies,
+    read_log,
+    replay,
+    format_replay
+)
+
+from testing import DATADIR, TMPFILE
+
+
+class TestSlowLog(unittest.TestCase):
+
+    def setUp(self):
+        self.address = u'Москва, Новый Арбат 5, Зеленоград'
+
+    def tearDown(self):
+        if os.path.exists(TMPFILE):
+            os.remove(TMPFILE)
+
+    def test_log(self):
+        slow_log = SlowLog(TMPFILE, max_time=None, max_strategies=4)
+        splitter = AddressSplitter.from_directory(DATADIR,
+                                                  slow_log=slow_log)
+        reference = AddressSplitter.from_directory(DATADIR)
+
+        self.assertEqual(splitter.get_parsed_address(self.address),
+                         reference.get_parsed_address(self.address))
+        # The cached result is not logged again
+        splitter.get_parsed_address(self.address)
+        # The address with few strategies is not logged
+        splitter.get_parsed_address(u'Москва')
+
+        records = read_log(TMPFILE)
+        self.assertEqual(len(records), 1)
+        record = records[0]
+        self.assertEqual(record['address'], self.address)
+        self.assertEqual(record['reasons'], ['strategies'])
+        self.assertEqual(record['candidates']['city'], 2)
+        self.assertEqual(record['candidates']['poi'], 0)
+        candidates = reference._get_candidates(self.address)
+        self.assertEqual(record['strategies'], count_strategies(candidates))
+        self.assertEqual(record['strategies'],
+                         len(reference._get_strategies(self.address)))
+        self.assertEqual(record['score'],
+                         reference.get_best_strategy(self.address)
+                         .get_score())
+        self.assertAlmostEqual(record['time'], record['match_time'] +
+                               record['search_time'])
+
+        slow_log.max_strategies = None
+        slow_log.max_time = 0.0
+        splitter.get_parsed_address(u'Зеленоград')
+        self.assertEqual(read_log(TMPFILE)[1]['reasons'], ['time'])
+
+    def test_replay(self):
+        slow_log = SlowLog(TMPFILE, max_time=0.0)
+        splitter = AddressSplitter.from_directory(DATADIR,
+                                                  slow_log=slow_log)
+        for address in [self.address, u'Москва']:
+            splitter.get_parsed_address(address)
+
+        engine = create_engine('reference', DATADIR)
+        results = replay(read_log(TMPFILE), engine, repeat=2)
+        self.assertEqual([r['address'] for r in results],
+                         [self.address, u'Москва'])
+        for r in results:
+            self.assertEqual(r['new_score'], r['score'])
+            self.assertEqual(r['new_strategies'], r['strategies'])
+            self.assertTrue(r['new_time'] > 0)
+
+        lines = format_replay(results).splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].endswith(self.address))
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestSlowLog, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -2,27 +2,34 @@
 # -*- coding: utf-8 -*-
 
 
+import os
 import sys
 
 import re
 import numpy as np
 import unittest
+from collections import OrderedDict
 
 from address_splitter import (
     AddressSplitter,
-    SplitingStrategy
+    SplitingStrategy,
+    CATEGORIES
 )
 
 from address import Address
+from address_cache import ResultCache
+from address_memory import deep_size, format_report
 
 from testing import (
+    DATADIR,
     COUNTRY_LIST,
     REGION_LIST,
     SUBREGION_LIST,
     CITY_LIST,
     STREET_LIST,
     HOUSE_LIST,
-    POI_LIST
+    POI_LIST,
+    TMPFILE
 )
 
 
@@ -332,6 +339,33 @@ class TestAddressSplitter(unittest.TestCase):
             for j in range(i+1, len(parts)):
                 self.assertNotEqual(parts[i], parts[j])
 
+    def test_from_directory(self):
+        splitter = AddressSplitter.from_directory(DATADIR)
+        self.assertEqual(sorted(splitter.city_list),
+                         sorted(self.splitter.city_list))
+        self.assertEqual(sorted(splitter.poi_list),
+                         sorted(self.splitter.poi_list))
+
+        splitter = AddressSplitter.from_directory(
+            DATADIR, city_list_file='streets.csv', poi_list_file='absent.csv')
+        self.assertEqual(sorted(splitter.city_list),
+                         sorted(self.splitter.street_list))
+        self.assertEqual(splitter.poi_list, {})
+
+    def test_lazy_loading(self):
+        splitter = AddressSplitter.from_directory(DATADIR)
+        self.assertEqual(splitter.loaded_categories(), [])
+
+        pos = splitter._get_country_pos(u'москва, россия')
+        self.assertEqual(pos, {u'россия': [(8, 14)]})
+        self.assertEqual(splitter.loaded_categories(), ['country'])
+
+        self.assertTrue(splitter.warm_up() is splitter)
+        self.assertEqual(splitter.loaded_categories(), CATEGORIES)
+
+        self.assertRaises(IOError, AddressSplitter.from_directory,
+                          DATADIR, city_list_file='absent.csv')
+
     def test__read_list_file(self):
 
         expected = [
@@ -573,6 +607,158 @@ class TestAddressSplitter(unittest.TestCase):
         parts = self.splitter.get_best_strategy(address)
         self.assertEqual(parts, dummy)
 
+    def test_get_top_strategies(self):
+        address = u'Российская федерация, москва, улица россия, дом 3'
+        best = self.splitter.get_best_strategy(address)
+        strategies = self.splitter._get_strategies(address)
+        scores = sorted(s.get_score() for s in strategies)
+
+        self.splitter = AddressSplitter(
+            country_list_file=COUNTRY_LIST,
+            region_list_file=REGION_LIST,
+            subregion_list_file=SUBREGION_LIST,
+            city_list_file=CITY_LIST,
+            street_list_file=STREET_LIST,
+            house_list_file=HOUSE_LIST,
+            poi_list_file=POI_LIST
+        )
+        top = self.splitter.get_top_strategies(address, 5)
+        self.assertEqual(len(top), 5)
+        self.assertEqual(top[0][0], best)
+        self.assertEqual([score for _, score, _ in top], scores[:5])
+        self.assertEqual([margin for _, _, margin in top],
+                         [score - scores[0] for score in scores[:5]])
+        for s, score, _ in top:
+            self.assertEqual(s.get_score(), score)
+
+        top = self.splitter.get_top_strategies(address, len(scores) + 10)
+        self.assertEqual(len(top), len(scores))
+
+        # The result is not cached: the beam search finds its own best
+        # strategy
+        self.assertNotEqual(self.splitter._address, address)
+        self.assertEqual(self.splitter.get_best_strategy(address), best)
+        self.splitter.beam_width = 1
+        self.splitter.get_top_strategies(u'москва, вавилова', 3)
+        self.assertEqual(
+            self.splitter.get_best_strategy(u'москва, вавилова'),
+            self.splitter._beam_search(u'москва, вавилова')[0])
+
+        self.assertRaises(ValueError,
+                          self.splitter.get_top_strategies, address, 0)
+
+    def test_cache(self):
+        address1 = u'москва, улица россия, дом 3'
+        address2 = u'зеленоград, вавилова'
+        parsed1 = self.splitter.get_parsed_address(address1)
+        self.splitter.get_best_strategy(address2)
+        parsed2 = self.splitter.get_parsed_address(address2)
+        self.assertNotEqual(parsed1, parsed2)
+        self.assertEqual(parsed2.settlement, u'зеленоград')
+
+    def test_get_residual(self):
+        address = u'Москва, кв. 5, Новый Арбат, д. 18, подъезд 2'
+        self.assertEqual(self.splitter.get_residual(address),
+                         u'кв. 5 д подъезд 2')
+        self.assertEqual(self.splitter.get_residual(address, per_gap=True),
+                         [(8, 13, u'кв. 5'), (28, 29, u'д'),
+                          (35, 44, u'подъезд 2')])
+        self.assertEqual(self.splitter._drop_parts(address),
+                         u'кв. 5,            , д.   , подъезд 2')
+        self.assertEqual(self.splitter.get_residual(u'Москва, Вавилова'),
+                         u'')
+
+    def test_update_patterns(self):
+        address = u'москва, улица россия, дом 3'
+        old_city = self.splitter.city_list
+        compiled = old_city[u'москва']
+
+        self.assertEqual(self.splitter.add_patterns('city', [u'тверь']), 1)
+        self.assertTrue(u'тверь' in self.splitter.city_list)
+        # Old patterns are not recompiled, the old dict is not changed
+        self.assertTrue(self.splitter.city_list[u'москва'] is compiled)
+        self.assertFalse(u'тверь' in old_city)
+
+        self.splitter.remove_patterns('city', [u'тверь'])
+        self.assertFalse(u'тверь' in self.splitter.city_list)
+        self.assertRaises(KeyError, self.splitter.remove_patterns,
+                          'city', [u'тверь'])
+        self.assertRaises(ValueError, self.splitter.add_patterns,
+                          'town', [u'тверь'])
+
+        self.splitter.replace_pattern('street', u'улица россия',
+                                      u'улица росси(я|и)')
+        got = self.splitter.get_parsed_address(address)
+        self.assertEqual(got.street, u'улица россия')
+        self.assertFalse(u'улица россия' in self.splitter.street_list)
+
+    def test_update_patterns_cache(self):
+        address = u'москва, улица россия, дом 3'
+        best = self.splitter.get_best_strategy(address)
+
+        # The pattern doesn't match the address: the cache is kept
+        self.splitter.add_patterns('city', [u'тверь'])
+        self.assertTrue(self.splitter._best_strat is best)
+        self.splitter.remove_patterns('street', [u'вавилова'])
+        self.assertTrue(self.splitter._best_strat is best)
+
+        # The pattern matches the address
+        self.splitter.add_patterns('street', [u'улица'])
+        self.assertEqual(self.splitter._best_strat, None)
+
+        best = self.splitter.get_best_strategy(address)
+        self.splitter.remove_patterns('city', [u'москва'])
+        self.assertEqual(self.splitter._best_strat, None)
+        self.assertEqual(self.splitter.get_parsed_address(address).settlement,
+                         None)
+
+    def test_memory_report(self):
+        splitter = AddressSplitter.from_directory(DATADIR,
+                                                  matchers={'city': 'trie'})
+        self.assertEqual(splitter.memory_report()['categories'], {})
+
+        splitter.get_parsed_address(u'москва, улица россия, дом 3')
+        report = splitter.memory_report()
+        self.assertEqual(list(report['categories']), CATEGORIES)
+        # The trie matcher doesn't compile the expanded patterns
+        city = report['categories']['city']
+        self.assertEqual(city['patterns'], len(splitter.city_list))
+        self.assertEqual(city['compiled'], 0)
+        self.assertTrue(city['index'] > 0)
+        street = report['categories']['street']
+        self.assertEqual(street['compiled'], street['patterns'])
+        self.assertTrue(street['text'] > 0)
+        self.assertTrue(street['compiled_bytes'] > street['text'])
+        self.assertTrue(report['cache'] > 0)
+        self.assertEqual(report['result_cache'], 0)
+
+        cached = AddressSplitter.from_directory(
+            DATADIR, result_cache=ResultCache())
+        self.assertEqual(cached.memory_report()['result_cache'],
+                         deep_size(OrderedDict()))
+        cached.get_parsed_address(u'москва, улица россия, дом 3')
+        cached.get_parsed_address(u'Зеленоград')
+        self.assertTrue(cached.memory_report()['result_cache'] >
+                        deep_size(OrderedDict()))
+        self.assertTrue('result_cache' in format_report(
+            cached.memory_report()))
+
+        # The compiled patterns are shared by the splitters
+        self.assertTrue(splitter.street_list[u'вавилова'] is
+                        self.splitter.street_list[u'вавилова'])
+
+    def test_reload_category(self):
+        with open(TMPFILE, 'w') as f:
+            f.write(u'москва\nтверь\n'.encode('utf-8'))
+        try:
+            compiled = self.splitter.city_list[u'москва']
+            self.assertEqual(self.splitter.reload_category('city', TMPFILE), 2)
+            self.assertEqual(sorted(self.splitter.city_list),
+                             [u'москва', u'тверь'])
+            self.assertTrue(self.splitter.city_list[u'москва'] is compiled)
+        finally:
+            os.remove(TMPFILE)
+
     def test_get_house_num(self):
         address = u'москва, улица малая, дом 18'
         expected = {u'дом 18': [(21, 27)], u'18': [(25, 27)]}
@@ -0,0 +1,89 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import unittest
+
+from address_splitter import AddressSplitter
+from address_matchers import PatternTable
+from address_stats import PatternStats
+
+from testing import DATADIR, TMPFILE
+
+
+class TestPatternStats(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = PatternStats()
+        self.splitter = AddressSplitter.from_directory(
+            DATADIR, pattern_stats=self.stats, use_scanners=False)
+
+    def tearDown(self):
+        if os.path.exists(TMPFILE):
+            os.remove(TMPFILE)
+
+    def test_counters(self):
+        address = u'Москва, Новый Арбат 5, Москва'
+        self.assertEqual(self.splitter._get_city_pos(address),
+                         AddressSplitter._get_positions(
+                             self.splitter, address, self.splitter.city_list))
+
+        calls, hits, seconds = self.stats.get('city', u'москва')
+        self.assertEqual((calls, hits), (1, 2))
+        self.assertTrue(seconds >= 0)
+        self.assertEqual(self.stats.get('city', u'зеленоград')[:2], (1, 0))
+        self.assertEqual(self.stats.get('city', u'unknown'), (0, 0, 0.0))
+
+        self.splitter.get_parsed_address(address)
+        self.assertEqual(self.stats.get('city', u'москва')[:2], (2, 4))
+        self.assertEqual(self.stats.get('street', u'новый арбат')[:2], (1, 1))
+        self.assertEqual(self.stats.categories(),
+                         ['city', 'country', 'house', 'poi', 'region',
+                          'street', 'subregion'])
+
+        cold = [name for name, _, _ in self.stats.cold_patterns('city')]
+        self.assertTrue(u'зеленоград' in cold)
+        self.assertFalse(u'москва' in cold)
+        self.assertEqual(self.stats.cold_patterns('city', min_calls=3), [])
+
+        report = self.stats.report(top=1)
+        self.assertTrue(u'city: ' in report)
+        self.assertEqual(len(report.splitlines()), 14)
+
+    def test_matchers(self):
+        stats = PatternStats()
+        splitter = AddressSplitter.from_directory(
+            DATADIR, pattern_stats=stats, matchers='trie')
+        plain = AddressSplitter.from_directory(DATADIR)
+        address = u'Москва, Новый Арбат 5, Москва'
+        self.assertEqual(splitter.get_parsed_address(address),
+                         plain.get_parsed_address(address))
+
+        # The patterns are counted through the matchers, the lists are
+        # still compiled on the first use
+        self.assertEqual(stats.get('city', u'москва')[:2], (1, 2))
+        self.assertEqual(stats.get('street', u'новый арбат')[:2], (1, 1))
+        self.assertEqual(stats.get('city', u'зеленоград')[:2], (0, 0))
+        self.assertTrue('house' in stats.categories())
+        self.assertTrue(isinstance(splitter.city_list, PatternTable))
+
+    def test_save_load(self):
+        self.splitter.get_parsed_address(u'Зеленоград')
+        self.stats.save(TMPFILE)
+        loaded = PatternStats.load(TMPFILE)
+        self.assertEqual(loaded.get('city', u'зеленоград'),
+                         self.stats.get('city', u'зеленоград'))
+
+        loaded.merge(self.stats)
+        self.assertEqual(loaded.get('city', u'зеленоград')[:2], (2, 2))
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestPatternStats, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
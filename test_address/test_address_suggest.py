@@ -0,0 +1,91 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import unittest
+
+from address_stats import PatternStats
+from address_suggest import SuggestIndex, pattern_stems
+
+from testing import DATADIR, TMPFILE
+
+
+class TestSuggest(unittest.TestCase):
+
+    def tearDown(self):
+        if os.path.exists(TMPFILE):
+            os.remove(TMPFILE)
+
+    def test_pattern_stems(self):
+        self.assertEqual(pattern_stems(u'абакан(а)?'),
+                         [u'абакана', u'абакан'])
+        self.assertEqual(pattern_stems(u'((г. )|(г ))?Абакан(а)?'),
+                         [u'абакан'])
+        self.assertEqual(pattern_stems(u'1 *- *е +засеймье'),
+                         [u'1-е засеймье'])
+        self.assertEqual(pattern_stems(u'рязанская( +обл(асть)?)?'),
+                         [u'рязанская'])
+        self.assertEqual(pattern_stems(u'[0-9]+.'), [])
+
+    def test_suggest(self):
+        index = SuggestIndex(top_n=3)
+        index.add('city', [u'москва', u'мосальск', u'московский',
+                           u'можайск'])
+        index.add('street', [u'московская', u'мосфильмовская'])
+        index.add('street', [u'мосгаз', u'моховая'], scope=u'москва')
+
+        self.assertEqual(index.suggest(u'мос', 'city'),
+                         [(u'москва', 'city', u'москва'),
+                          (u'мосальск', 'city', u'мосальск'),
+                          (u'московский', 'city', u'московский')])
+        self.assertEqual(index.suggest(u' МОСК', 'city', n=1),
+                         [(u'москва', 'city', u'москва')])
+        self.assertEqual(index.suggest(u'мож'),
+                         [(u'можайск', 'city', u'можайск')])
+        self.assertEqual(index.suggest(u'мосх'), [])
+        self.assertEqual(index.categories, ['city', 'street'])
+
+        self.assertEqual(
+            [text for text, _, _ in index.suggest(u'мо', 'street')],
+            [u'мосгаз', u'моховая', u'московская'])
+        self.assertEqual(
+            [text for text, _, _ in index.suggest(u'мо', 'street',
+                                                  scope=u'г. Москва')],
+            [u'мосгаз', u'моховая', u'московская'])
+        self.assertEqual(
+            [text for text, _, _ in index.suggest(u'мо', 'street',
+                                                  scope=u'Тверь')],
+            [u'московская', u'мосфильмовская'])
+
+        # The frequent stems are suggested first
+        index.add('city', [u'москва', u'мосальск', u'московский',
+                           u'можайск'], {u'можайск': 5, u'московский': 2})
+        self.assertEqual(
+            [text for text, _, _ in index.suggest(u'мо', 'city')],
+            [u'можайск', u'московский', u'москва'])
+
+    def test_from_directory(self):
+        stats = PatternStats()
+        stats.update('street', {u'вавилова': (3, 0.0)})
+        index = SuggestIndex.from_directory(DATADIR, pattern_stats=stats)
+        self.assertEqual(index.suggest(u'зел'),
+                         [(u'зеленоград', 'city', u'зеленоград')])
+        self.assertEqual(index.suggest(u'ряз', 'region')[0][0],
+                         u'рязанская')
+        self.assertEqual(index.suggest(u'')[0][0], u'вавилова')
+
+        index.save(TMPFILE)
+        loaded = SuggestIndex.load(TMPFILE)
+        for prefix in [u'', u'м', u'мос', u'ряз']:
+            self.assertEqual(loaded.suggest(prefix), index.suggest(prefix))
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestSuggest, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,80 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+import unittest
+
+from address_splitter import AddressSplitter
+from postal_index import PostalIndexTable
+
+from testing import (
+    DATADIR,
+    INDEX_TABLE
+)
+
+
+class TestPostalIndexTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = PostalIndexTable.from_file(INDEX_TABLE)
+
+    def test_from_file(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertRaises(ValueError, PostalIndexTable,
+                          [(u'39a', u'рязанск', None)])
+
+    def test_lookup(self):
+        regions, subregions = self.table.lookup(u'390000')
+        self.assertEqual([p.pattern for p in regions], [u'рязанск'])
+        self.assertEqual(subregions, [])
+
+        # The longest prefix is used
+        regions, subregions = self.table.lookup(u'425350')
+        self.assertEqual([p.pattern for p in subregions], [u'волжск'])
+        regions, subregions = self.table.lookup(u'424000')
+        self.assertEqual([p.pattern for p in subregions], [u'моркинск'])
+
+        self.assertEqual(self.table.lookup(u'999999'), ([], []))
+
+    def test_restrict(self):
+        regions = {u'рязанская': [(8, 17)], u'московская': [(20, 30)]}
+        subregions = {u'моркинский': [(40, 50)]}
+        got = self.table.restrict({u'390000': [(0, 6)]}, regions, subregions)
+        self.assertEqual(got, ({u'рязанская': [(8, 17)]}, subregions))
+
+        # Nothing belongs to the index: the candidates are kept
+        got = self.table.restrict({u'140000': [(0, 6)]},
+                                  {u'рязанская': [(8, 17)]}, {})
+        self.assertEqual(got, ({u'рязанская': [(8, 17)]}, {}))
+
+        got = self.table.restrict({u'140000': [(0, 6)],
+                                   u'390000': [(10, 16)]}, regions, {})
+        self.assertEqual(got, (regions, {}))
+
+    def test_splitter(self):
+        address = u'390000, рязанская обл, московская'
+        splitter = AddressSplitter.from_directory(
+            DATADIR, index_table_file='index_regions.csv')
+        candidates = splitter._get_candidates(address)
+        self.assertEqual(candidates[2], {u'рязанская обл': [(8, 21)]})
+
+        reference = AddressSplitter.from_directory(DATADIR)
+        candidates = reference._get_candidates(address)
+        self.assertEqual(sorted(candidates[2]),
+                         [u'московская', u'рязанская обл'])
+
+        self.assertTrue(len(splitter._get_strategies(address)) <
+                        len(reference._get_strategies(address)))
+        got = splitter.get_parsed_address(address)
+        self.assertEqual(got.region, u'рязанская обл')
+        self.assertEqual(got.street, u'московская')
+
+
+if __name__ == '__main__':
+
+    suite = unittest.makeSuite(TestPostalIndexTable, 'test')
+    runner = unittest.TextTestRunner()
+    result = runner.run(suite)
+    if not result.wasSuccessful():
+        sys.exit(1)
@@ -16,5 +16,9 @@ CITY_LIST = os.path.join(DATADIR, 'cities.csv')
 STREET_LIST = os.path.join(DATADIR, 'streets.csv')
 HOUSE_LIST = os.path.join(DATADIR, 'houses.csv')
 POI_LIST = os.path.join(DATADIR, 'poi.csv')
+INDEX_TABLE = os.path.join(DATADIR, 'index_regions.csv')
 
 TMPFILE = os.path.join(DATADIR, 'tmp.csv')
+
+# Gazetteers shipped with the package
+CSV_FILES_DIR = os.path.join(currdir, os.pardir, 'csv_files')